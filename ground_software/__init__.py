@@ -21,6 +21,17 @@ def create_app(test_config=None):
         SECRET_KEY="dev",
         DATABASE=os.path.join(application.instance_path, "radio.db"),
         COMMAND_SECRET_PATH=default_secret_path,
+        DATABASE_POOL_SIZE=4,
+        RESPONSE_POLL_INTERVAL=1.0,
+        RESPONSE_STREAM_QUEUE_SIZE=32,
+        RESPONSE_RESUME_LIMIT=200,
+        RESPONSE_NOTIFY_SOCKET_PATH="/tmp/radio_response_notify",
+        TLE_PATH=os.path.join(application.instance_path, "silversat.tle"),
+        SATELLITE_NAME="SILVERSAT",
+        STATION_LATITUDE=None,
+        STATION_LONGITUDE=None,
+        STATION_ALTITUDE=0.0,
+        PASS_PREDICTION_DAYS=3,
     )
 
     if test_config is None:
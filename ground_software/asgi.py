@@ -0,0 +1,160 @@
+"""
+ @brief ASGI server mode for the user interface
+
+ /responses_stream is served on the asyncio event loop, so an open
+ browser tab holds a coroutine instead of a worker thread. Every other
+ request is passed to the Flask application through asgiref's WsgiToAsgi.
+
+ uvicorn --factory ground_software.asgi:create_application
+
+ Requires the optional uvicorn and asgiref packages.
+"""
+
+import asyncio
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from ground_software import create_app
+from ground_software.control import response_broadcaster
+from ground_software.response_broadcaster import (
+    KEEPALIVE_COMMENT,
+    KEEPALIVE_INTERVAL,
+    STREAM_HEADERS,
+    Subscription,
+    format_event,
+)
+
+STREAM_PATH = "/responses_stream"
+
+
+class AsyncSubscription(Subscription):
+    """Subscription whose events are awaited on an asyncio event loop.
+
+    The broadcaster thread hands each event to the loop, which applies the
+    same bounded queue and snapshot-on-overflow rule as Subscription.
+    """
+
+    def __init__(self, broadcaster, queue_size, last_event_id, loop):
+        super().__init__(broadcaster, queue_size, last_event_id)
+        self._loop = loop
+        self._events = asyncio.Queue(maxsize=queue_size)
+
+    async def get(self):
+        return await self._events.get()
+
+    def _offer(self, event, snapshot_event):
+        try:
+            self._loop.call_soon_threadsafe(self._offer_in_loop, event, snapshot_event)
+        except RuntimeError:
+            # The loop has closed; the stream is already gone.
+            pass
+
+    def _offer_in_loop(self, event, snapshot_event):
+        try:
+            self._events.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+        while not self._events.empty():
+            self._events.get_nowait()
+        self.resyncs += 1
+        self._events.put_nowait(snapshot_event)
+
+
+class StreamingApplication:
+    """ASGI application: native response streams, Flask for the rest."""
+
+    def __init__(self, flask_application):
+        self.flask_application = flask_application
+        self.wsgi_application = WsgiToAsgi(flask_application)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == STREAM_PATH:
+            await self._stream_responses(scope, receive, send)
+        else:
+            await self.wsgi_application(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for name in ("response_broadcaster", "pass_predictor"):
+                    worker = self.flask_application.extensions.get(name)
+                    if worker is not None:
+                        await asyncio.to_thread(worker.close)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _stream_responses(self, scope, receive, send):
+        with self.flask_application.app_context():
+            broadcaster = response_broadcaster()
+        subscription = AsyncSubscription(
+            broadcaster,
+            broadcaster.queue_size,
+            last_event_id(scope),
+            asyncio.get_running_loop(),
+        )
+        broadcaster.add(subscription)
+
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8")]
+        headers += [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in STREAM_HEADERS.items()
+        ]
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+        getter = None
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(subscription.get())
+                await asyncio.wait(
+                    {getter, disconnected},
+                    timeout=KEEPALIVE_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter.done():
+                    body = format_event(*getter.result())
+                    getter = None
+                elif disconnected.done():
+                    break
+                else:
+                    body = KEEPALIVE_COMMENT
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": body.encode("utf-8"),
+                        "more_body": True,
+                    }
+                )
+        finally:
+            subscription.close()
+            disconnected.cancel()
+            if getter is not None:
+                getter.cancel()
+
+
+def last_event_id(scope):
+    """Return the Last-Event-ID header, else the last_event_id query argument."""
+    for name, value in scope.get("headers", []):
+        if name.lower() == b"last-event-id" and value:
+            return value.decode("latin-1")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    values = query.get("last_event_id")
+    return values[0] if values else None
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+def create_application(test_config=None):
+    return StreamingApplication(create_app(test_config))
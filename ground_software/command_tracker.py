@@ -0,0 +1,204 @@
+"""
+ @brief Correlate satellite answers with commands and retransmit lost ones
+
+ The satellite answers a signed command with "ACK <sequence>" or
+ "NACK <sequence>" and, after an ACK, a RES frame. The ingest writer calls
+ correlate_response for each response in the transaction that stores it,
+ which moves the matching transmissions row through
+
+     transmitted -> acked -> responded    (or nacked)
+
+ and records the round trip in command_latency. A RES frame carries no
+ sequence, so it answers the oldest acked command. serial_write calls
+ retransmit_unacknowledged, which queues a command again when no ACK has
+ arrived ack_timeout seconds after it went on air, and marks it failed
+ after max_retries retransmissions. SetClock, PicTimes and SSDVTimes
+ carry the time they were signed at, so they are failed at once rather
+ than sent again late; the operator re-issues them. An acked command with
+ no RES after response_timeout seconds is closed as no_response and
+ recorded too.
+"""
+
+import logging
+import time
+
+from ground_software.database import PRIORITY_TIME_CRITICAL, REMOTE_FRAME, command_name
+
+ACK_TIMEOUT = 10.0  # seconds from on air to ACK before retransmitting
+MAX_RETRIES = 2
+RESPONSE_TIMEOUT = 30.0  # seconds from ACK to RES before giving up on the RES
+
+# States from which an ACK or NACK is accepted. A retransmission may be
+# queued or on its way when the ACK of an earlier attempt arrives, and a
+# late ACK still rescues a command that was given up on.
+UNANSWERED_STATES = ("pending", "sending", "transmitted", "failed")
+
+
+def parse_acknowledgement(text):
+    """Return (verb, command sequence) for a remote ACK or NACK text, else None."""
+    verb, _, rest = text.partition(" ")
+    if verb not in ("ACK", "NACK"):
+        return None
+    sequence = rest.strip()
+    if not sequence.isdigit():
+        return None
+    return verb, int(sequence)
+
+
+def correlate_response(connection, frame, text, kind, received_at=None):
+    """Update the transmission a response answers; return its id or None.
+
+    Runs inside the caller's write transaction, so the row is selected
+    and then updated without RETURNING, which SQLite before 3.35 lacks.
+    Only remote frames are matched: local radio answers name a command
+    code, not a sequence.
+    """
+    if frame[1:2] != REMOTE_FRAME:
+        return None
+    received_at = time.time() if received_at is None else received_at
+
+    acknowledgement = parse_acknowledgement(text)
+    if acknowledgement is not None:
+        verb, sequence = acknowledgement
+        status = "acked" if verb == "ACK" else "nacked"
+        placeholders = ", ".join("?" for _ in UNANSWERED_STATES)
+        row = connection.execute(
+            "SELECT id, command, attempts, COALESCE(on_air_at, transmitted_at) "
+            "FROM transmissions "
+            f"WHERE command_sequence = ? AND status IN ({placeholders}) "
+            "ORDER BY id DESC LIMIT 1",
+            (sequence, *UNANSWERED_STATES),
+        ).fetchone()
+        if row is None:
+            logging.info("%s %d matches no command awaiting an answer", verb, sequence)
+            return None
+        connection.execute(
+            "UPDATE transmissions SET status = ?, acked_at = ? WHERE id = ?",
+            (status, received_at, row[0]),
+        )
+        if status == "nacked":
+            _record_latency(connection, row, sequence, "nacked", received_at, None)
+        return row[0]
+
+    if kind.startswith("RES"):
+        row = connection.execute(
+            "SELECT id, command, attempts, COALESCE(on_air_at, transmitted_at), "
+            "acked_at, command_sequence FROM transmissions "
+            "WHERE status = 'acked' AND command_sequence IS NOT NULL "
+            "ORDER BY acked_at, id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE transmissions SET status = 'responded', responded_at = ? WHERE id = ?",
+            (received_at, row[0]),
+        )
+        outcome = "error" if kind == "RES ERR" else "responded"
+        _record_latency(connection, row[:4], row[5], outcome, row[4], received_at)
+        return row[0]
+    return None
+
+
+def _record_latency(connection, row, sequence, outcome, acked_at, responded_at):
+    transmission_id, command, attempts, sent_at = row
+
+    def since_sent(when):
+        if when is None or sent_at is None:
+            return None
+        return max(0.0, when - sent_at)
+
+    connection.execute(
+        "INSERT INTO command_latency (transmission_id, command_sequence, command, "
+        "outcome, attempts, ack_seconds, response_seconds, recorded_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            transmission_id,
+            sequence,
+            command_name(command),
+            outcome,
+            attempts + 1,
+            since_sent(acked_at),
+            since_sent(responded_at),
+            responded_at if responded_at is not None else acked_at,
+        ),
+    )
+
+
+def retransmit_unacknowledged(
+    connection,
+    ack_timeout=ACK_TIMEOUT,
+    max_retries=MAX_RETRIES,
+    now=None,
+    response_timeout=RESPONSE_TIMEOUT,
+):
+    """Queue unacknowledged commands again; return (requeued, failed) counts.
+
+    A command is unacknowledged when it is still transmitted ack_timeout
+    seconds after it went on air. It keeps its message_sequence, so it goes
+    out ahead of newer commands of its priority class. Time-critical
+    commands are failed instead, since their baked-in time would be stale
+    by the retry, and count as failed. Acked commands
+    still without a RES response_timeout seconds after their ACK are
+    closed as no_response and recorded in command_latency.
+    """
+    now = time.time() if now is None else now
+    cutoff = now - ack_timeout
+    response_cutoff = now - response_timeout
+    # Called on every serial_write loop: take the write lock only when a
+    # command is overdue. The read walks idx_transmissions_awaiting.
+    overdue = connection.execute(
+        "SELECT 1 FROM transmissions "
+        "WHERE status IN ('transmitted', 'acked') AND command_sequence IS NOT NULL AND ("
+        "  (status = 'transmitted' AND COALESCE(on_air_at, transmitted_at) < ?) "
+        "  OR (status = 'acked' AND acked_at < ?)"
+        ") LIMIT 1",
+        (cutoff, response_cutoff),
+    ).fetchone()
+    if overdue is None:
+        return 0, 0
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        stale = connection.execute(
+            "UPDATE transmissions SET status = 'failed' "
+            "WHERE status = 'transmitted' AND command_sequence IS NOT NULL "
+            "AND COALESCE(on_air_at, transmitted_at) < ? AND priority = ?",
+            (cutoff, PRIORITY_TIME_CRITICAL),
+        ).rowcount
+        failed = connection.execute(
+            "UPDATE transmissions SET status = 'failed' "
+            "WHERE status = 'transmitted' AND command_sequence IS NOT NULL "
+            "AND COALESCE(on_air_at, transmitted_at) < ? AND attempts >= ?",
+            (cutoff, max_retries),
+        ).rowcount
+        requeued = connection.execute(
+            "UPDATE transmissions "
+            "SET status = 'pending', attempts = attempts + 1, enqueued_at = ? "
+            "WHERE status = 'transmitted' AND command_sequence IS NOT NULL "
+            "AND COALESCE(on_air_at, transmitted_at) < ?",
+            (now, cutoff),
+        ).rowcount
+        unanswered = connection.execute(
+            "SELECT id, command, attempts, COALESCE(on_air_at, transmitted_at), "
+            "acked_at, command_sequence FROM transmissions "
+            "WHERE status = 'acked' AND command_sequence IS NOT NULL AND acked_at < ?",
+            (response_cutoff,),
+        ).fetchall()
+        for row in unanswered:
+            _record_latency(connection, row[:4], row[5], "no_response", row[4], None)
+        connection.executemany(
+            "UPDATE transmissions SET status = 'no_response' WHERE id = ?",
+            [(row[0],) for row in unanswered],
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    if stale:
+        logging.warning("%d unacknowledged time-critical commands failed; re-issue them", stale)
+    if failed:
+        logging.warning("%d commands unacknowledged after %d retries", failed, max_retries)
+    if requeued:
+        logging.info("Retransmitting %d unacknowledged commands", requeued)
+    if unanswered:
+        logging.warning("%d acknowledged commands got no response", len(unanswered))
+    return requeued, failed + stale
@@ -18,17 +18,37 @@ from flask import (
     render_template,
     request,
     session,
-    stream_with_context,
     url_for,
     jsonify,
 )
 import datetime
-import json
 import re
-import sqlite3
-import socket
 import time
-from ground_software.database import get_database, next_sequence_value
+from ground_software.database import (
+    PRIORITY_NAMES,
+    advance_sequence,
+    get_database,
+    shared_extension,
+    transmission_command_sequence,
+    transmission_priority,
+)
+from ground_software.notify import notifier_for
+from ground_software.response_broadcaster import (
+    KEEPALIVE_COMMENT,
+    KEEPALIVE_INTERVAL,
+    SNAPSHOT_QUERY,
+    STREAM_HEADERS,
+    UPDATE_QUERY,
+    ResponseBroadcaster,
+    format_event,
+    get_cleared_sequence,
+    serialize_response_rows,
+)
+try:
+    from ground_software.doppler_engine import GroundStation
+    from ground_software.passes import PassPredictor
+except ImportError:  # numpy and sgp4 are optional dependencies
+    PassPredictor = None
 import secrets
 import hashlib
 import hmac
@@ -42,6 +62,14 @@ FEND = b"\xC0"  # frame end
 REMOTE_FRAME = b"\xAA"
 CALLSIGN = b"\x0E"
 NOTIFY_SOCKET_PATH = "/tmp/radio_notify"
+PASSES_LIMIT = 20
+QUEUE_STATS_WINDOW = 3600  # seconds of transmitted rows behind the wait percentiles
+
+# Walks idx_passes_los; the table only holds the current prediction span.
+UPCOMING_PASSES_QUERY = (
+    "SELECT aos, los, max_elevation, max_elevation_time, aos_azimuth, los_azimuth "
+    "FROM passes WHERE los >= datetime('now') ORDER BY aos ASC LIMIT ?"
+)
 
 LOCAL_COMMAND_DEFINITIONS = [
     {
@@ -271,27 +299,64 @@ _SIGNING_SECRET = None
 
 
 def insert(command):
-    database = get_database()
     print(f"Command: {command}")
-    command = FEND + REMOTE_FRAME + command + FEND
-    message_sequence = next_message_sequence()
+    insert_local_frame(FEND + REMOTE_FRAME + command + FEND)
+
+
+def _queue_frame(database, frame, message_sequence):
     database.execute(
-        "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
-        (message_sequence, command),
+        "INSERT INTO transmissions "
+        "(message_sequence, command, priority, enqueued_at, command_sequence) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            message_sequence,
+            frame,
+            transmission_priority(frame),
+            time.time(),
+            transmission_command_sequence(frame),
+        ),
     )
-    database.commit()
-    notify_transmission()
 
 
 def insert_local_frame(command):
+    """Queue a frame in one write transaction; return its message_sequence."""
     database = get_database()
-    message_sequence = next_message_sequence()
-    database.execute(
-        "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
-        (message_sequence, command),
-    )
-    database.commit()
+    try:
+        database.execute("BEGIN IMMEDIATE")
+        message_sequence = advance_sequence(database, "message_sequence", 1)
+        _queue_frame(database, command, message_sequence)
+        database.commit()
+    except Exception:
+        database.rollback()
+        raise
+    notify_transmission()
+    return message_sequence
+
+
+def enqueue_command(command):
+    """Sign and queue a satellite command in one write transaction.
+
+    Both sequences are allocated, the command signed and the frame inserted
+    under one BEGIN IMMEDIATE, so a command costs one commit and the
+    serial processes wait on the lock once. Returns (command_sequence,
+    message_sequence).
+    """
+    # Read the secret first so a missing file fails before taking the lock.
+    get_signing_secret()
+    print(f"Command: {command}")
+    database = get_database()
+    try:
+        database.execute("BEGIN IMMEDIATE")
+        command_sequence = advance_sequence(database, "command_sequence", 1)
+        message_sequence = advance_sequence(database, "message_sequence", 1)
+        frame = FEND + REMOTE_FRAME + sign(command, command_sequence) + FEND
+        _queue_frame(database, frame, message_sequence)
+        database.commit()
+    except Exception:
+        database.rollback()
+        raise
     notify_transmission()
+    return command_sequence, message_sequence
 
 
 # Get UTC as a string
@@ -310,11 +375,29 @@ def now1m():
     ).strftime("%Y %m %d %H %M %S")
 
 
+# Quick action buttons that send a satellite command, built when pressed
+
+QUICK_COMMANDS = {
+    "NOP": lambda: "NoOperate",
+    "STP": lambda: "SendTestPacket",
+    "SRC": lambda: f"SetClock {now()}",
+    "GRC": lambda: "ReportT",
+    "PYC": lambda: "PayComms",
+    "SPT1": lambda: f"PicTimes {now1m()}",
+    "SBI0": lambda: "BeaconSp 0",
+    "SBI1": lambda: "BeaconSp 60",
+    "SBI3": lambda: "BeaconSp 180",
+    "GTY": lambda: "GetTelemetry",
+    "GPW": lambda: "GetPower",
+    "SDT1": lambda: f"SSDVTimes {now1m()}",
+}
+
+
 # Insert callsign command in database
 
 
 def callsign():
-    insert_local_frame(build_local_command_frame("0E", {}))
+    return insert_local_frame(build_local_command_frame("0E", {}))
 
 
 def normalize_local_code(local_code):
@@ -417,17 +500,7 @@ def command_definitions_for_template():
 
 
 def notify_transmission():
-    try:
-        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
-        notify_socket.connect(NOTIFY_SOCKET_PATH)
-        notify_socket.send(b"\x00")
-    except Exception:
-        pass
-    finally:
-        try:
-            notify_socket.close()
-        except Exception:
-            pass
+    notifier_for(NOTIFY_SOCKET_PATH).notify()
 
 
 def get_current_command_sequence():
@@ -487,10 +560,6 @@ def next_command_sequence():
         raise
 
 
-def next_message_sequence():
-    return next_sequence_value(get_database(), "message_sequence", 1)
-
-
 def get_signing_secret():
     global _SIGNING_SECRET
     if _SIGNING_SECRET is not None:
@@ -526,35 +595,12 @@ def clear_responses():
     database.commit()
 
 
-def get_cleared_sequence(database):
-    row = database.execute(
-        "SELECT value FROM settings WHERE key = ?", ("responses_cleared_sequence",)
-    ).fetchone()
-    if row and row["value"]:
-        try:
-            return int(row["value"])
-        except (TypeError, ValueError):
-            return 0
-    return 0
-
-
-def serialize_response_rows(rows):
-    return [
-        {
-            "message_sequence": row["message_sequence"],
-            "timestamp": row["timestamp"],
-            "response": row["response"].decode("utf-8", errors="replace"),
-        }
-        for row in rows
-    ]
-
-
 # User interface
 
 
 @blueprint.route("/", methods=["GET", "POST"])
 def index():
-    if request.method == "POST": 
+    if request.method == "POST":
         command = request.form.get("command")
         button = request.form.get("clicked_button")
         if button == "SetSequence":
@@ -562,79 +608,15 @@ def index():
                 set_command_sequence(request.form.get("command_sequence"))
             except ValueError:
                 flash("Invalid command sequence value")
-        elif command:
+        elif command or button in QUICK_COMMANDS:
             try:
-                insert(sign(command))
+                enqueue_command(command or QUICK_COMMANDS[button]())
             except RuntimeError as error:
                 flash(str(error))
-        else:
-            match button:
-                case "NOP":
-                    try:
-                        insert(sign("NoOperate"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "STP":
-                    try:
-                        insert(sign("SendTestPacket"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "SRC":
-                    try:
-                        insert(sign(f"SetClock {now()}"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "GRC":
-                    try:
-                        insert(sign("ReportT"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "PYC":
-                    try:
-                        insert(sign("PayComms"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "SPT1":
-                    try:
-                        insert(sign(f"PicTimes {now1m()}"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "SBI0":
-                    try:
-                        insert(sign("BeaconSp 0"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "SBI1":
-                    try:
-                        insert(sign("BeaconSp 60"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "SBI3":
-                    try:
-                        insert(sign("BeaconSp 180"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "GTY":
-                    try:
-                        insert(sign("GetTelemetry"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "GPW":
-                    try:
-                        insert(sign("GetPower"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "CallSign":
-                    callsign()
-                case "SDT1":
-                    try:
-                        insert(sign(f"SSDVTimes {now1m()}"))
-                    except RuntimeError as error:
-                        flash(str(error))
-                case "ClearResponses":
-                    clear_responses()
-                case _:
-                    pass
+        elif button == "CallSign":
+            callsign()
+        elif button == "ClearResponses":
+            clear_responses()
 
     # Render template
 
@@ -689,6 +671,66 @@ def radio():
     )
 
 
+# JSON command interface used by the pages' buttons
+
+
+@blueprint.route("/api/commands", methods=["POST"])
+def api_commands():
+    """Queue a satellite command given as text or as a quick action name.
+
+    Accepts {"command": "GetPower"} or {"action": "SRC"} and returns the
+    command and the sequences assigned to it.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    command = body.get("command")
+    action = body.get("action")
+    if command is not None and not isinstance(command, str):
+        return jsonify({"error": "command must be a string"}), 400
+    command = (command or "").strip()
+    if not command:
+        if not isinstance(action, str) or action not in QUICK_COMMANDS:
+            return jsonify({"error": "Provide a command or a known action"}), 400
+        command = QUICK_COMMANDS[action]()
+    try:
+        command_sequence, message_sequence = enqueue_command(command)
+    except RuntimeError as error:
+        return jsonify({"error": str(error)}), 503
+    return jsonify(
+        {
+            "command": command,
+            "command_sequence": command_sequence,
+            "message_sequence": message_sequence,
+        }
+    )
+
+
+@blueprint.route("/api/radio/local", methods=["POST"])
+def api_radio_local():
+    """Queue a local radio command built from JSON.
+
+    Accepts {"code": "07", "params": {"beacon": "ABCD"}} for the command
+    builder or {"code": "0E", "payload": "...", "raw": true} for a raw
+    frame, and returns the frame in hex and its message_sequence.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    try:
+        if body.get("raw"):
+            frame = build_raw_local_command_frame(body.get("code"), body.get("payload"))
+        else:
+            params = body.get("params") or {}
+            if not isinstance(params, dict):
+                raise ValueError("params must be an object")
+            frame = build_local_command_frame(body.get("code"), params)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+    message_sequence = insert_local_frame(frame)
+    return jsonify({"frame": frame.hex(" ").upper(), "message_sequence": message_sequence})
+
+
 @blueprint.route("/radio/rssi")
 def radio_rssi():
     raw_minutes = request.args.get("minutes", "15")
@@ -698,9 +740,11 @@ def radio_rssi():
         minutes = 15
     minutes = max(1, min(minutes, 240))
 
-    database = get_database()
+    database = get_database(read_only=True)
+    # Both queries walk the partial index idx_radio_logs_rssi.
     latest_row = database.execute(
-        "SELECT MAX(timestamp) AS latest_timestamp FROM radio_log_rssi"
+        "SELECT timestamp AS latest_timestamp FROM radio_logs "
+        "WHERE rssi_dbm IS NOT NULL ORDER BY timestamp DESC LIMIT 1"
     ).fetchone()
     latest_timestamp = latest_row["latest_timestamp"] if latest_row else None
 
@@ -709,8 +753,8 @@ def radio_rssi():
 
     rows = database.execute(
         "SELECT timestamp, message_sequence, rssi_dbm "
-        "FROM radio_log_rssi "
-        "WHERE timestamp >= datetime(?, ?) "
+        "FROM radio_logs "
+        "WHERE rssi_dbm IS NOT NULL AND timestamp >= datetime(?, ?) "
         "ORDER BY timestamp ASC, message_sequence ASC",
         (latest_timestamp, f"-{minutes} minutes"),
     ).fetchall()
@@ -730,7 +774,7 @@ def radio_rssi():
 @blueprint.route("/latest_responses")
 def latest_responses():
     # get cleared sequence if it exists
-    database = get_database()
+    database = get_database(read_only=True)
     cleared_sequence = get_cleared_sequence(database)
     after_sequence_raw = request.args.get("after_sequence")
     after_sequence = None
@@ -742,98 +786,167 @@ def latest_responses():
 
     if after_sequence is not None:
         minimum_sequence = max(cleared_sequence, after_sequence)
-        responses = database.execute(
-            "SELECT * FROM responses "
-            "WHERE message_sequence > ? AND CAST(substr(response, 3, 5) AS TEXT) NOT IN ('RES D','ACK D') "
-            "ORDER BY message_sequence ASC LIMIT 100",
-            (minimum_sequence,),
-        ).fetchall()
+        responses = database.execute(UPDATE_QUERY, (minimum_sequence,)).fetchall()
     else:
-        responses = database.execute(
-            "SELECT * FROM responses "
-            "WHERE message_sequence > ? AND CAST(substr(response, 3, 5) AS TEXT) NOT IN ('RES D','ACK D') "
-            "ORDER BY message_sequence DESC LIMIT 25",
-            (cleared_sequence,),
-        ).fetchall()
+        responses = database.execute(SNAPSHOT_QUERY, (cleared_sequence,)).fetchall()
     return jsonify(serialize_response_rows(responses))
 
 
+def response_broadcaster():
+    # One per process: a second one would rebind the notify socket.
+    return shared_extension(
+        "response_broadcaster",
+        lambda: ResponseBroadcaster(
+            current_app.config["DATABASE"],
+            poll_interval=current_app.config.get("RESPONSE_POLL_INTERVAL", 1.0),
+            queue_size=current_app.config.get("RESPONSE_STREAM_QUEUE_SIZE", 32),
+            notify_path=current_app.config.get("RESPONSE_NOTIFY_SOCKET_PATH"),
+            resume_limit=current_app.config.get("RESPONSE_RESUME_LIMIT", 200),
+        ),
+    )
+
+
 @blueprint.route("/responses_stream")
 def responses_stream():
-    database_path = current_app.config["DATABASE"]
-
-    def send_event(event_name, payload):
-        return f"event: {event_name}\ndata: {json.dumps(payload)}\n\n"
+    # EventSource sends Last-Event-ID when it reconnects by itself; the
+    # templates pass last_event_id when they open a new stream after an error.
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+        "last_event_id"
+    )
+    subscription = response_broadcaster().subscribe(last_event_id)
 
-    @stream_with_context
     def event_stream():
-        stream_database = sqlite3.connect(
-            database_path, detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        stream_database.row_factory = sqlite3.Row
-        last_sequence = 0
-        last_cleared_sequence = None
-        last_keepalive = time.monotonic()
         try:
             while True:
-                cleared_sequence = get_cleared_sequence(stream_database)
-                if (
-                    last_cleared_sequence is None
-                    or cleared_sequence != last_cleared_sequence
-                ):
-                    snapshot_rows = stream_database.execute(
-                        "SELECT * FROM responses "
-                        "WHERE message_sequence > ? AND CAST(substr(response, 3, 5) AS TEXT) NOT IN ('RES D','ACK D') "
-                        "ORDER BY message_sequence DESC LIMIT 25",
-                        (cleared_sequence,),
-                    ).fetchall()
-                    snapshot_payload = serialize_response_rows(snapshot_rows)
-                    if snapshot_payload:
-                        last_sequence = max(
-                            item["message_sequence"] for item in snapshot_payload
-                        )
-                    else:
-                        last_sequence = cleared_sequence
-
-                    last_cleared_sequence = cleared_sequence
-                    yield send_event("snapshot", snapshot_payload)
+                event = subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield KEEPALIVE_COMMENT
                 else:
-                    update_rows = stream_database.execute(
-                        "SELECT * FROM responses "
-                        "WHERE message_sequence > ? AND CAST(substr(response, 3, 5) AS TEXT) NOT IN ('RES D','ACK D') "
-                        "ORDER BY message_sequence ASC LIMIT 100",
-                        (last_sequence,),
-                    ).fetchall()
-                    if update_rows:
-                        update_payload = serialize_response_rows(update_rows)
-                        last_sequence = max(
-                            item["message_sequence"] for item in update_payload
-                        )
-                        yield send_event("responses", update_payload)
-                        last_keepalive = time.monotonic()
-                    elif time.monotonic() - last_keepalive >= 15:
-                        yield ": keepalive\n\n"
-                        last_keepalive = time.monotonic()
-
-                time.sleep(1)
+                    yield format_event(*event)
         finally:
-            stream_database.close()
-
-    headers = {
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "X-Accel-Buffering": "no",
+            subscription.close()
+
+    return Response(event_stream(), mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+
+def queue_statistics(database, window=QUEUE_STATS_WINDOW):
+    """Pending depth and queue latency per priority class.
+
+    Pending counts come from idx_transmissions_queue. Over rows transmitted
+    in the last window seconds (idx_transmissions_transmitted), wait is
+    transmitted_at - enqueued_at and on_air is the estimated on_air_at -
+    enqueued_at from serial_write's airtime model.
+    """
+    now = time.time()
+    classes = {
+        name: {
+            "pending": 0,
+            "oldest_pending_seconds": None,
+            "transmitted": 0,
+            "wait_p50_seconds": None,
+            "wait_p99_seconds": None,
+            "wait_max_seconds": None,
+            "on_air_p50_seconds": None,
+            "on_air_p99_seconds": None,
+        }
+        for name in PRIORITY_NAMES.values()
     }
-    return Response(event_stream(), mimetype="text/event-stream", headers=headers)
+    pending_rows = database.execute(
+        "SELECT priority, COUNT(*) AS pending, MIN(enqueued_at) AS oldest "
+        "FROM transmissions WHERE status = 'pending' GROUP BY priority"
+    ).fetchall()
+    for row in pending_rows:
+        summary = classes.get(PRIORITY_NAMES.get(row["priority"]))
+        if summary is None:
+            continue
+        summary["pending"] = row["pending"]
+        if row["oldest"] is not None:
+            summary["oldest_pending_seconds"] = round(now - row["oldest"], 3)
+
+    waits = {}
+    on_air = {}
+    for row in database.execute(
+        "SELECT priority, transmitted_at - enqueued_at AS wait, "
+        "on_air_at - enqueued_at AS on_air FROM transmissions "
+        "WHERE transmitted_at >= ? AND enqueued_at IS NOT NULL",
+        (now - window,),
+    ):
+        waits.setdefault(row["priority"], []).append(max(0.0, row["wait"]))
+        if row["on_air"] is not None:
+            on_air.setdefault(row["priority"], []).append(max(0.0, row["on_air"]))
+
+    def percentile(values, fraction):
+        return round(values[min(len(values) - 1, int(fraction * len(values)))], 3)
+
+    for priority, values in waits.items():
+        summary = classes.get(PRIORITY_NAMES.get(priority))
+        if summary is None:
+            continue
+        values.sort()
+        summary.update(
+            transmitted=len(values),
+            wait_p50_seconds=percentile(values, 0.5),
+            wait_p99_seconds=percentile(values, 0.99),
+            wait_max_seconds=round(values[-1], 3),
+        )
+        latencies = sorted(on_air.get(priority, []))
+        if latencies:
+            summary.update(
+                on_air_p50_seconds=percentile(latencies, 0.5),
+                on_air_p99_seconds=percentile(latencies, 0.99),
+            )
+    return classes
+
+
+@blueprint.route("/queue/stats")
+def queue_stats():
+    return jsonify(queue_statistics(get_database(read_only=True)))
+
+
+def pass_predictor():
+    """Return the application's PassPredictor, or None if it cannot run."""
+    if PassPredictor is None or current_app.config.get("STATION_LATITUDE") is None:
+        return None
+    return shared_extension(
+        "pass_predictor",
+        lambda: PassPredictor(
+            current_app.config["DATABASE"],
+            current_app.config["TLE_PATH"],
+            GroundStation(
+                current_app.config["STATION_LATITUDE"],
+                current_app.config["STATION_LONGITUDE"],
+                current_app.config.get("STATION_ALTITUDE", 0.0),
+            ),
+            name=current_app.config.get("SATELLITE_NAME", "SILVERSAT"),
+            days=current_app.config.get("PASS_PREDICTION_DAYS", 3),
+        ),
+    )
+
+
+@blueprint.route("/passes")
+def passes():
+    # Prediction runs on the predictor's thread; this answers from the table.
+    predictor = pass_predictor()
+    if predictor is None:
+        status = "unavailable"
+    else:
+        predictor.request_refresh()
+        status = predictor.status
+    database = get_database(read_only=True)
+    rows = database.execute(UPCOMING_PASSES_QUERY, (PASSES_LIMIT,)).fetchall()
+    return jsonify({"status": status, "passes": [dict(row) for row in rows]})
 
 
 # Generate signed command
 
 
-def sign(command):
+def sign(command, sequence=None):
+    """Sign command with sequence, or with the next command sequence if None."""
     secret = get_signing_secret()
     salt = secrets.token_bytes(8)
-    sequence = str(next_command_sequence()).zfill(8).encode("utf-8")
+    if sequence is None:
+        sequence = next_command_sequence()
+    sequence = str(sequence).zfill(8).encode("utf-8")
     command = command.encode("utf-8")
     computed_hmac = hmac.new(secret, digestmod=hashlib.blake2s)
     computed_hmac.update(salt)
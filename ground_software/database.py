@@ -6,30 +6,297 @@
  This program initializes and migrates the database
 """
 
+import re
 import sqlite3
+import threading
+import time
 import click
 from flask import current_app, g
 
 
-def get_database():
-    if "database" not in g:
-        g.database = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.database.row_factory = sqlite3.Row
-    return g.database
+SCHEMA_VERSION = 6
+BACKFILL_CHUNK_ROWS = 5000
+
+# Pragmas shared by the web application and the serial processes
+
+BUSY_TIMEOUT_MS = 5000
+PRAGMA_PROFILE = (
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),  # KiB
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+DEFAULT_POOL_SIZE = 4
+
+
+def apply_connection_profile(connection, busy_timeout_ms=BUSY_TIMEOUT_MS):
+    connection.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        # WAL mode persists in the file; a locked database keeps its mode.
+        pass
+    for name, value in PRAGMA_PROFILE:
+        connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+def open_connection(db_path, read_only=False, check_same_thread=True):
+    connection = sqlite3.connect(
+        db_path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=check_same_thread,
+    )
+    connection.row_factory = sqlite3.Row
+    apply_connection_profile(connection)
+    if read_only:
+        connection.execute("PRAGMA query_only = ON")
+    return connection
+
+
+class ConnectionPool:
+    """Keep idle connections across requests so the page cache stays warm.
+
+    Read-only connections are pooled separately from read-write ones. A
+    size of 0 disables pooling and closes every connection on release.
+    """
+
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.opened = 0
+        self._idle = {False: [], True: []}
+        self._lock = threading.Lock()
+
+    def acquire(self, read_only=False):
+        with self._lock:
+            idle = self._idle[read_only]
+            if idle:
+                return idle.pop()
+            self.opened += 1
+        return open_connection(self.db_path, read_only, check_same_thread=False)
+
+    def release(self, connection, read_only=False):
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            connection.close()
+            return
+        with self._lock:
+            idle = self._idle[read_only]
+            if len(idle) < self.size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            connections = self._idle[False] + self._idle[True]
+            self._idle = {False: [], True: []}
+        for connection in connections:
+            connection.close()
+
+
+_extensions_lock = threading.Lock()
+
+
+def shared_extension(name, create):
+    """Return current_app.extensions[name], made by create() once per database.
+
+    Concurrent first requests under the threaded server would otherwise
+    each build one; the instance must have a db_path attribute.
+    """
+    instance = current_app.extensions.get(name)
+    if instance is None or instance.db_path != current_app.config["DATABASE"]:
+        with _extensions_lock:
+            instance = current_app.extensions.get(name)
+            if instance is None or instance.db_path != current_app.config["DATABASE"]:
+                instance = create()
+                current_app.extensions[name] = instance
+    return instance
+
+
+def _connection_pool():
+    return shared_extension(
+        "database_pool",
+        lambda: ConnectionPool(
+            current_app.config["DATABASE"],
+            current_app.config.get("DATABASE_POOL_SIZE", DEFAULT_POOL_SIZE),
+        ),
+    )
+
+
+def get_database(read_only=False):
+    """Return this request's connection; read_only suits GET handlers."""
+    key = "read_only_database" if read_only else "database"
+    if key not in g:
+        setattr(g, key, _connection_pool().acquire(read_only))
+    return getattr(g, key)
 
 
 def close_database(e=None):
-    database = g.pop("database", None)
-    if database is not None:
-        database.close()
+    pool = current_app.extensions.get("database_pool")
+    for key, read_only in (("database", False), ("read_only_database", True)):
+        database = g.pop(key, None)
+        if database is None:
+            continue
+        if pool is None:
+            database.close()
+        else:
+            pool.release(database, read_only)
+
+
+# RSSI in dBm from radio log lines such as "N: rssi -97 dBm". The Python
+# and SQL versions must agree: ingest uses the former, the insert trigger
+# and the migration backfill use the latter.
+
+_SQL_REAL_PREFIX = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def parse_rssi_dbm(log_line):
+    start = log_line.lower().find("n: rssi")
+    if start < 0:
+        return None
+    value = log_line[start + 7 :]
+    end = value.lower().find("dbm")
+    if end >= 0:
+        value = value[:end]
+    value = value.replace("=", "").replace(":", "").strip(" ")
+    match = _SQL_REAL_PREFIX.match(value)
+    # CAST(... AS REAL) yields 0.0 when there is no numeric prefix.
+    return float(match.group()) if match else 0.0
+
+
+def _rssi_dbm_sql(column):
+    rssi_start = f"instr(lower({column}), 'n: rssi')"
+    return (
+        "CAST(TRIM(REPLACE(REPLACE(CASE "
+        f"WHEN instr(lower(substr({column}, {rssi_start})), 'dbm') > 0 THEN "
+        f"substr({column}, {rssi_start} + 7, "
+        f"instr(lower(substr({column}, {rssi_start} + 7)), 'dbm') - 1) "
+        f"ELSE substr({column}, {rssi_start} + 7) END, '=', ''), ':', '')) AS REAL)"
+    )
+
+
+# Decoded text and kind of a response frame, e.g. "RES GTY", "ACK D" or
+# "NACK". Remote ACK/NACK frames carry a command sequence, not a subtype.
+# Text can differ from the SQL version only for frames that are not UTF-8.
+
+REMOTE_FRAME = b"\xAA"
+RESPONSE_VERBS = ("ACK", "NACK", "RES")
+
+
+def classify_response(frame):
+    text = frame[2:-1].decode("utf-8", errors="replace")
+    verb, _, rest = text.partition(" ")
+    if verb not in RESPONSE_VERBS:
+        return text, ""
+    subtype = rest.partition(" ")[0]
+    if not subtype or (verb != "RES" and frame[1:2] == REMOTE_FRAME):
+        return text, verb
+    return text, f"{verb} {subtype}"
+
+
+def _response_text_sql(column):
+    return f"CAST(substr({column}, 3, length({column}) - 3) AS TEXT)"
+
+
+def _response_kind_sql(column):
+    text = _response_text_sql(column)
+    space = f"instr({text}, ' ')"
+    verb = f"(CASE WHEN {space} > 0 THEN substr({text}, 1, {space} - 1) ELSE {text} END)"
+    rest = f"substr({text}, {space} + 1)"
+    subtype = (
+        f"(CASE WHEN instr({rest}, ' ') > 0 "
+        f"THEN substr({rest}, 1, instr({rest}, ' ') - 1) ELSE {rest} END)"
+    )
+    return (
+        f"(CASE WHEN {verb} NOT IN ('ACK', 'NACK', 'RES') THEN '' "
+        f"WHEN {space} = 0 OR {subtype} = '' THEN {verb} "
+        f"WHEN {verb} <> 'RES' AND substr({column}, 2, 1) = x'AA' THEN {verb} "
+        f"ELSE {verb} || ' ' || {subtype} END)"
+    )
+
+
+# Priority class of a queued frame. serial_write sends lower classes first
+# and keeps message_sequence order within a class: Doppler and other local
+# radio frames, then satellite commands that carry a time, then the rest.
+# The SQL version fills rows inserted without a priority.
+
+PRIORITY_RADIO = 0
+PRIORITY_TIME_CRITICAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {
+    PRIORITY_RADIO: "radio",
+    PRIORITY_TIME_CRITICAL: "time_critical",
+    PRIORITY_BULK: "bulk",
+}
+TIME_CRITICAL_COMMANDS = ("SetClock", "PicTimes", "SSDVTimes")
+SIGNATURE_LENGTH = 88  # HMAC hex, salt hex and command sequence before the command
+
+
+def command_name(frame):
+    """Return the command verb of a signed remote frame, e.g. "GetTelemetry"."""
+    command = frame[2 + SIGNATURE_LENGTH : -1]
+    return command.split(b" ", 1)[0].decode("utf-8", errors="replace")
+
+
+def transmission_priority(frame):
+    if frame[1:2] != REMOTE_FRAME:
+        return PRIORITY_RADIO
+    return PRIORITY_TIME_CRITICAL if command_name(frame) in TIME_CRITICAL_COMMANDS else PRIORITY_BULK
+
+
+def _transmission_priority_sql(column):
+    command = (
+        f"CAST(substr({column}, {3 + SIGNATURE_LENGTH}, "
+        f"length({column}) - {3 + SIGNATURE_LENGTH}) AS TEXT)"
+    )
+    verb = f"substr({command}, 1, instr({command} || ' ', ' ') - 1)"
+    verbs = ", ".join(f"'{verb_name}'" for verb_name in TIME_CRITICAL_COMMANDS)
+    return (
+        f"(CASE WHEN substr({column}, 2, 1) <> x'AA' THEN {PRIORITY_RADIO} "
+        f"WHEN {verb} IN ({verbs}) THEN {PRIORITY_TIME_CRITICAL} "
+        f"ELSE {PRIORITY_BULK} END)"
+    )
+
+
+# Command sequence of a signed remote frame: the eight digits that end the
+# signature. The satellite's ACK and NACK frames name it.
+
+COMMAND_SEQUENCE_LENGTH = 8
+
+
+def transmission_command_sequence(frame):
+    if frame[1:2] != REMOTE_FRAME:
+        return None
+    digits = frame[2 + SIGNATURE_LENGTH - COMMAND_SEQUENCE_LENGTH : 2 + SIGNATURE_LENGTH]
+    if len(digits) != COMMAND_SEQUENCE_LENGTH or not digits.isdigit():
+        return None
+    return int(digits)
+
+
+def _transmission_command_sequence_sql(column):
+    start = 3 + SIGNATURE_LENGTH - COMMAND_SEQUENCE_LENGTH
+    digits = f"CAST(substr({column}, {start}, {COMMAND_SEQUENCE_LENGTH}) AS TEXT)"
+    pattern = "[0-9]" * COMMAND_SEQUENCE_LENGTH
+    return (
+        f"(CASE WHEN substr({column}, 2, 1) = x'AA' AND {digits} GLOB '{pattern}' "
+        f"THEN CAST({digits} AS INTEGER) END)"
+    )
+
+
+# Unix time in seconds with a fractional part, as time.time() returns it.
+_UNIX_TIME_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
 
 
 def init_database():
     database = get_database()
     with current_app.open_resource("schema.sql") as schema:
         database.executescript(schema.read().decode("utf8"))
+    # Insert triggers and the schema version are maintained by the migration.
+    migrate_database()
 
 
 def _column_exists(database, table_name, column_name):
@@ -44,7 +311,15 @@ def _ensure_base_tables(database):
         "timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, "
         "message_sequence INTEGER, "
         "command NOT NULL, "
-        "status NOT NULL DEFAULT 'pending'"
+        "status NOT NULL DEFAULT 'pending', "
+        "priority INTEGER, "
+        "enqueued_at REAL, "
+        "transmitted_at REAL, "
+        "on_air_at REAL, "
+        "command_sequence INTEGER, "
+        "attempts INTEGER NOT NULL DEFAULT 0, "
+        "acked_at REAL, "
+        "responded_at REAL"
         ")"
     )
     database.execute(
@@ -52,7 +327,10 @@ def _ensure_base_tables(database):
         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
         "timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, "
         "message_sequence INTEGER, "
-        "response NOT NULL"
+        "response NOT NULL, "
+        "text TEXT, "
+        "kind TEXT, "
+        "transmission_id INTEGER"
         ")"
     )
     database.execute(
@@ -60,7 +338,8 @@ def _ensure_base_tables(database):
         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
         "timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, "
         "message_sequence INTEGER, "
-        "log_line TEXT NOT NULL"
+        "log_line TEXT NOT NULL, "
+        "rssi_dbm REAL"
         ")"
     )
     database.execute(
@@ -80,6 +359,40 @@ def _ensure_message_sequence_columns(database):
         database.execute("ALTER TABLE radio_logs ADD COLUMN message_sequence INTEGER")
 
 
+def _schema_version(database):
+    row = database.execute(
+        "SELECT value FROM settings WHERE key = ?", ("schema_version",)
+    ).fetchone()
+    try:
+        return int(row["value"]) if row else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _migrate_radio_log_rssi(database, schema_version):
+    if not _column_exists(database, "radio_logs", "rssi_dbm"):
+        database.execute("ALTER TABLE radio_logs ADD COLUMN rssi_dbm REAL")
+    if schema_version < 3:
+        database.execute(
+            f"UPDATE radio_logs SET rssi_dbm = {_rssi_dbm_sql('log_line')} "
+            "WHERE rssi_dbm IS NULL AND instr(lower(log_line), 'n: rssi') > 0"
+        )
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_radio_logs_rssi "
+        "ON radio_logs(timestamp, message_sequence) WHERE rssi_dbm IS NOT NULL"
+    )
+    # Rows inserted without rssi_dbm, e.g. by hand, are parsed on insert.
+    database.execute("DROP TRIGGER IF EXISTS radio_logs_rssi_dbm")
+    database.execute(
+        "CREATE TRIGGER radio_logs_rssi_dbm AFTER INSERT ON radio_logs "
+        "WHEN NEW.rssi_dbm IS NULL AND instr(lower(NEW.log_line), 'n: rssi') > 0 "
+        "BEGIN "
+        f"UPDATE radio_logs SET rssi_dbm = {_rssi_dbm_sql('NEW.log_line')} "
+        "WHERE id = NEW.id; "
+        "END"
+    )
+
+
 def _backfill_message_sequence(database):
     database.execute("DROP TABLE IF EXISTS _message_order")
     database.execute(
@@ -142,6 +455,165 @@ def _backfill_message_sequence(database):
     )
 
 
+def _migrate_response_classification(database, schema_version):
+    if not _column_exists(database, "responses", "text"):
+        database.execute("ALTER TABLE responses ADD COLUMN text TEXT")
+    if not _column_exists(database, "responses", "kind"):
+        database.execute("ALTER TABLE responses ADD COLUMN kind TEXT")
+    if schema_version < 4:
+        # Commit per chunk so the serial processes are not locked out.
+        database.commit()
+        max_id = database.execute("SELECT COALESCE(MAX(id), 0) FROM responses").fetchone()[0]
+        for start in range(0, max_id, BACKFILL_CHUNK_ROWS):
+            database.execute(
+                f"UPDATE responses SET text = {_response_text_sql('response')}, "
+                f"kind = {_response_kind_sql('response')} "
+                "WHERE id > ? AND id <= ? AND text IS NULL",
+                (start, start + BACKFILL_CHUNK_ROWS),
+            )
+            database.commit()
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_responses_visible "
+        "ON responses(message_sequence) WHERE kind NOT IN ('ACK D', 'RES D')"
+    )
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_responses_kind "
+        "ON responses(kind, message_sequence)"
+    )
+    database.execute("DROP TRIGGER IF EXISTS responses_classify")
+    database.execute(
+        "CREATE TRIGGER responses_classify AFTER INSERT ON responses "
+        "WHEN NEW.text IS NULL "
+        "BEGIN "
+        f"UPDATE responses SET text = {_response_text_sql('response')}, "
+        f"kind = {_response_kind_sql('response')} "
+        "WHERE id = NEW.id; "
+        "END"
+    )
+
+
+def _migrate_transmission_queue(database, schema_version):
+    for column in (
+        "priority INTEGER",
+        "enqueued_at REAL",
+        "transmitted_at REAL",
+        "on_air_at REAL",
+    ):
+        if not _column_exists(database, "transmissions", column.split()[0]):
+            database.execute(f"ALTER TABLE transmissions ADD COLUMN {column}")
+    if schema_version < 5:
+        # Commit per chunk so the serial processes are not locked out.
+        database.commit()
+        max_id = database.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM transmissions"
+        ).fetchone()[0]
+        for start in range(0, max_id, BACKFILL_CHUNK_ROWS):
+            database.execute(
+                f"UPDATE transmissions SET priority = {_transmission_priority_sql('command')}, "
+                "enqueued_at = (julianday(timestamp) - 2440587.5) * 86400.0 "
+                "WHERE id > ? AND id <= ? AND priority IS NULL",
+                (start, start + BACKFILL_CHUNK_ROWS),
+            )
+            database.commit()
+    # serial_write claims, and gpredict coalesces, by scanning pending rows
+    # in priority and message_sequence order.
+    database.execute("DROP INDEX IF EXISTS idx_transmissions_pending")
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transmissions_queue "
+        "ON transmissions(status, priority, message_sequence) WHERE status = 'pending'"
+    )
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transmissions_transmitted "
+        "ON transmissions(transmitted_at) WHERE transmitted_at IS NOT NULL"
+    )
+
+
+def _migrate_command_tracking(database, schema_version):
+    for column in (
+        "command_sequence INTEGER",
+        "attempts INTEGER NOT NULL DEFAULT 0",
+        "acked_at REAL",
+        "responded_at REAL",
+    ):
+        if not _column_exists(database, "transmissions", column.split()[0]):
+            database.execute(f"ALTER TABLE transmissions ADD COLUMN {column}")
+    if not _column_exists(database, "responses", "transmission_id"):
+        database.execute("ALTER TABLE responses ADD COLUMN transmission_id INTEGER")
+    if schema_version < 6:
+        # Commit per chunk so the serial processes are not locked out.
+        database.commit()
+        max_id = database.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM transmissions"
+        ).fetchone()[0]
+        for start in range(0, max_id, BACKFILL_CHUNK_ROWS):
+            database.execute(
+                "UPDATE transmissions "
+                f"SET command_sequence = {_transmission_command_sequence_sql('command')} "
+                "WHERE id > ? AND id <= ? AND command_sequence IS NULL "
+                "AND substr(command, 2, 1) = x'AA'",
+                (start, start + BACKFILL_CHUNK_ROWS),
+            )
+            database.commit()
+    # command_tracker matches an ACK or NACK by command sequence, and scans
+    # the few commands still awaiting an answer for RES frames and retries.
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transmissions_command_sequence "
+        "ON transmissions(command_sequence) WHERE command_sequence IS NOT NULL"
+    )
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_transmissions_awaiting "
+        "ON transmissions(status, command_sequence) "
+        "WHERE status IN ('transmitted', 'acked') AND command_sequence IS NOT NULL"
+    )
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS command_latency("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "transmission_id INTEGER NOT NULL, "
+        "command_sequence INTEGER NOT NULL, "
+        "command TEXT NOT NULL, "
+        "outcome TEXT NOT NULL, "
+        "attempts INTEGER NOT NULL, "
+        "ack_seconds REAL, "
+        "response_seconds REAL, "
+        "recorded_at REAL NOT NULL"
+        ")"
+    )
+    database.execute(
+        "CREATE INDEX IF NOT EXISTS idx_command_latency_command "
+        "ON command_latency(command, recorded_at)"
+    )
+    database.execute("DROP TRIGGER IF EXISTS transmissions_classify")
+    database.execute(
+        "CREATE TRIGGER transmissions_classify AFTER INSERT ON transmissions "
+        "WHEN NEW.priority IS NULL OR NEW.enqueued_at IS NULL "
+        "OR (NEW.command_sequence IS NULL AND substr(NEW.command, 2, 1) = x'AA') "
+        "BEGIN "
+        "UPDATE transmissions SET "
+        f"priority = COALESCE(priority, {_transmission_priority_sql('command')}), "
+        f"enqueued_at = COALESCE(enqueued_at, {_UNIX_TIME_SQL}), "
+        "command_sequence = COALESCE("
+        f"command_sequence, {_transmission_command_sequence_sql('command')}) "
+        "WHERE id = NEW.id; "
+        "END"
+    )
+
+
+def _migrate_passes(database):
+    # Filled by passes.PassPredictor; the key of its inputs is in settings.
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS passes("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "aos TEXT NOT NULL, "
+        "los TEXT NOT NULL, "
+        "max_elevation REAL NOT NULL, "
+        "max_elevation_time TEXT NOT NULL, "
+        "aos_azimuth REAL, "
+        "los_azimuth REAL"
+        ")"
+    )
+    database.execute("CREATE INDEX IF NOT EXISTS idx_passes_los ON passes(los)")
+
+
 def _migrate_cleared_responses_setting(database):
     cleared_sequence_row = database.execute(
         "SELECT value FROM settings WHERE key = ?", ("responses_cleared_sequence",)
@@ -167,6 +639,15 @@ def _migrate_cleared_responses_setting(database):
 
 
 def _update_message_sequence_setting(database):
+    # Never move the counter backward: ingest processes may hold reserved
+    # blocks above the highest stored sequence.
+    current_row = database.execute(
+        "SELECT value FROM settings WHERE key = ?", ("message_sequence",)
+    ).fetchone()
+    try:
+        current_sequence = int(current_row["value"]) if current_row else 0
+    except (TypeError, ValueError):
+        current_sequence = 0
     max_tx_row = database.execute(
         "SELECT COALESCE(MAX(message_sequence), 0) AS max_seq FROM transmissions"
     ).fetchone()
@@ -177,8 +658,10 @@ def _update_message_sequence_setting(database):
         "SELECT COALESCE(MAX(message_sequence), 0) AS max_seq FROM radio_logs"
     ).fetchone()
     next_sequence = max(
-        max_tx_row["max_seq"], max_rsp_row["max_seq"], max_log_row["max_seq"], 0
-    ) + 1
+        max(max_tx_row["max_seq"], max_rsp_row["max_seq"], max_log_row["max_seq"], 0)
+        + 1,
+        current_sequence,
+    )
     database.execute(
         "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
         ("message_sequence", str(next_sequence)),
@@ -197,72 +680,75 @@ def _refresh_views(database):
         "SELECT id, timestamp, message_sequence, "
         "substr(response, 3, length(response) - 3) AS response "
         "FROM responses "
-        "WHERE CAST(SUBSTR(response, 3, 5) AS TEXT) NOT IN ('ACK D', 'RES D');"
+        "WHERE kind NOT IN ('ACK D', 'RES D');"
         "DROP VIEW IF EXISTS combined_messages;"
         "CREATE VIEW combined_messages AS "
         "SELECT message_sequence, timestamp, 'transmission' AS type, "
         "CAST(SUBSTR(command, 3, LENGTH(command) - 3) AS TEXT) AS message "
         "FROM transmissions WHERE SUBSTR(command, 2, 1) <> x'0D' "
         "UNION ALL "
-        "SELECT message_sequence, timestamp, 'response' AS type, "
-        "CAST(SUBSTR(response, 3, LENGTH(response) - 3) AS TEXT) AS message "
+        "SELECT message_sequence, timestamp, 'response' AS type, text AS message "
         "FROM responses "
-        "WHERE CAST(SUBSTR(response, 3, 5) AS TEXT) NOT IN ('ACK D', 'RES D') "
+        "WHERE kind NOT IN ('ACK D', 'RES D') "
         "UNION ALL "
         "SELECT message_sequence, timestamp, 'radio_log' AS type, log_line AS message "
         "FROM radio_logs "
         "ORDER BY message_sequence;"
         "DROP VIEW IF EXISTS radio_log_rssi;"
         "CREATE VIEW radio_log_rssi AS "
-        "SELECT id, timestamp, message_sequence, log_line, "
-        "CAST(TRIM(REPLACE(REPLACE(CASE "
-        "WHEN instr(lower(substr(log_line, instr(lower(log_line), 'n: rssi'))), 'dbm') > 0 THEN "
-        "substr(log_line, instr(lower(log_line), 'n: rssi') + 7, "
-        "instr(lower(substr(log_line, instr(lower(log_line), 'n: rssi') + 7)), 'dbm') - 1) "
-        "ELSE substr(log_line, instr(lower(log_line), 'n: rssi') + 7) END, '=', ''), ':', '')) AS REAL) "
-        "AS rssi_dbm "
+        "SELECT id, timestamp, message_sequence, log_line, rssi_dbm "
         "FROM radio_logs "
-        "WHERE instr(lower(log_line), 'n: rssi') > 0;"
+        "WHERE rssi_dbm IS NOT NULL;"
     )
 
 
 def migrate_database():
     database = get_database()
     _ensure_base_tables(database)
+    schema_version = _schema_version(database)
     _ensure_message_sequence_columns(database)
     _backfill_message_sequence(database)
+    _migrate_radio_log_rssi(database, schema_version)
+    _migrate_response_classification(database, schema_version)
+    _migrate_transmission_queue(database, schema_version)
+    _migrate_command_tracking(database, schema_version)
+    _migrate_passes(database)
     _migrate_cleared_responses_setting(database)
     _update_message_sequence_setting(database)
     _refresh_views(database)
     database.execute(
         "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-        ("schema_version", "2"),
+        ("schema_version", str(SCHEMA_VERSION)),
     )
     database.commit()
 
 
-def next_sequence_value(database, key, initial_value=1):
-    cursor = database.cursor()
+def advance_sequence(database, key, count, initial_value=1):
+    """Advance key by count inside the caller's transaction; return the first value."""
+    row = database.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+
+    current_value = initial_value
+    if row is not None:
+        value = row[0] if not isinstance(row, sqlite3.Row) else row["value"]
+        if value is not None:
+            try:
+                current_value = int(value)
+            except (TypeError, ValueError):
+                current_value = initial_value
+
+    database.execute(
+        "INSERT INTO settings (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(current_value + count)),
+    )
+    return current_value
+
+
+def reserve_sequence_block(database, key, count, initial_value=1):
+    """Reserve count consecutive values of key and return the first one."""
     try:
-        cursor.execute("BEGIN IMMEDIATE")
-        row = cursor.execute(
-            "SELECT value FROM settings WHERE key = ?", (key,)
-        ).fetchone()
-
-        current_value = initial_value
-        if row is not None:
-            value = row[0] if not isinstance(row, sqlite3.Row) else row["value"]
-            if value is not None:
-                try:
-                    current_value = int(value)
-                except (TypeError, ValueError):
-                    current_value = initial_value
-
-        cursor.execute(
-            "INSERT INTO settings (key, value) VALUES (?, ?) "
-            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
-            (key, str(current_value + 1)),
-        )
+        database.execute("BEGIN IMMEDIATE")
+        current_value = advance_sequence(database, key, count, initial_value)
         database.commit()
         return current_value
     except Exception:
@@ -270,6 +756,63 @@ def next_sequence_value(database, key, initial_value=1):
         raise
 
 
+def next_sequence_value(database, key, initial_value=1):
+    return reserve_sequence_block(database, key, 1, initial_value)
+
+
+class SequenceAllocator:
+    """Hand out sequence values from blocks reserved in one transaction.
+
+    Blocks come from the shared settings row, so values stay unique across
+    processes. A partly used block is abandoned once it is older than
+    max_block_age seconds, which bounds how far values handed out by
+    concurrent processes can interleave out of time order. Paths whose
+    rows must sort after everything committed before them, such as the
+    ingest writer, call advance_sequence in their own transaction instead.
+    """
+
+    def __init__(
+        self, key="message_sequence", block_size=64, max_block_age=1.0, initial_value=1
+    ):
+        self.key = key
+        self.block_size = block_size
+        self.max_block_age = max_block_age
+        self.initial_value = initial_value
+        self.reservations = 0
+        self.allocated = 0
+        self._next_value = 0
+        self._block_end = 0
+        self._reserved_at = 0.0
+        self._lock = threading.Lock()
+
+    def _block_expired(self):
+        if self.max_block_age is None:
+            return False
+        return time.monotonic() - self._reserved_at > self.max_block_age
+
+    def next_values(self, database, count):
+        """Return count increasing values; database must not be in a transaction."""
+        values = []
+        with self._lock:
+            while len(values) < count:
+                if self._next_value >= self._block_end or self._block_expired():
+                    block_size = max(self.block_size, count - len(values))
+                    self._next_value = reserve_sequence_block(
+                        database, self.key, block_size, self.initial_value
+                    )
+                    self._block_end = self._next_value + block_size
+                    self._reserved_at = time.monotonic()
+                    self.reservations += 1
+                taken = min(count - len(values), self._block_end - self._next_value)
+                values.extend(range(self._next_value, self._next_value + taken))
+                self._next_value += taken
+            self.allocated += count
+        return values
+
+    def next_value(self, database):
+        return self.next_values(database, 1)[0]
+
+
 @click.command("init-database")
 def init_database_command():
     init_database()
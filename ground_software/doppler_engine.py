@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+ @brief Doppler prediction from the SilverSat TLE
+
+ Propagates the TLE with sgp4 over a whole window at once and computes
+ the range rate, elevation and Doppler-corrected transmit and receive
+ frequencies for every step with NumPy. The schedule is then played out
+ in real time through the same DopplerWriter and DopplerPolicy as the
+ gpredict interface, so the radio receives identical 0x0D frames
+ without gpredict running.
+
+ python3 -m ground_software.doppler_engine --tle ./instance/silversat.tle \
+     --latitude 38.89 --longitude -77.03
+
+ Requires the optional numpy and sgp4 packages.
+"""
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sgp4.api import Satrec, jday
+
+from ground_software import gpredict_interface
+from ground_software.gpredict_interface import DopplerPolicy, doppler_frame
+
+# Physical constants
+SPEED_OF_LIGHT = 299792.458  # km/s
+EARTH_EQUATORIAL_RADIUS = 6378.137  # km, WGS84
+EARTH_FLATTENING = 1 / 298.257223563
+EARTH_ROTATION_RATE = 7.292115146706979e-5  # rad/s
+SECONDS_PER_DAY = 86400.0
+
+# Configuration
+TLE_PATH = "./instance/silversat.tle"
+SATELLITE_NAME = "SILVERSAT"
+DOWNLINK_FREQUENCY = 433000000
+UPLINK_FREQUENCY = 433000000
+DEFAULT_STEP = 0.5  # seconds between schedule entries
+SCHEDULE_WINDOW = 900.0  # seconds computed per batch
+MIN_ELEVATION = 0.0  # degrees; no frames are sent below it
+
+
+class GroundStation:
+    """Geodetic location of the ground station antenna."""
+
+    def __init__(self, latitude, longitude, altitude=0.0):
+        self.latitude = latitude  # degrees north
+        self.longitude = longitude  # degrees east
+        self.altitude = altitude  # metres above the WGS84 ellipsoid
+
+        phi = np.radians(latitude)
+        lam = np.radians(longitude)
+        height = altitude / 1000.0
+        eccentricity_squared = EARTH_FLATTENING * (2 - EARTH_FLATTENING)
+        normal = EARTH_EQUATORIAL_RADIUS / np.sqrt(1 - eccentricity_squared * np.sin(phi) ** 2)
+        self.position = np.array(
+            [
+                (normal + height) * np.cos(phi) * np.cos(lam),
+                (normal + height) * np.cos(phi) * np.sin(lam),
+                (normal * (1 - eccentricity_squared) + height) * np.sin(phi),
+            ]
+        )
+        self.east = np.array([-np.sin(lam), np.cos(lam), 0.0])
+        self.north = np.array(
+            [-np.sin(phi) * np.cos(lam), -np.sin(phi) * np.sin(lam), np.cos(phi)]
+        )
+        self.up = np.array([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+
+
+class DopplerSchedule:
+    """Frequencies for the radio at evenly spaced times.
+
+    times are Unix seconds; transmit and receive are integer hertz. The
+    transmit frequency is pre-corrected so the satellite hears the uplink
+    frequency, and the receive frequency is where the downlink arrives.
+    """
+
+    def __init__(self, times, range_km, range_rate, elevation, azimuth, transmit, receive):
+        self.times = times
+        self.range_km = range_km
+        self.range_rate = range_rate
+        self.elevation = elevation
+        self.azimuth = azimuth
+        self.transmit = transmit
+        self.receive = receive
+
+    def __len__(self):
+        return len(self.times)
+
+    def frequencies(self, index):
+        """Return the (transmit, receive) pair at index as ASCII hertz."""
+        return (
+            str(int(self.transmit[index])).encode("ascii"),
+            str(int(self.receive[index])).encode("ascii"),
+        )
+
+    def frames(self):
+        """Return the 0x0D frame for every step, as database_write would queue it."""
+        return [doppler_frame(*self.frequencies(index)) for index in range(len(self))]
+
+
+def load_tle(path=TLE_PATH, name=SATELLITE_NAME):
+    """Return the two element lines for name from a two- or three-line TLE file.
+
+    Without a matching name line the first element set in the file is used.
+    """
+    with open(path, "r", encoding="ascii") as tle_file:
+        lines = [line.rstrip() for line in tle_file if line.strip()]
+    element_sets = []
+    for index, line in enumerate(lines[:-1]):
+        if line.startswith("1 ") and lines[index + 1].startswith("2 "):
+            title = ""
+            if index and not lines[index - 1].startswith(("1 ", "2 ")):
+                title = lines[index - 1]
+                if title.startswith("0 "):
+                    title = title[2:]
+            element_sets.append((title.strip(), line, lines[index + 1]))
+    if not element_sets:
+        raise ValueError(f"No TLE found in {path}")
+    for title, line1, line2 in element_sets:
+        if name and title.upper() == name.upper():
+            return line1, line2
+    return element_sets[0][1], element_sets[0][2]
+
+
+def time_grid(start, duration, step=DEFAULT_STEP):
+    """Return Unix times from start covering duration seconds at step spacing."""
+    count = int(duration / step) + 1
+    return start + step * np.arange(count)
+
+
+def greenwich_sidereal_angle(julian_date, fraction):
+    """Greenwich mean sidereal time in radians (IAU 1982), vectorised."""
+    centuries = (julian_date - 2451545.0 + fraction) / 36525.0
+    seconds = (
+        67310.54841
+        + (876600.0 * 3600.0 + 8640184.812866) * centuries
+        + 0.093104 * centuries**2
+        - 6.2e-6 * centuries**3
+    )
+    return np.radians(seconds / 240.0) % (2 * np.pi)
+
+
+def look_geometry(line1, line2, station, times):
+    """Return range (km), range rate (km/s), elevation and azimuth (degrees).
+
+    One sgp4 call propagates every time in the array. TEME positions and
+    velocities are rotated into the Earth-fixed frame by sidereal angle,
+    so the station stays fixed and the range rate includes Earth rotation.
+    Steps where sgp4 reports an error are NaN.
+    """
+    satellite = Satrec.twoline2rv(line1, line2)
+    start = datetime.fromtimestamp(float(times[0]), timezone.utc)
+    julian_date, fraction = jday(
+        start.year,
+        start.month,
+        start.day,
+        start.hour,
+        start.minute,
+        start.second + start.microsecond / 1e6,
+    )
+    fraction = fraction + (times - times[0]) / SECONDS_PER_DAY
+    julian_dates = np.full(len(times), julian_date)
+    errors, positions, velocities = satellite.sgp4_array(julian_dates, fraction)
+
+    angle = greenwich_sidereal_angle(julian_dates, fraction)
+    cosine, sine = np.cos(angle), np.sin(angle)
+    x = cosine * positions[:, 0] + sine * positions[:, 1]
+    y = -sine * positions[:, 0] + cosine * positions[:, 1]
+    position = np.column_stack((x, y, positions[:, 2]))
+    velocity = np.column_stack(
+        (
+            cosine * velocities[:, 0] + sine * velocities[:, 1] + EARTH_ROTATION_RATE * y,
+            -sine * velocities[:, 0] + cosine * velocities[:, 1] - EARTH_ROTATION_RATE * x,
+            velocities[:, 2],
+        )
+    )
+
+    line_of_sight = position - station.position
+    range_km = np.linalg.norm(line_of_sight, axis=1)
+    range_rate = np.einsum("ij,ij->i", line_of_sight, velocity) / range_km
+    elevation = np.degrees(np.arcsin(line_of_sight @ station.up / range_km))
+    azimuth = np.degrees(np.arctan2(line_of_sight @ station.east, line_of_sight @ station.north)) % 360
+
+    failed = errors != 0
+    for values in (range_km, range_rate, elevation, azimuth):
+        values[failed] = np.nan
+    return range_km, range_rate, elevation, azimuth
+
+
+def compute_schedule(
+    line1,
+    line2,
+    station,
+    start,
+    duration,
+    step=DEFAULT_STEP,
+    downlink_frequency=DOWNLINK_FREQUENCY,
+    uplink_frequency=UPLINK_FREQUENCY,
+):
+    """Compute a DopplerSchedule for duration seconds from Unix time start."""
+    times = time_grid(start, duration, step)
+    range_km, range_rate, elevation, azimuth = look_geometry(line1, line2, station, times)
+    factor = 1 - range_rate / SPEED_OF_LIGHT
+    transmit = np.rint(uplink_frequency / factor)
+    receive = np.rint(downlink_frequency * factor)
+    valid = ~np.isnan(factor)
+    transmit[~valid] = uplink_frequency
+    receive[~valid] = downlink_frequency
+    return DopplerSchedule(
+        times,
+        range_km,
+        range_rate,
+        elevation,
+        azimuth,
+        transmit.astype(np.int64),
+        receive.astype(np.int64),
+    )
+
+
+def play_schedule(
+    schedule,
+    writer=None,
+    policy=None,
+    shutdown_event=None,
+    min_elevation=MIN_ELEVATION,
+    clock=time.time,
+):
+    """Write the schedule's frequencies as each step comes due.
+
+    Steps already in the past and steps below min_elevation are skipped.
+    Each remaining step goes through the policy and, if it passes, to the
+    writer. Returns the number of frames written.
+    """
+    writer = writer if writer is not None else gpredict_interface.doppler_writer
+    policy = policy if policy is not None else DopplerPolicy()
+    shutdown_event = shutdown_event if shutdown_event is not None else threading.Event()
+    written = 0
+    index = int(np.searchsorted(schedule.times, clock()))
+    while index < len(schedule) and not shutdown_event.is_set():
+        delay = schedule.times[index] - clock()
+        if delay > 0 and shutdown_event.wait(delay):
+            break
+        if schedule.elevation[index] >= min_elevation:
+            transmit, receive = schedule.frequencies(index)
+            if policy.should_send(transmit, receive):
+                writer.write(transmit, receive)
+                written += 1
+        index += 1
+    return written
+
+
+def doppler_engine_read(
+    station,
+    shutdown_event=None,
+    tle_path=TLE_PATH,
+    name=SATELLITE_NAME,
+    window=SCHEDULE_WINDOW,
+):
+    """Drive the radio's Doppler correction from the TLE until shutdown.
+
+    The TLE file is read again for every window, so an updated element
+    set takes effect without a restart.
+    """
+    shutdown_event = shutdown_event if shutdown_event is not None else threading.Event()
+    policy = DopplerPolicy()
+    while not shutdown_event.is_set():
+        try:
+            line1, line2 = load_tle(tle_path, name)
+        except (OSError, ValueError) as e:
+            logging.error(f"Doppler engine cannot load TLE: {e}")
+            shutdown_event.wait(window)
+            continue
+        start = time.time()
+        computed = time.perf_counter()
+        schedule = compute_schedule(line1, line2, station, start, window)
+        computed = time.perf_counter() - computed
+        visible = int(np.count_nonzero(schedule.elevation >= MIN_ELEVATION))
+        logging.info(
+            f"Doppler schedule: {len(schedule)} steps in {computed * 1000:.1f} ms, "
+            f"{visible} above {MIN_ELEVATION} degrees"
+        )
+        play_schedule(schedule, policy=policy, shutdown_event=shutdown_event)
+    gpredict_interface.doppler_writer.log_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TLE Doppler prediction engine")
+    parser.add_argument("--tle", default=TLE_PATH, help=f"TLE file (default: {TLE_PATH})")
+    parser.add_argument("--name", default=SATELLITE_NAME, help="Satellite name in the TLE file")
+    parser.add_argument("--latitude", type=float, required=True, help="Degrees north")
+    parser.add_argument("--longitude", type=float, required=True, help="Degrees east")
+    parser.add_argument("--altitude", type=float, default=0.0, help="Metres above WGS84")
+    args = parser.parse_args()
+
+    station = GroundStation(args.latitude, args.longitude, args.altitude)
+    try:
+        doppler_engine_read(station, tle_path=args.tle, name=args.name)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,18 @@
  This program provides the GPredict interface for the ground station
  
 """
+import asyncio
 import sqlite3
-import socket
 import logging
-from ground_software.database import next_sequence_value
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ground_software.database import (
+    PRIORITY_RADIO,
+    advance_sequence,
+    apply_connection_profile,
+)
+from ground_software.notify import notifier_for
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
@@ -26,140 +34,630 @@ alternate_frequency = b"433001000"
 test_doppler = False
 gpredict_address = "127.0.0.1"
 gpredict_port = 4532
-gpredict_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 NOTIFY_SOCKET_PATH = "/tmp/radio_notify"
+DATABASE_PATH = "./instance/radio.db"
+LATENCY_WINDOW = 512  # recent updates kept for latency percentiles
+BUSY_TIMEOUT_MS = 500  # give up on an update rather than delay the next one
+DOPPLER_MIN_DELTA_HZ = 50  # smaller changes are not worth a radio command
+DOPPLER_MIN_INTERVAL = 0.5  # seconds between commands for changes above the deadband
+DOPPLER_MAX_STALENESS = 10.0  # seconds after which any change is sent
+DOPPLER_SETTLE_DELAY = 0.05  # seconds for gpredict's I to follow its F
 
 
-def notify_transmission():
-    try:
-        notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
-        notify_socket.connect(NOTIFY_SOCKET_PATH)
-        notify_socket.send(b"\x00")
-    except Exception:
-        pass
-    finally:
+def doppler_frame(transmit_frequency, receive_frequency):
+    """Return the KISS frame that sets the radio's transmit and receive frequencies."""
+    return FEND + DOPPLER_FREQUENCIES + transmit_frequency + SPACE + receive_frequency + FEND
+
+
+class DopplerWriter:
+    """Queue Doppler frames for serial_write over one long-lived connection.
+
+    Latest wins: while a Doppler frame is still pending, a new update
+    overwrites it in place, so at most one Doppler frame ever waits and
+    serial_write never sends obsolete frequencies. Otherwise the update
+    claims a message_sequence and inserts a new transmission. Either way
+    it is one transaction, followed by one wakeup for serial_write from
+    the process's Notifier. write() returns the update latency in
+    seconds, or None when the frame could not be stored; stats() reports
+    percentiles over the recent updates.
+    """
+
+    def __init__(
+        self,
+        db_path=DATABASE_PATH,
+        notify_path=NOTIFY_SOCKET_PATH,
+        busy_timeout_ms=BUSY_TIMEOUT_MS,
+    ):
+        self.db_path = db_path
+        self.notify_path = notify_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.writes = 0
+        self.inserted = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self._connection = None
+        self.notifier = notifier_for(notify_path)
+
+    def write(self, transmit_frequency, receive_frequency):
+        start = time.perf_counter()
+        command = doppler_frame(transmit_frequency, receive_frequency)
         try:
-            notify_socket.close()
-        except Exception:
-            pass
+            connection = self._connect()
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                if self._replace_pending(connection, command):
+                    self.coalesced += 1
+                else:
+                    message_sequence = advance_sequence(connection, "message_sequence", 1)
+                    connection.execute(
+                        "INSERT INTO transmissions "
+                        "(message_sequence, command, priority, enqueued_at) VALUES (?, ?, ?, ?)",
+                        (message_sequence, command, PRIORITY_RADIO, time.time()),
+                    )
+                    self.inserted += 1
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            self.failures += 1
+            self._close_connection()
+            return None
+        self._notify()
+        elapsed = time.perf_counter() - start
+        self.writes += 1
+        self.latencies.append(elapsed)
+        return elapsed
+
+    def _replace_pending(self, connection, command):
+        """Overwrite the queued Doppler frame, if any, with command.
+
+        The frame keeps its place in the queue. Any further pending Doppler
+        frames, left by an older version, are deleted as superseded. Runs
+        under write()'s BEGIN IMMEDIATE, so the row is selected and then
+        updated without RETURNING, which SQLite before 3.35 lacks.
+        """
+        row = connection.execute(
+            "SELECT id FROM transmissions "
+            "WHERE status = 'pending' AND priority = ? AND substr(command, 2, 1) = x'0D' "
+            "ORDER BY message_sequence ASC LIMIT 1",
+            (PRIORITY_RADIO,),
+        ).fetchone()
+        if row is None:
+            return False
+        connection.execute(
+            "UPDATE transmissions "
+            "SET command = ?, timestamp = CURRENT_TIMESTAMP, enqueued_at = ? WHERE id = ?",
+            (command, time.time(), row[0]),
+        )
+        superseded = connection.execute(
+            "DELETE FROM transmissions "
+            "WHERE status = 'pending' AND priority = ? AND substr(command, 2, 1) = x'0D' "
+            "AND id <> ?",
+            (PRIORITY_RADIO, row[0]),
+        ).rowcount
+        self.superseded += superseded
+        return True
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "writes": self.writes,
+            "inserted": self.inserted,
+            "coalesced": self.coalesced,
+            "superseded": self.superseded,
+            "failures": self.failures,
+            "p50_seconds": percentile(0.5),
+            "p99_seconds": percentile(0.99),
+            "max_seconds": latencies[-1] if latencies else None,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        if not stats["writes"]:
+            return
+        logging.info(
+            "Doppler updates: %d written (%d queued, %d coalesced), %d failed, "
+            "latency p50 %.2f ms p99 %.2f ms max %.2f ms",
+            stats["writes"],
+            stats["inserted"],
+            stats["coalesced"],
+            stats["failures"],
+            stats["p50_seconds"] * 1000,
+            stats["p99_seconds"] * 1000,
+            stats["max_seconds"] * 1000,
+        )
+
+    def close(self):
+        self._close_connection()
+
+    def _connect(self):
+        if self._connection is None:
+            # Autocommit mode, so BEGIN IMMEDIATE above opens the transaction.
+            self._connection = apply_connection_profile(
+                sqlite3.connect(self.db_path, isolation_level=None), self.busy_timeout_ms
+            )
+        return self._connection
+
+    def _close_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except sqlite3.Error:
+                pass
+            self._connection = None
+
+    def _notify(self):
+        # Under ground_station.py serial_write shares this process, and the
+        # wakeup sets its event without a socket call.
+        self.notifier.notify()
+
+
+doppler_writer = DopplerWriter()
 
 
 def database_write(transmit_frequency, receive_frequency):
     """Write the doppler transaction to the database"""
     try:
-        connection = sqlite3.connect("./instance/radio.db")
-        cursor = connection.cursor()
-        message_sequence = next_sequence_value(connection, "message_sequence", 1)
-        cursor.execute(
-            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
-            (
-                message_sequence,
-                FEND
-                + DOPPLER_FREQUENCIES
-                + transmit_frequency
-                + SPACE
-                + receive_frequency
-                + FEND,
-            ),
-        )
-        connection.commit()
-        notify_transmission()
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
+        doppler_writer.write(transmit_frequency, receive_frequency)
     except Exception as e:
         print(f"Exception in database_write: {e}")
-    finally:
-        if connection:
-            connection.close()
 
 
-def gpredict_write(socket, message):
-    """Write a message to gpredict"""
+def process_command(command, frequency, socket, transmit_frequency, receive_frequency):
+    """Process one command from gpredict for a caller holding the frequencies"""
+    session = RigctlSession(RigState(transmit_frequency, receive_frequency))
+    session.handle(command + b" " + frequency if frequency else command, socket)
+    return session.state.transmit_frequency, session.state.receive_frequency
+
+
+# rigctld long command names and the short commands they stand for
+LONG_COMMANDS = {
+    b"\\set_freq": b"F",
+    b"\\get_freq": b"f",
+    b"\\set_split_freq": b"I",
+    b"\\get_split_freq": b"i",
+    b"\\set_vfo": b"V",
+    b"\\get_vfo": b"v",
+    b"\\set_split_vfo": b"S",
+    b"\\get_split_vfo": b"s",
+    b"\\set_mode": b"M",
+    b"\\get_mode": b"m",
+    b"\\set_ptt": b"T",
+    b"\\get_ptt": b"t",
+    b"\\quit": b"q",
+}
+# Multi-letter commands gpredict sends at acquisition and loss of signal
+PASS_EVENTS = (b"AOS", b"LOS")
+MAX_LINE_LENGTH = 1024
+RPRT_OK = b"RPRT 0\n"
+RPRT_ERROR = b"RPRT 1\n"
+
+# Protocol 0 \dump_state reply: model, ITU region, receive and transmit
+# ranges, one tuning step and one filter, then zero for RIT, XIT, IF
+# shift, announces, preamps, attenuators and the func/level/parm masks.
+DUMP_STATE = (
+    b"0\n"
+    b"2\n"
+    b"2\n"
+    b"150000.000000 1500000000.000000 0x1ff -1 -1 0x10000003 0x3\n"
+    b"0 0 0 0 0 0 0\n"
+    b"150000.000000 1500000000.000000 0x1ff 5000 100000 0x10000003 0x3\n"
+    b"0 0 0 0 0 0 0\n"
+    b"0x1ff 1\n"
+    b"0 0\n"
+    b"0x1ff 15000\n"
+    b"0 0\n"
+    + b"0\n" * 12
+)
+
+
+def normalize_frequency(argument):
+    """Return a frequency argument such as b"145800000.000000" as integer digits."""
     try:
-        socket.sendall(message)
-    except Exception as e:
-        print(f"Error on gpredict write: {e}")
-        socket.close()
+        frequency = round(float(argument.split()[0]))
+    except (IndexError, ValueError, OverflowError):
+        return None
+    if frequency <= 0:
+        return None
+    return str(frequency).encode("ascii")
 
 
-def process_command(command, frequency, socket, transmit_frequency, receive_frequency):
-    """Process the comman from gpredict"""
-    match command:
-        case b"F":
-            receive_frequency = frequency
-            database_write(transmit_frequency, receive_frequency)
-            gpredict_write(socket, b"RPRT 0\n")
-        case b"I":
-            transmit_frequency = frequency
+class _ReplyBuffer:
+    """Collects the replies to one read so they go out in a single send."""
+
+    def __init__(self):
+        self.parts = []
+
+    def sendall(self, message):
+        self.parts.append(message)
+
+    def getvalue(self):
+        return b"".join(self.parts)
+
+
+class DopplerPolicy:
+    """Decide which frequency updates are worth a radio command.
+
+    An update is sent when either frequency has moved at least
+    min_delta_hz from what was last sent and min_interval seconds have
+    passed, or when it differs at all and the last command is older than
+    max_staleness. Anything else is suppressed, and the frequency error
+    that leaves on air is recorded. due_in() tells a caller holding a
+    suppressed update when it would be sent.
+    """
+
+    def __init__(
+        self,
+        min_delta_hz=DOPPLER_MIN_DELTA_HZ,
+        min_interval=DOPPLER_MIN_INTERVAL,
+        max_staleness=DOPPLER_MAX_STALENESS,
+        clock=time.monotonic,
+    ):
+        self.min_delta_hz = min_delta_hz
+        self.min_interval = min_interval
+        self.max_staleness = max_staleness
+        self.clock = clock
+        self.sent = 0
+        self.suppressed = 0
+        self.max_error_hz = 0
+        self.total_error_hz = 0
+        self._sent_pair = None
+        self._sent_at = 0.0
+
+    def due_in(self, transmit_frequency, receive_frequency):
+        """Return seconds until the pair would be sent, or None if never.
+
+        Zero or less means now; None means it matches what was sent.
+        """
+        return self._due_in((int(transmit_frequency), int(receive_frequency)), self.clock())[0]
+
+    def _due_in(self, pair, now):
+        if self._sent_pair is None:
+            return 0.0, 0
+        error_hz = max(abs(pair[0] - self._sent_pair[0]), abs(pair[1] - self._sent_pair[1]))
+        age = now - self._sent_at
+        waits = []
+        if error_hz >= self.min_delta_hz:
+            waits.append(self.min_interval - age)
+        if error_hz > 0:
+            waits.append(self.max_staleness - age)
+        return (min(waits) if waits else None), error_hz
+
+    def should_send(self, transmit_frequency, receive_frequency):
+        pair = (int(transmit_frequency), int(receive_frequency))
+        now = self.clock()
+        delay, error_hz = self._due_in(pair, now)
+        send = delay is not None and delay <= 0
+        if not send:
+            self.suppressed += 1
+            self.max_error_hz = max(self.max_error_hz, error_hz)
+            self.total_error_hz += error_hz
+            return False
+        self.sent += 1
+        self._sent_pair = pair
+        self._sent_at = now
+        return True
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "max_error_hz": self.max_error_hz,
+            "mean_error_hz": (self.total_error_hz / self.suppressed) if self.suppressed else 0.0,
+        }
+
+
+class RigState:
+    """Radio settings shared by every client of the rigctld server."""
+
+    def __init__(
+        self, transmit_frequency=initial_frequency, receive_frequency=initial_frequency
+    ):
+        self.transmit_frequency = transmit_frequency
+        self.receive_frequency = receive_frequency
+        self.vfo = b"VFOA"
+        self.split = b"1"
+        self.split_vfo = b"VFOB"
+        self.mode = b"FM"
+        self.passband = b"15000"
+        self.ptt = b"0"
+
+
+class RigctlSession:
+    """rigctld protocol handling for one client connection.
+
+    feed() accepts whatever recv() returned, handles every complete line
+    in it, and returns the replies for all of them, so pipelined commands
+    and commands split across reads are both handled. Settings live in
+    state, which the server shares between its clients. Each frequency
+    change calls write_frequencies(transmit, receive); by default that is
+    database_write.
+    """
+
+    def __init__(self, state=None, write_frequencies=None):
+        self.state = state if state is not None else RigState()
+        self._write_frequencies = write_frequencies
+        self.commands = 0
+        self.closed = False
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        replies = _ReplyBuffer()
+        position = 0
+        while not self.closed:
+            end = buffer.find(b"\n", position)
+            if end < 0:
+                break
+            line = bytes(buffer[position:end]).strip()
+            position = end + 1
+            if line:
+                self.handle(line, replies)
+        del buffer[:position]
+        if self.closed:
+            buffer.clear()
+        elif len(buffer) > MAX_LINE_LENGTH:
+            logging.warning("Discarding %d bytes without a line end", len(buffer))
+            buffer.clear()
+            replies.sendall(RPRT_ERROR)
+        return replies.getvalue()
+
+    def handle(self, line, replies):
+        self.commands += 1
+        if line.startswith(b"\\"):
+            name, _, argument = line.partition(b" ")
+            command = LONG_COMMANDS.get(name, name)
+        elif line.split()[0] in PASS_EVENTS:
+            command, argument = line.split()[0], b""
+        else:
+            command, argument = line[:1], line[1:]
+        argument = argument.strip()
+        logging.debug(f"command {command} argument {argument}")
+
+        state = self.state
+        match command:
+            case b"F" | b"I":
+                frequency = normalize_frequency(argument)
+                if frequency is None:
+                    replies.sendall(RPRT_ERROR)
+                    return
+                if command == b"F":
+                    state.receive_frequency = frequency
+                else:
+                    state.transmit_frequency = frequency
+                self._write(state.transmit_frequency, state.receive_frequency)
+                replies.sendall(RPRT_OK)
+            case b"f":
+                replies.sendall(state.receive_frequency + b"\n")
+            case b"i":
+                replies.sendall(state.transmit_frequency + b"\n")
+            case b"V":
+                state.vfo = argument or state.vfo
+                replies.sendall(RPRT_OK)
+            case b"v":
+                replies.sendall(state.vfo + b"\n")
+            case b"S":
+                fields = argument.split()
+                if fields:
+                    state.split = fields[0]
+                if len(fields) > 1:
+                    state.split_vfo = fields[1]
+                replies.sendall(RPRT_OK)
+            case b"s":
+                replies.sendall(state.split + b"\n" + state.split_vfo + b"\n")
+            case b"M":
+                fields = argument.split()
+                if fields:
+                    state.mode = fields[0]
+                if len(fields) > 1:
+                    state.passband = fields[1]
+                replies.sendall(RPRT_OK)
+            case b"m":
+                replies.sendall(state.mode + b"\n" + state.passband + b"\n")
+            case b"T":
+                state.ptt = argument or state.ptt
+                replies.sendall(RPRT_OK)
+            case b"t":
+                replies.sendall(state.ptt + b"\n")
+            case b"q":
+                self.closed = True
+            case b"\\dump_state":
+                replies.sendall(DUMP_STATE)
+            case b"\\chk_vfo":
+                replies.sendall(b"0\n")
+            case b"AOS" | b"LOS":
+                logging.info(f"gpredict reports {command.decode('ascii')}")
+                replies.sendall(RPRT_OK)
+            case _:
+                logging.warning(f"unknown command: {command}")
+                replies.sendall(RPRT_ERROR)
+
+    def _write(self, transmit_frequency, receive_frequency):
+        if self._write_frequencies is None:
             database_write(transmit_frequency, receive_frequency)
-            gpredict_write(socket, b"RPRT 0\n")
-        case b"i":
-            gpredict_write(socket, transmit_frequency + b"\n")
-        case b"f":
-            gpredict_write(socket, receive_frequency + b"\n")
-        case _:
-            logging.warning(f"unknown command: {command}")
-            gpredict_write(socket, b"RPRT 1\n")
-    return transmit_frequency, receive_frequency
+        else:
+            self._write_frequencies(transmit_frequency, receive_frequency)
 
 
-def gpredict_read(shutdown_event=None):
-    """Manage the gpredict interface"""
-    gpredict_server.bind((gpredict_address, gpredict_port))
-    gpredict_server.listen(0)
-    gpredict_server.settimeout(1)
-    waiting_logged = False
-    while not (shutdown_event and shutdown_event.is_set()):
-        if not waiting_logged:
-            logging.info(
-                f"Gpredict interface waiting for a connection on: {gpredict_address}:{gpredict_port}"
-            )
-            waiting_logged = True
+class RigctlServer:
+    """asyncio rigctld server for gpredict and any other clients.
+
+    Every client shares one RigState, so a monitoring client reading f and
+    i sees what gpredict last set. Frequency changes from all clients go
+    through one write loop, which keeps only the newest (tx, rx) pair.
+    gpredict sets the downlink with F and the uplink with I a few
+    milliseconds later, so the loop waits settle_delay after a change and
+    then puts the combined pair to the DopplerPolicy. A pair the policy
+    holds back is kept and sent when its min_interval or max_staleness
+    runs out, even if gpredict has gone quiet. Pairs are stored with the
+    DopplerWriter on a single worker thread, whose queue coalescing then
+    keeps one Doppler frame pending.
+    """
+
+    def __init__(
+        self,
+        writer=None,
+        address=gpredict_address,
+        port=gpredict_port,
+        policy=None,
+        settle_delay=DOPPLER_SETTLE_DELAY,
+    ):
+        self.writer = writer if writer is not None else doppler_writer
+        self.policy = policy if policy is not None else DopplerPolicy()
+        self.settle_delay = settle_delay
+        self.address = address
+        self.port = port
+        self.state = RigState()
+        self.clients = 0
+        self.connections = 0
+        self.updates = 0
+        self.superseded = 0
+        self._pending = None
+        self._changed = None
+        self._server = None
+        self._write_task = None
+        self._client_tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="doppler-writer")
+
+    def request_write(self, transmit_frequency, receive_frequency):
+        self.updates += 1
+        if self._pending is not None:
+            self.superseded += 1
+        self._pending = (transmit_frequency, receive_frequency)
+        self._changed.set()
+
+    async def start(self):
+        self._changed = asyncio.Event()
+        self._server = await asyncio.start_server(self._serve_client, self.address, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._write_task = asyncio.create_task(self._write_loop())
+        logging.info(
+            f"Gpredict interface waiting for connections on: {self.address}:{self.port}"
+        )
+
+    async def stop(self):
+        self._server.close()
+        for task in list(self._client_tasks):
+            task.cancel()
+        await asyncio.gather(*self._client_tasks, return_exceptions=True)
+        await self._server.wait_closed()
+        self._write_task.cancel()
+        await asyncio.gather(self._write_task, return_exceptions=True)
+        # Store the last requested frequencies before shutting down.
+        await self._flush()
+        self.log_stats()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.writer.close)
+        self._executor.shutdown()
+
+    async def serve(self, shutdown_event=None):
+        await self.start()
         try:
-            client_socket, address = gpredict_server.accept()
-        except (TimeoutError, socket.timeout):
-            continue
-        waiting_logged = False
-        logging.info(f"Connected: {address[0],address[1]}")
-        client_socket.settimeout(1)
-        receive_frequency = initial_frequency
-        transmit_frequency = initial_frequency
-        test_frequency = initial_frequency
+            while not (shutdown_event and shutdown_event.is_set()):
+                await asyncio.sleep(0.2)
+        finally:
+            await self.stop()
 
-        while not (shutdown_event and shutdown_event.is_set()):
+    async def _write_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), self._held_timeout())
+            except asyncio.TimeoutError:
+                pass  # the held pair is due
+            else:
+                # Let the I that follows gpredict's F arrive first.
+                await asyncio.sleep(self.settle_delay)
+            self._changed.clear()
             try:
-                data = client_socket.recv(1024)
+                await self._flush()
+            except Exception:
+                # DopplerWriter handles database errors; anything else must
+                # not end the loop while rigctld keeps answering.
+                logging.exception("Doppler update failed")
+
+    def _held_timeout(self):
+        """Seconds until the held pair is due, or None to wait for a change."""
+        if self._pending is None:
+            return None
+        delay = self.policy.due_in(*self._pending)
+        if delay is None:
+            # Nothing to correct: the held pair is what was last sent.
+            self._pending = None
+            return None
+        return max(0.0, delay)
+
+    async def _flush(self):
+        if self._pending is None:
+            return
+        if not self.policy.should_send(*self._pending):
+            return  # held; _write_loop sends it when it is due
+        pending, self._pending = self._pending, None
+        # Shielded: stop() cancels the write loop, and a cancelled executor
+        # call that has not started yet would drop the update.
+        await asyncio.shield(
+            asyncio.get_running_loop().run_in_executor(self._executor, self.writer.write, *pending)
+        )
+
+    async def _serve_client(self, reader, writer):
+        self._client_tasks.add(asyncio.current_task())
+        address = writer.get_extra_info("peername")
+        self.clients += 1
+        self.connections += 1
+        logging.info(f"Connected: {address}, {self.clients} clients")
+        session = RigctlSession(self.state, self.request_write)
+        test_frequency = initial_frequency
+        try:
+            while not session.closed:
+                data = await reader.read(1024)
                 if not data:
                     break
-            except (TimeoutError, socket.timeout):
-                continue
-            except Exception as e:
-                logging.error(f"Error receiving data: {e}")
-                client_socket.close()
-                break
+                replies = session.feed(data)
+                if replies:
+                    writer.write(replies)
+                    await writer.drain()
 
-            command = data[:1]
-            frequency = data[1:].strip()
-            logging.info(f"command {command} frequency {frequency}")
+                if test_doppler:
+                    if test_frequency != initial_frequency:
+                        test_frequency = initial_frequency
+                    else:
+                        test_frequency = alternate_frequency
+                    self.request_write(test_frequency, test_frequency)
+        except (ConnectionError, asyncio.CancelledError) as e:
+            logging.info(f"Connection {address} ended: {e!r}")
+        finally:
+            self.clients -= 1
+            self._client_tasks.discard(asyncio.current_task())
+            writer.close()
+            logging.info(f"Disconnected: {address}, {self.clients} clients")
+            if not self.clients:
+                self.log_stats()
 
-            transmit_frequency, receive_frequency = process_command(
-                command, frequency, client_socket, transmit_frequency, receive_frequency
+    def log_stats(self):
+        stats = self.policy.stats()
+        if stats["suppressed"]:
+            logging.info(
+                "Doppler policy: %d sent, %d suppressed, error max %d Hz mean %.1f Hz",
+                stats["sent"],
+                stats["suppressed"],
+                stats["max_error_hz"],
+                stats["mean_error_hz"],
             )
+        self.writer.log_stats()
 
-            if test_doppler:
-                if test_frequency != initial_frequency:
-                    test_frequency = initial_frequency
-                else:
-                    test_frequency = alternate_frequency
-                database_write(test_frequency, test_frequency)
-
-        client_socket.close()
-        logging.info(f"Disconnected: {address[0],address[1]}")
 
-    try:
-        gpredict_server.close()
-    except Exception:
-        pass
+def gpredict_read(shutdown_event=None):
+    """Manage the gpredict interface"""
+    asyncio.run(RigctlServer().serve(shutdown_event))
 
 
 if __name__ == "__main__":
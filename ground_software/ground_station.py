@@ -6,12 +6,15 @@
 task manager for ground station
 """
 import argparse
+import os
 import threading
 import subprocess
 import signal
+import sys
 import time
 
 from ground_software import gpredict_interface
+from ground_software.ingest_writer import RESPONSE_NOTIFY_SOCKET_PATH, IngestWriter
 from ground_software import serial_log_interface
 from ground_software import serial_read_interface
 from ground_software import serial_write_interface
@@ -21,6 +24,14 @@ def gpredict_task(shutdown_event):
     gpredict_interface.gpredict_read(shutdown_event=shutdown_event)
 
 
+def doppler_engine_task(shutdown_event, args):
+    # numpy and sgp4 are only needed in this mode
+    from ground_software import doppler_engine
+
+    station = doppler_engine.GroundStation(args.latitude, args.longitude, args.altitude)
+    doppler_engine.doppler_engine_read(station, shutdown_event, tle_path=args.tle)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ground station task manager")
     parser.add_argument(
@@ -34,23 +45,77 @@ if __name__ == "__main__":
         default="/tmp/radio_log",
         help="Serial port path for radio text log interface (default: /tmp/radio_log)",
     )
+    parser.add_argument(
+        "--server",
+        choices=("flask", "asgi"),
+        default="flask",
+        help="User interface server: the Flask development server or uvicorn "
+        "serving response streams on an asyncio event loop (default: flask)",
+    )
+    parser.add_argument(
+        "--doppler",
+        choices=("gpredict", "tle"),
+        default="gpredict",
+        help="Doppler source: frequencies from gpredict over rigctld, or the "
+        "built-in engine predicting them from the TLE (default: gpredict)",
+    )
+    parser.add_argument(
+        "--tle",
+        default="./instance/silversat.tle",
+        help="TLE file for --doppler tle (default: ./instance/silversat.tle)",
+    )
+    parser.add_argument("--latitude", type=float, help="Station degrees north for --doppler tle")
+    parser.add_argument("--longitude", type=float, help="Station degrees east for --doppler tle")
+    parser.add_argument(
+        "--altitude", type=float, default=0.0, help="Station metres above WGS84 for --doppler tle"
+    )
     args = parser.parse_args()
+    if args.doppler == "tle" and (args.latitude is None or args.longitude is None):
+        parser.error("--doppler tle requires --latitude and --longitude")
     port = args.port
     log_port = args.log_port
 
     shutdown_event = threading.Event()
 
-    process = subprocess.Popen(["flask", "--app", "ground_software", "run", "--debug"])
+    ingest_writer = IngestWriter(
+        os.path.abspath("./instance/radio.db"),
+        shutdown_event,
+        notify_path=RESPONSE_NOTIFY_SOCKET_PATH,
+    ).start()
+
+    if args.server == "asgi":
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "--factory",
+                "ground_software.asgi:create_application",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                "5000",
+            ]
+        )
+    else:
+        process = subprocess.Popen(["flask", "--app", "ground_software", "run", "--debug"])
 
-    gpredict_thread = threading.Thread(target=gpredict_task, args=(shutdown_event,))
+    if args.doppler == "tle":
+        gpredict_thread = threading.Thread(
+            target=doppler_engine_task, args=(shutdown_event, args)
+        )
+    else:
+        gpredict_thread = threading.Thread(target=gpredict_task, args=(shutdown_event,))
     serial_read_thread = threading.Thread(
-        target=serial_read_interface.serial_read, args=(port, shutdown_event)
+        target=serial_read_interface.serial_read,
+        args=(port, shutdown_event, ingest_writer),
     )
     serial_write_thread = threading.Thread(
         target=serial_write_interface.serial_write, args=(port, shutdown_event)
     )
     serial_log_thread = threading.Thread(
-        target=serial_log_interface.serial_log_read, args=(log_port, shutdown_event)
+        target=serial_log_interface.serial_log_read,
+        args=(log_port, shutdown_event, ingest_writer),
     )
 
     threads = [
@@ -82,6 +147,7 @@ if __name__ == "__main__":
         shutdown_event.set()
         for thread in threads:
             thread.join(timeout=3)
+        ingest_writer.close()
 
         if process.poll() is None:
             process.terminate()
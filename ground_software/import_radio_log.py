@@ -11,7 +11,11 @@ import os
 import re
 import sqlite3
 
-from ground_software.database import next_sequence_value
+from ground_software.database import (
+    SequenceAllocator,
+    apply_connection_profile,
+    parse_rssi_dbm,
+)
 
 
 TIME_PATTERN = re.compile(r"(?<!\d)([01]?\d|2[0-3]):([0-5]\d):([0-5]\d)(?:\.\d+)?(?!\d)")
@@ -31,9 +35,9 @@ def import_radio_log_file(log_file_path, db_path, import_date):
 
     connection = sqlite3.connect(db_path)
     connection.isolation_level = None
-    connection.execute("PRAGMA journal_mode=WAL")
-    connection.execute("PRAGMA busy_timeout = 5000")
+    apply_connection_profile(connection)
     cursor = connection.cursor()
+    sequence_allocator = SequenceAllocator(block_size=256, max_block_age=None)
 
     try:
         with open(log_file_path, "r", encoding="utf-8", errors="replace") as log_file:
@@ -48,10 +52,11 @@ def import_radio_log_file(log_file_path, db_path, import_date):
                     continue
 
                 timestamp = f"{import_date} {time_part}"
-                message_sequence = next_sequence_value(connection, "message_sequence", 1)
+                message_sequence = sequence_allocator.next_value(connection)
                 cursor.execute(
-                    "INSERT INTO radio_logs (timestamp, message_sequence, log_line) VALUES (?, ?, ?)",
-                    (timestamp, message_sequence, log_line),
+                    "INSERT INTO radio_logs (timestamp, message_sequence, log_line, rssi_dbm) "
+                    "VALUES (?, ?, ?, ?)",
+                    (timestamp, message_sequence, log_line, parse_rssi_dbm(log_line)),
                 )
                 imported_count += 1
         return imported_count, skipped_count
@@ -0,0 +1,460 @@
+"""
+ @brief Group-commit writer for radio responses and radio log lines
+
+ The serial reader loops submit rows through a bounded queue and a single
+ writer thread commits them in batches, flushing when a batch is full or
+ when its oldest row has waited flush_interval seconds. Rows that cannot
+ be committed because the database stays locked are appended to an
+ on-disk spool and replayed once the database is available again. A
+ batch that raises anything else is rolled back and spooled the same way,
+ so one bad row or callback does not stop the writer thread.
+ Responses are matched to the command they answer in the same commit
+ (command_tracker).
+"""
+
+import datetime
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from ground_software.command_tracker import correlate_response
+from ground_software.database import (
+    advance_sequence,
+    apply_connection_profile,
+    classify_response,
+    parse_rssi_dbm,
+)
+from ground_software.notify import notifier_for
+
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 0.02  # seconds
+QUEUE_SIZE = 10000
+OVERFLOW_LIMIT = 1000  # rows held in memory past a full queue before submit() spools
+IDLE_WAIT = 0.2  # seconds between shutdown checks when the queue is empty
+BUSY_TIMEOUT_MS = 250  # keep short so a locked database spills to the spool
+SPOOL_RETRY_INTERVAL = 1.0  # seconds between spool replay attempts
+RESPONSE_NOTIFY_SOCKET_PATH = "/tmp/radio_response_notify"
+
+INSERT_STATEMENTS = {
+    "responses": (
+        "INSERT INTO responses "
+        "(timestamp, message_sequence, response, text, kind, transmission_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    ),
+    "radio_logs": (
+        "INSERT INTO radio_logs (timestamp, message_sequence, log_line, rssi_dbm) "
+        "VALUES (?, ?, ?, ?)"
+    ),
+}
+
+# Columns derived from the submitted value once, at insert time
+DERIVED_COLUMNS = {
+    "responses": classify_response,
+    "radio_logs": lambda log_line: (parse_rssi_dbm(log_line),),
+}
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # SQLite CURRENT_TIMESTAMP
+
+
+def utc_timestamp(received_at=None):
+    """Return received_at, or now, in the format of SQLite CURRENT_TIMESTAMP."""
+    if received_at is None:
+        moment = datetime.datetime.now(datetime.timezone.utc)
+    else:
+        moment = datetime.datetime.fromtimestamp(received_at, datetime.timezone.utc)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def parse_utc_timestamp(timestamp):
+    """Return the Unix time of a CURRENT_TIMESTAMP formatted UTC string."""
+    moment = datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    return moment.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class IngestSpool:
+    """Append-only JSON lines file holding rows that could not be committed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.row_count = 0
+        if os.path.exists(path):
+            with open(path, "rb") as spool_file:
+                self.row_count = sum(1 for line in spool_file if line.strip())
+
+    @property
+    def size_bytes(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, records):
+        lines = []
+        for table, received_at, value in records:
+            entry = {
+                "table": table,
+                "timestamp": utc_timestamp(received_at),
+                "received_at": received_at,
+            }
+            if isinstance(value, bytes):
+                entry["bytes"] = value.hex()
+            else:
+                entry["text"] = value
+            lines.append(json.dumps(entry) + "\n")
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as spool_file:
+                spool_file.writelines(lines)
+                spool_file.flush()
+                os.fsync(spool_file.fileno())
+            self.row_count += len(records)
+
+    def read(self):
+        """Return the spooled records and the file offset they end at."""
+        with self._lock:
+            try:
+                with open(self.path, "rb") as spool_file:
+                    data = spool_file.read()
+            except FileNotFoundError:
+                return [], 0
+        # Ignore a trailing line that was only partly written before a crash.
+        end = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "bytes" in entry:
+                value = bytes.fromhex(entry["bytes"])
+            else:
+                value = entry["text"]
+            received_at = entry.get("received_at")
+            if received_at is None:
+                # Written before receive times were spooled.
+                received_at = parse_utc_timestamp(entry["timestamp"])
+            records.append((entry["table"], received_at, value))
+        return records, end
+
+    def discard(self, offset, count):
+        """Remove the first offset bytes, keeping rows appended since read()."""
+        with self._lock:
+            with open(self.path, "rb") as spool_file:
+                spool_file.seek(offset)
+                remainder = spool_file.read()
+            if remainder:
+                temporary_path = self.path + ".tmp"
+                with open(temporary_path, "wb") as spool_file:
+                    spool_file.write(remainder)
+                    spool_file.flush()
+                    os.fsync(spool_file.fileno())
+                os.replace(temporary_path, self.path)
+            else:
+                os.unlink(self.path)
+            self.row_count = max(0, self.row_count - count)
+
+
+class IngestWriter:
+    """Commit submitted rows in batches from one background thread.
+
+    Each row keeps the time it was submitted, so batching and spooling do
+    not shift stored timestamps. Every commit is reported with its row
+    count and duration through stats(), the on_batch callback and the
+    debug log. submit() does not wait for the database: when the queue is
+    full the row and every row after it wait in an overflow list, which the
+    writer thread moves to the spool once it has taken the rows queued
+    before them, so stored rows keep their arrival order. If the overflow
+    reaches overflow_limit rows, the writer is not keeping up and submit()
+    itself spools the queue and the overflow. Memory then stays bounded,
+    and only the batch the writer holds can end up behind them.
+    message_sequence values are taken in the batch's transaction, so they
+    follow commit order across processes.
+
+    With notify_path set, each commit sends one datagram to that Unix
+    socket naming the highest message_sequence stored per table, one
+    "table sequence" line each, so readers can wake instead of polling.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        shutdown_event=None,
+        batch_size=BATCH_SIZE,
+        flush_interval=FLUSH_INTERVAL,
+        queue_size=QUEUE_SIZE,
+        overflow_limit=OVERFLOW_LIMIT,
+        on_batch=None,
+        spool_path=None,
+        notify_path=None,
+    ):
+        self.db_path = db_path
+        self.shutdown_event = shutdown_event
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_limit = overflow_limit
+        self.on_batch = on_batch
+        self.batch_count = 0
+        self.row_count = 0
+        self.max_commit_seconds = 0.0
+        self.recent_batches = deque(maxlen=256)
+        self.queue_high_water = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        if spool_path is None:
+            spool_path = os.path.splitext(db_path)[0] + "_ingest.spool"
+        self.spool = IngestSpool(spool_path)
+        self._last_replay_attempt = 0.0
+        self.notify_path = notify_path
+        self.notifications_sent = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._overflow = []
+        self._overflow_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="ingest-writer", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def submit(self, table, value):
+        if table not in INSERT_STATEMENTS:
+            raise ValueError(f"Unsupported ingest table: {table}")
+        record = (table, time.time(), value)
+        with self._overflow_lock:
+            # While rows overflow, later rows join them to keep arrival order.
+            if not self._overflow:
+                try:
+                    self._queue.put_nowait(record)
+                    self.queue_high_water = max(self.queue_high_water, self._queue.qsize())
+                    return
+                except queue.Full:
+                    pass
+            self._overflow.append(record)
+            if len(self._overflow) >= self.overflow_limit:
+                self._spill_backlog()
+
+    def submit_response(self, frame):
+        self.submit("responses", frame)
+
+    def submit_log_line(self, log_line):
+        self.submit("radio_logs", log_line)
+
+    def close(self):
+        """Stop the writer thread after every queued row is committed or spooled."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if not self._queue.empty() or self._overflow:
+            connection = self._connect()
+            try:
+                self._drain(connection, [])
+            finally:
+                connection.close()
+
+    def stats(self):
+        return {
+            "batches": self.batch_count,
+            "rows": self.row_count,
+            "queued": self._queue.qsize(),
+            "queue_high_water": self.queue_high_water,
+            "spool_rows": self.spool.row_count,
+            "spool_bytes": self.spool.size_bytes,
+            "spilled_rows": self.spilled_rows,
+            "replayed_rows": self.replayed_rows,
+            "max_commit_seconds": self.max_commit_seconds,
+            "notifications_sent": self.notifications_sent,
+            "recent_batches": list(self.recent_batches),
+        }
+
+    def _stopping(self):
+        return self._stop.is_set() or (
+            self.shutdown_event is not None and self.shutdown_event.is_set()
+        )
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path)
+        return apply_connection_profile(connection, BUSY_TIMEOUT_MS)
+
+    def _run(self):
+        connection = self._connect()
+        pending = []
+        deadline = None
+        try:
+            self._replay(connection, force=True)
+            while not self._stopping():
+                try:
+                    if self._overflow and self._queue.empty():
+                        # Every row queued before the overflow has been taken.
+                        if pending:
+                            self._store(connection, pending)
+                            pending = []
+                        self._spill_overflow()
+                    if pending:
+                        timeout = max(0.0, deadline - time.monotonic())
+                    else:
+                        timeout = IDLE_WAIT
+                    try:
+                        pending.append(self._queue.get(timeout=timeout))
+                        if len(pending) == 1:
+                            deadline = time.monotonic() + self.flush_interval
+                    except queue.Empty:
+                        if not pending:
+                            self._replay(connection)
+
+                    if pending and (
+                        len(pending) >= self.batch_size or time.monotonic() >= deadline
+                    ):
+                        self._store(connection, pending)
+                        pending = []
+                except Exception:
+                    # _store only raises when the spool cannot be written, so
+                    # the rows are still pending; try them again shortly.
+                    logging.exception("Ingest writer could not store %d rows", len(pending))
+                    self._stop.wait(SPOOL_RETRY_INTERVAL)
+
+            self._drain(connection, pending)
+        finally:
+            connection.close()
+
+    def _drain(self, connection, pending):
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(pending), self.batch_size):
+            self._store(connection, pending[start : start + self.batch_size])
+        self._spill_overflow()
+        self._replay(connection, force=True)
+        if self.spool.row_count:
+            logging.warning(
+                "%d ingest rows left in %s for replay on next start",
+                self.spool.row_count,
+                self.spool.path,
+            )
+
+    def _store(self, connection, batch):
+        # Once rows are spooled, later rows queue behind them to keep order.
+        if self.spool.row_count:
+            self._spill(batch)
+            self._replay(connection)
+        elif not self._commit(connection, batch):
+            self._spill(batch)
+            self._last_replay_attempt = time.monotonic()
+
+    def _spill(self, records):
+        self.spool.append(records)
+        self.spilled_rows += len(records)
+
+    def _spill_overflow(self):
+        # Under the lock, so rows submitted meanwhile stay behind these, and
+        # a failed spill leaves them in the overflow list.
+        with self._overflow_lock:
+            if self._overflow:
+                self._spill(self._overflow)
+                self._overflow = []
+
+    def _spill_backlog(self):
+        # Called with _overflow_lock held. Queued rows arrived before the
+        # overflow, so they are spooled first.
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            self._spill(records + self._overflow)
+        except OSError as error:
+            logging.error("Ingest overflow could not be spooled: %s", error)
+            for record in records:
+                self._queue.put_nowait(record)
+            return
+        self._overflow = []
+
+    def _replay(self, connection, force=False):
+        if not self.spool.row_count:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_replay_attempt < SPOOL_RETRY_INTERVAL:
+            return
+        self._last_replay_attempt = now
+
+        try:
+            records, offset = self.spool.read()
+            if records and not self._commit(connection, records):
+                return
+            self.spool.discard(offset, len(records))
+        except (OSError, ValueError) as error:
+            logging.error("Ingest spool %s could not be replayed: %s", self.spool.path, error)
+            return
+        self.replayed_rows += len(records)
+        logging.info("Replayed %d spooled ingest rows", len(records))
+
+    def _commit(self, connection, batch):
+        try:
+            start = time.perf_counter()
+            connection.execute("BEGIN IMMEDIATE")
+            # Allocated in the batch's own transaction, so rows and commands
+            # committed later by any process get higher sequences.
+            first_sequence = advance_sequence(connection, "message_sequence", len(batch))
+            message_sequences = range(first_sequence, first_sequence + len(batch))
+            for (table, received_at, value), message_sequence in zip(
+                batch, message_sequences
+            ):
+                derived = DERIVED_COLUMNS[table](value)
+                if table == "responses":
+                    # In the batch transaction, so a response and the
+                    # transmission state it implies commit together. A
+                    # replayed row is matched at the time it was received.
+                    transmission_id = correlate_response(
+                        connection, value, *derived, received_at=received_at
+                    )
+                    derived = (*derived, transmission_id)
+                connection.execute(
+                    INSERT_STATEMENTS[table],
+                    (utc_timestamp(received_at), message_sequence, value, *derived),
+                )
+            connection.commit()
+            elapsed = time.perf_counter() - start
+        except sqlite3.Error as error:
+            logging.error("Ingest batch of %d rows failed: %s", len(batch), error)
+            connection.rollback()
+            return False
+        except Exception:
+            logging.exception("Ingest batch of %d rows failed", len(batch))
+            connection.rollback()
+            return False
+
+        self.batch_count += 1
+        self.row_count += len(batch)
+        self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+        self.recent_batches.append((len(batch), elapsed))
+        logging.debug("Committed %d ingest rows in %.1f ms", len(batch), elapsed * 1000)
+        # The rows are committed: a failure from here on must not spool them again.
+        try:
+            if self.on_batch is not None:
+                self.on_batch(len(batch), elapsed)
+            if self.notify_path is not None:
+                latest = {}
+                for (table, _, _), message_sequence in zip(batch, message_sequences):
+                    latest[table] = message_sequence
+                self._notify(latest)
+        except Exception:
+            logging.exception("Ingest batch callback failed")
+        return True
+
+    def _notify(self, latest):
+        message = "\n".join(f"{table} {sequence}" for table, sequence in latest.items())
+        # A lost wakeup only delays readers until their next poll.
+        if notifier_for(self.notify_path).notify(message.encode("ascii")):
+            self.notifications_sent += 1
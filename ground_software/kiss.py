@@ -0,0 +1,82 @@
+"""
+ @brief KISS frame decoding for the radio serial link
+
+ Decodes KISS frames from whatever bytes the serial port has available,
+ keeping partial frames between reads and undoing FESC escaping.
+"""
+
+FEND = b"\xC0"  # frame end
+FESC = b"\xDB"  # frame escape
+TFEND = b"\xDC"  # transposed frame end
+TFESC = b"\xDD"  # transposed frame escape
+
+MAX_FRAME_LENGTH = 4096
+
+
+def unescape(data):
+    """Undo KISS escaping of a frame body."""
+    if FESC not in data:
+        return bytes(data)
+    return bytes(data).replace(FESC + TFEND, FEND).replace(FESC + TFESC, FESC)
+
+
+def escape(data):
+    """Apply KISS escaping to a frame body."""
+    return bytes(data).replace(FESC, FESC + TFESC).replace(FEND, FESC + TFEND)
+
+
+class KissDecoder:
+    """Incremental KISS decoder.
+
+    feed() accepts any chunk of the byte stream and returns the complete
+    frames it finishes, without FEND delimiters and unescaped. Bytes before
+    the first FEND are discarded, empty frames between back-to-back FENDs
+    are skipped and a frame longer than max_frame_length is dropped.
+    """
+
+    def __init__(self, max_frame_length=MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self.dropped_frames = 0
+        self._buffer = bytearray()
+        self._in_frame = False
+
+    def feed(self, data):
+        frames = []
+        buffer = self._buffer
+        buffer += data
+        position = 0
+        if not self._in_frame:
+            start = buffer.find(FEND)
+            if start < 0:
+                buffer.clear()
+                return frames
+            position = start + 1
+            self._in_frame = True
+
+        while True:
+            end = buffer.find(FEND, position)
+            if end < 0:
+                break
+            if end - position > self.max_frame_length:
+                self.dropped_frames += 1
+            elif end > position:
+                frames.append(unescape(buffer[position:end]))
+            position = end + 1
+
+        del buffer[:position]
+        if len(buffer) > self.max_frame_length:
+            # No FEND in sight: drop the runaway frame and hunt for the next one.
+            buffer.clear()
+            self._in_frame = False
+            self.dropped_frames += 1
+        return frames
+
+    def read_frames(self, radio_serial):
+        """Read the bytes waiting on radio_serial and return completed frames.
+
+        Blocks for at most the port timeout when nothing is waiting.
+        """
+        data = radio_serial.read(radio_serial.in_waiting or 1)
+        if not data:
+            return []
+        return self.feed(data)
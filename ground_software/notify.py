@@ -0,0 +1,167 @@
+"""
+ @brief Wakeups between the processes and threads that share the database
+
+ A producer that commits rows for another process to act on calls
+ Notifier.notify() after the commit; the consumer waits on a
+ WakeupListener bound to the same Unix datagram socket path.
+
+ Each process keeps one non-blocking socket per path (notifier_for). When
+ the listener lives in the same process, as serial_write does under
+ ground_station.py, notify() sets its event directly and makes no socket
+ call. Wakeups coalesce: any number of notifications before the consumer
+ wakes produce one wakeup. A datagram that does not fit in the receive
+ buffer is counted as coalesced, since the consumer already has one
+ waiting; a send that fails because nobody is listening is counted as
+ failed. Consumers keep a poll timeout for that case.
+"""
+
+import errno
+import logging
+import os
+import socket
+import threading
+
+RECEIVE_TIMEOUT = 0.5  # seconds between close checks in the listener thread
+
+_listeners = {}
+_notifiers = {}
+_lock = threading.Lock()
+
+
+class Notifier:
+    """Send wakeups to the listener on path over one long-lived socket."""
+
+    def __init__(self, path):
+        self.path = path
+        self.sent = 0
+        self.local = 0
+        self.coalesced = 0
+        self.failed = 0
+        self._socket = None
+        self._socket_lock = threading.Lock()
+        self._last_error = None
+
+    def notify(self, message=b"\x00"):
+        """Wake the listener; return True unless the wakeup was lost."""
+        listener = _listeners.get(self.path)
+        if listener is not None:
+            listener.wake()
+            self.local += 1
+            return True
+        try:
+            if self._socket is None:
+                with self._socket_lock:
+                    if self._socket is None:
+                        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                        sender.setblocking(False)
+                        self._socket = sender
+            self._socket.sendto(message, self.path)
+        except BlockingIOError:
+            # The receiver has unread wakeups already.
+            self.coalesced += 1
+            return True
+        except OSError as error:
+            self.failed += 1
+            if error.errno != self._last_error:
+                # Log each change of error, not every failed send.
+                self._last_error = error.errno
+                not_listening = error.errno in (errno.ENOENT, errno.ECONNREFUSED)
+                logging.log(
+                    logging.DEBUG if not_listening else logging.WARNING,
+                    "Wakeup to %s failed: %s",
+                    self.path,
+                    error,
+                )
+            return False
+        self._last_error = None
+        self.sent += 1
+        return True
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "local": self.local,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def notifier_for(path):
+    """Return this process's Notifier for path."""
+    notifier = _notifiers.get(path)
+    if notifier is None:
+        with _lock:
+            notifier = _notifiers.setdefault(path, Notifier(path))
+    return notifier
+
+
+class WakeupListener:
+    """Receive wakeups sent to path, from other processes or this one.
+
+    A daemon thread turns datagrams into the event that wait() blocks on,
+    and Notifiers in this process set that event directly. wait() clears
+    the event before returning, so the caller must read the database after
+    wait() returns: a wakeup that arrives while it works sets the event
+    again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.received = 0
+        self.local = 0
+        self._event = threading.Event()
+        self._closed = False
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.settimeout(RECEIVE_TIMEOUT)
+        if os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._socket.bind(path)
+        with _lock:
+            _listeners[path] = self
+        self._thread = threading.Thread(target=self._receive, name="wakeup-listener", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self.local += 1
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Block until woken or timeout; return True if woken."""
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+    def stats(self):
+        return {"received": self.received, "local": self.local}
+
+    def close(self):
+        with _lock:
+            if _listeners.get(self.path) is self:
+                del _listeners[self.path]
+        self._closed = True
+        self._event.set()
+        self._thread.join(timeout=2 * RECEIVE_TIMEOUT)
+        self._socket.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _receive(self):
+        while not self._closed:
+            try:
+                self._socket.recv(512)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            self.received += 1
+            self._event.set()
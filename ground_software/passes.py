@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+ @brief Pass prediction for the ground station
+
+ Finds AOS, LOS and maximum elevation over the next days in one sweep:
+ doppler_engine.look_geometry propagates every step at once and the
+ horizon crossings are located with NumPy. The passes are cached in the
+ passes table together with a key of the TLE, station and span, and are
+ computed again only when the TLE changes or less than half the span is
+ left.
+
+ python3 -m ground_software.passes --latitude 38.89 --longitude -77.03
+
+ Requires the optional numpy and sgp4 packages.
+"""
+
+import argparse
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ground_software.database import open_connection
+from ground_software.doppler_engine import (
+    MIN_ELEVATION,
+    SATELLITE_NAME,
+    TLE_PATH,
+    GroundStation,
+    load_tle,
+    look_geometry,
+    time_grid,
+)
+
+DEFAULT_DAYS = 3
+SWEEP_STEP = 10.0  # seconds; crossings and peaks are interpolated
+SECONDS_PER_DAY = 86400.0
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # matches CURRENT_TIMESTAMP
+
+
+def format_timestamp(unix_time):
+    return datetime.fromtimestamp(unix_time, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def find_passes(
+    line1,
+    line2,
+    station,
+    start,
+    days=DEFAULT_DAYS,
+    step=SWEEP_STEP,
+    min_elevation=MIN_ELEVATION,
+):
+    """Return the passes above min_elevation that end within the span.
+
+    Each pass is a dict of Unix times and degrees. Horizon crossings are
+    interpolated linearly between sweep steps and the peak with a
+    parabola through the three highest steps. Steps sgp4 could not
+    propagate count as below the horizon, and a crossing next to one is
+    clipped to the step inside the pass. A pass already in progress
+    at start begins at start; one still in progress at the end is left
+    for the next computation.
+    """
+    times = time_grid(start, days * SECONDS_PER_DAY, step)
+    _, _, elevation, azimuth = look_geometry(line1, line2, station, times)
+    above = np.nan_to_num(elevation, nan=-90.0) >= min_elevation
+
+    edges = np.diff(above.astype(np.int8))
+    rises = np.flatnonzero(edges == 1)
+    sets = np.flatnonzero(edges == -1)
+    if above[0]:
+        rises = np.concatenate(([-1], rises))
+    # Rises and sets alternate, so each set closes the rise before it.
+    rises = rises[: len(sets)]
+
+    def crossing(index):
+        before, after = elevation[index], elevation[index + 1]
+        if np.isnan(before) or np.isnan(after):
+            # sgp4 failed beside the crossing: clip the pass to its last good step.
+            return times[index] if np.isnan(after) else times[index + 1]
+        return times[index] + step * (min_elevation - before) / (after - before)
+
+    passes = []
+    for rise, fall in zip(rises, sets):
+        first = rise + 1
+        peak = first + int(np.argmax(elevation[first : fall + 1]))
+        peak_time, peak_elevation = times[peak], elevation[peak]
+        if first < peak < fall:
+            low, high = elevation[peak - 1], elevation[peak + 1]
+            curvature = low - 2 * peak_elevation + high
+            if curvature < 0:
+                offset = 0.5 * (low - high) / curvature
+                peak_time += offset * step
+                peak_elevation -= 0.25 * (low - high) * offset
+        passes.append(
+            {
+                "aos": times[0] if rise < 0 else crossing(rise),
+                "los": crossing(fall),
+                "max_elevation": float(peak_elevation),
+                "max_elevation_time": float(peak_time),
+                "aos_azimuth": float(azimuth[first]),
+                "los_azimuth": float(azimuth[fall]),
+            }
+        )
+    return passes
+
+
+def source_key(line1, line2, station, days):
+    """Identify the inputs a cached set of passes was computed from."""
+    source = f"{line1}\n{line2}\n{station.latitude} {station.longitude} {station.altitude} {days}"
+    return hashlib.sha256(source.encode("ascii")).hexdigest()
+
+
+def _setting(connection, key):
+    row = connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def refresh_passes(connection, line1, line2, station, days=DEFAULT_DAYS, now=None):
+    """Recompute the passes table if its inputs changed; return True if it did.
+
+    The table is also recomputed when less than half of the span is left,
+    so it always covers at least days / 2 ahead.
+    """
+    now = time.time() if now is None else now
+    key = source_key(line1, line2, station, days)
+    try:
+        valid_until = float(_setting(connection, "passes_valid_until"))
+    except (TypeError, ValueError):
+        valid_until = 0.0
+    remaining = valid_until - now
+    if _setting(connection, "passes_source") == key and remaining >= days * SECONDS_PER_DAY / 2:
+        return False
+
+    passes = find_passes(line1, line2, station, now, days)
+    rows = [
+        (
+            format_timestamp(item["aos"]),
+            format_timestamp(item["los"]),
+            round(item["max_elevation"], 1),
+            format_timestamp(item["max_elevation_time"]),
+            round(item["aos_azimuth"], 1),
+            round(item["los_azimuth"], 1),
+        )
+        for item in passes
+    ]
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("DELETE FROM passes")
+        connection.executemany(
+            "INSERT INTO passes (aos, los, max_elevation, max_elevation_time, "
+            "aos_azimuth, los_azimuth) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            [
+                ("passes_source", key),
+                ("passes_valid_until", str(now + days * SECONDS_PER_DAY)),
+            ],
+        )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return True
+
+
+class PassPredictor:
+    """Keep the passes table current from a background thread.
+
+    request_refresh() only wakes the thread, so a request handler can ask
+    for fresh passes and answer from the table straight away. The thread
+    reads the TLE file, and recomputes when refresh_passes finds that the
+    table no longer matches it. status is "idle", "computing" or an error.
+    """
+
+    def __init__(self, db_path, tle_path, station, name=SATELLITE_NAME, days=DEFAULT_DAYS):
+        self.db_path = db_path
+        self.tle_path = tle_path
+        self.station = station
+        self.name = name
+        self.days = days
+        self.status = "idle"
+        self.computations = 0
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="pass-predictor", daemon=True)
+        self._thread.start()
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                line1, line2 = load_tle(self.tle_path, self.name)
+                connection = open_connection(self.db_path)
+                # Autocommit mode, so refresh_passes controls its transaction.
+                connection.isolation_level = None
+                try:
+                    self.status = "computing"
+                    if refresh_passes(connection, line1, line2, self.station, self.days):
+                        self.computations += 1
+                finally:
+                    connection.close()
+                self.status = "idle"
+            except Exception as e:
+                logging.error(f"Pass prediction failed: {e}")
+                self.status = f"error: {e}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict SilverSat passes")
+    parser.add_argument("--tle", default=TLE_PATH, help=f"TLE file (default: {TLE_PATH})")
+    parser.add_argument("--name", default=SATELLITE_NAME, help="Satellite name in the TLE file")
+    parser.add_argument("--latitude", type=float, required=True, help="Degrees north")
+    parser.add_argument("--longitude", type=float, required=True, help="Degrees east")
+    parser.add_argument("--altitude", type=float, default=0.0, help="Metres above WGS84")
+    parser.add_argument("--days", type=float, default=DEFAULT_DAYS)
+    args = parser.parse_args()
+
+    line1, line2 = load_tle(args.tle, args.name)
+    station = GroundStation(args.latitude, args.longitude, args.altitude)
+    for item in find_passes(line1, line2, station, time.time(), args.days):
+        print(
+            f"AOS {format_timestamp(item['aos'])}  LOS {format_timestamp(item['los'])}  "
+            f"max {item['max_elevation']:4.1f} deg at {format_timestamp(item['max_elevation_time'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
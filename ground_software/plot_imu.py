@@ -33,11 +33,11 @@ def extract_imu_data(db_path: str) -> List[Dict]:
     connection.row_factory = sqlite3.Row
     cursor = connection.cursor()
     
-    # Query for RES GTY records (checking bytes 3-9)
+    # Query for RES GTY records (classified on insert, see idx_responses_kind)
     query = """
-        SELECT timestamp, response 
-        FROM responses 
-        WHERE CAST(substr(response, 3, 7) AS TEXT) = 'RES GTY'
+        SELECT timestamp, text
+        FROM responses
+        WHERE kind = 'RES GTY'
         ORDER BY timestamp ASC
     """
     
@@ -49,12 +49,8 @@ def extract_imu_data(db_path: str) -> List[Dict]:
     
     for row in rows:
         timestamp_str = row["timestamp"]
-        try:
-            # Decode response (skip first 2 and last byte for KISS framing)
-            response_text = row["response"][2:-1].decode('utf-8', errors='replace')
-        except Exception as e:
-            print(f"Warning: Could not decode response at {timestamp_str}: {e}")
-            continue
+        # Response text is stored decoded, without KISS framing
+        response_text = row["text"]
         
         # Parse IMU values from response
         parsed = parse_imu_values(response_text)
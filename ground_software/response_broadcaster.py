@@ -0,0 +1,338 @@
+"""
+ @brief Shared response feed for /responses_stream clients
+
+ One background thread per application process polls the responses table
+ and fans new rows out to every connected browser through a bounded queue
+ per client, so database load does not grow with the number of viewers.
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+from collections import deque
+
+from ground_software.database import open_connection
+from ground_software.notify import WakeupListener
+
+SNAPSHOT_LIMIT = 25
+UPDATE_LIMIT = 100
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_RESUME_LIMIT = 200  # rows a reconnecting client can catch up on
+KEEPALIVE_INTERVAL = 15  # seconds without events before a keepalive comment
+KEEPALIVE_COMMENT = ": keepalive\n\n"
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+SNAPSHOT_QUERY = (
+    "SELECT * FROM responses "
+    "WHERE message_sequence > ? AND kind NOT IN ('ACK D', 'RES D') "
+    f"ORDER BY message_sequence DESC LIMIT {SNAPSHOT_LIMIT}"
+)
+UPDATE_QUERY = (
+    "SELECT * FROM responses "
+    "WHERE message_sequence > ? AND kind NOT IN ('ACK D', 'RES D') "
+    f"ORDER BY message_sequence ASC LIMIT {UPDATE_LIMIT}"
+)
+
+
+def get_cleared_sequence(database):
+    row = database.execute(
+        "SELECT value FROM settings WHERE key = ?", ("responses_cleared_sequence",)
+    ).fetchone()
+    if row and row["value"]:
+        try:
+            return int(row["value"])
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+def serialize_response_rows(rows):
+    return [
+        {
+            "message_sequence": row["message_sequence"],
+            "timestamp": row["timestamp"],
+            "response": row["response"].decode("utf-8", errors="replace"),
+        }
+        for row in rows
+    ]
+
+
+def format_event(event_name, payload, sequence):
+    """Format one server-sent event; sequence becomes its id."""
+    return f"id: {sequence}\nevent: {event_name}\ndata: {json.dumps(payload)}\n\n"
+
+
+class Subscription:
+    """One client's view of the feed.
+
+    Events are ("snapshot", rows, sequence) or ("responses", rows, sequence)
+    tuples, where sequence is the message_sequence the client is current
+    to and is sent as the SSE event id. When the client falls queue_size
+    events behind, its backlog is replaced by a single snapshot of the
+    current state.
+    """
+
+    def __init__(self, broadcaster, queue_size, last_event_id=None):
+        self._broadcaster = broadcaster
+        self._events = queue.Queue(maxsize=queue_size)
+        self.last_event_id = last_event_id
+        self.resyncs = 0
+
+    def get(self, timeout=None):
+        """Return the next event, or None if none arrives within timeout."""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broadcaster.unsubscribe(self)
+
+    def _offer(self, event, snapshot_event):
+        try:
+            self._events.put_nowait(event)
+            return
+        except queue.Full:
+            pass
+        while True:
+            try:
+                self._events.get_nowait()
+            except queue.Empty:
+                break
+        self.resyncs += 1
+        self._events.put_nowait(snapshot_event)
+
+
+class ResponseBroadcaster:
+    """Poll the responses table once on behalf of every stream client.
+
+    The polling thread starts with the first subscriber and idles while
+    nobody is subscribed. A new subscriber is admitted right after the
+    next poll. If it resumes from a last_event_id, it receives only the
+    rows it missed, taken from the last resume_limit rows held in memory.
+    It gets a snapshot instead when it has no id, when the gap is larger
+    than that history, or when the responses were cleared since.
+
+    With notify_path set, the poller waits on a notify.WakeupListener
+    bound to that path, so each IngestWriter commit wakes it at once.
+    poll_interval then only bounds the delay when a notification is lost
+    or the socket cannot be bound.
+
+    A failed poll is logged and retried after poll_interval, on a new
+    connection if sqlite raised, so one error does not stop the feed.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        notify_path=None,
+        resume_limit=DEFAULT_RESUME_LIMIT,
+    ):
+        self.db_path = db_path
+        self.notify_path = notify_path
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.polls = 0
+        self.poll_errors = 0
+        self.resumes = 0
+        self.snapshots = 0
+        self._subscribers = set()
+        self._pending = []
+        self._snapshot = None
+        self._cleared_sequence = None
+        self._last_sequence = 0
+        # Every visible row above _history_floor is in _history, oldest first.
+        self._history = deque(maxlen=max(resume_limit, SNAPSHOT_LIMIT))
+        self._history_floor = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._listener = None
+        self._own_wakes = 0
+
+    def subscribe(self, last_event_id=None):
+        return self.add(Subscription(self, self.queue_size, last_event_id))
+
+    def add(self, subscription):
+        """Admit subscription, built by a caller needing its own queue type."""
+        with self._lock:
+            self._pending.append(subscription)
+            if self._thread is None:
+                if self.notify_path is not None and self._listener is None:
+                    try:
+                        self._listener = WakeupListener(self.notify_path)
+                    except OSError as error:
+                        logging.warning(
+                            "Cannot listen on %s, polling responses only: %s",
+                            self.notify_path,
+                            error,
+                        )
+                self._thread = threading.Thread(
+                    target=self._run, name="response-broadcaster", daemon=True
+                )
+                self._thread.start()
+        self._wake_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            if subscription in self._pending:
+                self._pending.remove(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers) + len(self._pending)
+
+    @property
+    def notifications(self):
+        """Wakeups from notify_path, not counting subscribe() and close()."""
+        if self._listener is None:
+            return 0
+        stats = self._listener.stats()
+        return stats["received"] + stats["local"] - self._own_wakes
+
+    def close(self):
+        self._stopping.set()
+        self._wake_poller()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if self._listener is not None:
+            self._listener.close()
+
+    def _wake_poller(self):
+        if self._listener is not None:
+            with self._lock:
+                self._own_wakes += 1
+            self._listener.wake()
+        else:
+            self._wake.set()
+
+    def _wait(self, timeout=None):
+        # Clears on return, like WakeupListener.wait(), so a wake-up during
+        # the next poll is not lost.
+        if self._listener is not None:
+            return self._listener.wait(timeout)
+        woken = self._wake.wait(timeout)
+        self._wake.clear()
+        return woken
+
+    def _run(self):
+        database = None
+        try:
+            while not self._stopping.is_set():
+                if not self.subscriber_count:
+                    # Nobody is listening: stop polling until subscribe() wakes us.
+                    self._wait()
+                    continue
+                try:
+                    if database is None:
+                        database = open_connection(
+                            self.db_path, read_only=True, check_same_thread=False
+                        )
+                    self._poll(database)
+                    self._admit()
+                except sqlite3.Error:
+                    self.poll_errors += 1
+                    logging.exception("Response poll failed, reopening the database")
+                    if database is not None:
+                        database.close()
+                        database = None
+                except Exception:
+                    self.poll_errors += 1
+                    logging.exception("Response poll failed")
+                self._wait(self.poll_interval)
+        finally:
+            if database is not None:
+                database.close()
+            with self._lock:
+                # Let the next add() start a new thread if this one died.
+                self._thread = None
+
+    def _poll(self, database):
+        self.polls += 1
+        cleared_sequence = get_cleared_sequence(database)
+        if cleared_sequence != self._cleared_sequence:
+            snapshot = serialize_response_rows(
+                database.execute(SNAPSHOT_QUERY, (cleared_sequence,)).fetchall()
+            )
+            self._cleared_sequence = cleared_sequence
+            self._last_sequence = max(
+                (item["message_sequence"] for item in snapshot), default=cleared_sequence
+            )
+            self._history.clear()
+            self._history.extend(reversed(snapshot))
+            if len(snapshot) < SNAPSHOT_LIMIT:
+                self._history_floor = cleared_sequence
+            else:
+                self._history_floor = snapshot[-1]["message_sequence"] - 1
+            self._publish(self._snapshot_event(snapshot), snapshot)
+            return
+
+        rows = serialize_response_rows(
+            database.execute(UPDATE_QUERY, (self._last_sequence,)).fetchall()
+        )
+        if rows:
+            self._last_sequence = rows[-1]["message_sequence"]
+            for row in rows:
+                if len(self._history) == self._history.maxlen:
+                    self._history_floor = self._history[0]["message_sequence"]
+                self._history.append(row)
+            snapshot = (list(reversed(rows)) + self._snapshot)[:SNAPSHOT_LIMIT]
+            self._publish(("responses", rows, self._last_sequence), snapshot)
+
+    def _snapshot_event(self, snapshot):
+        return ("snapshot", snapshot, self._last_sequence)
+
+    def _publish(self, event, snapshot):
+        with self._lock:
+            self._snapshot = snapshot
+            snapshot_event = self._snapshot_event(snapshot)
+            for subscription in self._subscribers:
+                subscription._offer(event, snapshot_event)
+
+    def _admit(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            snapshot_event = self._snapshot_event(self._snapshot)
+            for subscription in pending:
+                event = self._resume_event(subscription.last_event_id)
+                if event is None:
+                    pass
+                elif event[0] == "snapshot":
+                    self.snapshots += 1
+                    subscription._offer(snapshot_event, snapshot_event)
+                else:
+                    self.resumes += 1
+                    subscription._offer(event, snapshot_event)
+                self._subscribers.add(subscription)
+
+    def _resume_event(self, last_event_id):
+        """Return what a client current to last_event_id needs, None if nothing."""
+        try:
+            last_sequence = int(last_event_id)
+        except (TypeError, ValueError):
+            return ("snapshot",)
+        if (
+            last_sequence <= self._cleared_sequence
+            or last_sequence < self._history_floor
+            or last_sequence > self._last_sequence
+        ):
+            return ("snapshot",)
+        rows = [row for row in self._history if row["message_sequence"] > last_sequence]
+        if not rows:
+            return None
+        return ("responses", rows, self._last_sequence)
@@ -4,25 +4,98 @@ CREATE TABLE transmissions(
     timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     message_sequence INTEGER NOT NULL UNIQUE,
     command NOT NULL, 
-    status NOT NULL DEFAULT 'pending'
+    status NOT NULL DEFAULT 'pending',
+    priority INTEGER,
+    enqueued_at REAL,
+    transmitted_at REAL,
+    on_air_at REAL,
+    command_sequence INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    acked_at REAL,
+    responded_at REAL
 );
 
+CREATE INDEX idx_transmissions_queue
+ON transmissions(status, priority, message_sequence)
+WHERE status = 'pending';
+
+CREATE INDEX idx_transmissions_transmitted
+ON transmissions(transmitted_at)
+WHERE transmitted_at IS NOT NULL;
+
+CREATE INDEX idx_transmissions_command_sequence
+ON transmissions(command_sequence)
+WHERE command_sequence IS NOT NULL;
+
+CREATE INDEX idx_transmissions_awaiting
+ON transmissions(status, command_sequence)
+WHERE status IN ('transmitted', 'acked') AND command_sequence IS NOT NULL;
+
+DROP TABLE IF EXISTS command_latency;
+CREATE TABLE command_latency(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    transmission_id INTEGER NOT NULL,
+    command_sequence INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    ack_seconds REAL,
+    response_seconds REAL,
+    recorded_at REAL NOT NULL
+);
+
+CREATE INDEX idx_command_latency_command
+ON command_latency(command, recorded_at);
+
 DROP TABLE IF EXISTS responses;
 CREATE TABLE responses(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     message_sequence INTEGER NOT NULL UNIQUE,
-    response NOT NULL
+    response NOT NULL,
+    text TEXT,
+    kind TEXT,
+    transmission_id INTEGER
 );
 
+CREATE INDEX idx_responses_visible
+ON responses(message_sequence)
+WHERE kind NOT IN ('ACK D', 'RES D');
+
+CREATE INDEX idx_responses_kind
+ON responses(kind, message_sequence);
+
 DROP TABLE IF EXISTS radio_logs;
 CREATE TABLE radio_logs(
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
     message_sequence INTEGER NOT NULL UNIQUE,
-    log_line TEXT NOT NULL
+    log_line TEXT NOT NULL,
+    rssi_dbm REAL
+);
+
+CREATE INDEX idx_radio_logs_rssi
+ON radio_logs(timestamp, message_sequence)
+WHERE rssi_dbm IS NOT NULL;
+
+DROP TABLE IF EXISTS passes;
+CREATE TABLE passes(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    aos TEXT NOT NULL,
+    los TEXT NOT NULL,
+    max_elevation REAL NOT NULL,
+    max_elevation_time TEXT NOT NULL,
+    aos_azimuth REAL,
+    los_azimuth REAL
 );
 
+CREATE INDEX idx_passes_los
+ON passes(los);
+
+-- Insert triggers that derive rssi_dbm, the response text and kind, and
+-- the transmission priority, enqueue time and command sequence
+-- are created by migrate_database, which init_database runs after this.
+
 DROP TABLE IF EXISTS settings;
 CREATE TABLE IF NOT EXISTS settings (
     key TEXT PRIMARY KEY,
@@ -47,7 +120,7 @@ SELECT
     message_sequence,
     substr(response, 3, length(response) - 3) AS response
 FROM responses
-WHERE CAST(SUBSTR(response, 3, 5) AS TEXT) NOT IN ('ACK D', 'RES D');
+WHERE kind NOT IN ('ACK D', 'RES D');
 
 DROP VIEW IF EXISTS combined_messages;
 CREATE VIEW combined_messages AS
@@ -63,9 +136,9 @@ SELECT
     message_sequence,
     timestamp,
     'response' AS type,
-    CAST(SUBSTR(response, 3, LENGTH(response) - 3) AS TEXT) AS message
+    text AS message
 FROM responses
-WHERE CAST(SUBSTR(response, 3, 5) AS TEXT) NOT IN ('ACK D', 'RES D')
+WHERE kind NOT IN ('ACK D', 'RES D')
 UNION ALL
 SELECT
     message_sequence,
@@ -84,27 +157,6 @@ SELECT
     timestamp,
     message_sequence,
     log_line,
-    CAST(
-        TRIM(
-            REPLACE(
-                REPLACE(
-                    CASE
-                        WHEN instr(lower(substr(log_line, instr(lower(log_line), 'n: rssi'))), 'dbm') > 0 THEN
-                            substr(
-                                log_line,
-                                instr(lower(log_line), 'n: rssi') + 7,
-                                instr(lower(substr(log_line, instr(lower(log_line), 'n: rssi') + 7)), 'dbm') - 1
-                            )
-                        ELSE
-                            substr(log_line, instr(lower(log_line), 'n: rssi') + 7)
-                    END,
-                    '=',
-                    ''
-                ),
-                ':',
-                ''
-            )
-        ) AS REAL
-    ) AS rssi_dbm
+    rssi_dbm
 FROM radio_logs
-WHERE instr(lower(log_line), 'n: rssi') > 0;
+WHERE rssi_dbm IS NOT NULL;
\ No newline at end of file
@@ -5,17 +5,16 @@
 
 import argparse
 import os
-import sqlite3
 import serial
 import time
 
-from ground_software.database import next_sequence_value
+from ground_software.ingest_writer import RESPONSE_NOTIFY_SOCKET_PATH, IngestWriter
 
 BAUD_RATE = 19200
 retry_delay = 5  # seconds
 
 
-def serial_log_read(serial_port, shutdown_event=None):
+def serial_log_read(serial_port, shutdown_event=None, writer=None):
     while not (shutdown_event and shutdown_event.is_set()):
         try:
             log_serial = serial.Serial(serial_port, BAUD_RATE, timeout=1)
@@ -30,11 +29,13 @@ def serial_log_read(serial_port, shutdown_event=None):
     if shutdown_event and shutdown_event.is_set():
         return
 
-    db_path = os.path.abspath("./instance/radio.db")
-    connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-    connection.execute("PRAGMA journal_mode=WAL")
-    connection.execute("PRAGMA busy_timeout = 5000")
+    owns_writer = writer is None
+    if owns_writer:
+        writer = IngestWriter(
+            os.path.abspath("./instance/radio.db"),
+            shutdown_event,
+            notify_path=RESPONSE_NOTIFY_SOCKET_PATH,
+        ).start()
 
     try:
         while not (shutdown_event and shutdown_event.is_set()):
@@ -50,18 +51,14 @@ def serial_log_read(serial_port, shutdown_event=None):
             if not log_line:
                 continue
 
-            message_sequence = next_sequence_value(connection, "message_sequence", 1)
-            cursor.execute(
-                "INSERT INTO radio_logs (message_sequence, log_line) VALUES (?, ?)",
-                (message_sequence, log_line),
-            )
-            connection.commit()
+            writer.submit_log_line(log_line)
     finally:
         try:
             log_serial.close()
         except Exception:
             pass
-        connection.close()
+        if owns_writer:
+            writer.close()
 
 
 if __name__ == "__main__":
@@ -12,11 +12,11 @@
 # imports
 import argparse
 import os
-import sqlite3
 import serial
 import time
 import sys
-from ground_software.database import next_sequence_value
+from ground_software.ingest_writer import RESPONSE_NOTIFY_SOCKET_PATH, IngestWriter
+from ground_software.kiss import KissDecoder
 
 BAUD_RATE = 19200
 retry_delay = 5  # seconds
@@ -24,6 +24,7 @@ FEND = b"\xC0"
 
 
 def read_kiss_frame(radio_serial):
+    """Read one frame a byte at a time; serial_read uses KissDecoder instead."""
     while True:
         first = radio_serial.read(1)
         if not first:
@@ -40,8 +41,12 @@ def read_kiss_frame(radio_serial):
     return FEND + payload
 
 
-def serial_read(serial_port, shutdown_event=None):
-    """Read from the given serial_port and write responses to the database."""
+def serial_read(serial_port, shutdown_event=None, writer=None):
+    """Read from the given serial_port and write responses to the database.
+
+    Frames go to writer, an IngestWriter that may be shared with other
+    readers; a private one is started when none is given.
+    """
     while not (shutdown_event and shutdown_event.is_set()):
         try:
             # opening serial connection
@@ -55,28 +60,24 @@ def serial_read(serial_port, shutdown_event=None):
     if shutdown_event and shutdown_event.is_set():
         return
 
-    # open database
-    db_path = os.path.abspath("./instance/radio.db")
-    connection = sqlite3.connect(db_path)
-    cursor = connection.cursor()
-    connection.execute("PRAGMA journal_mode=WAL")
-    connection.execute("PRAGMA busy_timeout = 5000")
+    owns_writer = writer is None
+    if owns_writer:
+        writer = IngestWriter(
+            os.path.abspath("./instance/radio.db"),
+            shutdown_event,
+            notify_path=RESPONSE_NOTIFY_SOCKET_PATH,
+        ).start()
 
     # read the responses from the radio
+    decoder = KissDecoder()
     try:
         while not (shutdown_event and shutdown_event.is_set()):
             try:
-                response = read_kiss_frame(radio_serial)
+                frames = decoder.read_frames(radio_serial)
             except Exception:
                 break
-            if response is None:
-                continue
-            message_sequence = next_sequence_value(connection, "message_sequence", 1)
-            cursor.execute(
-                "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
-                (message_sequence, response),
-            )
-            connection.commit()
+            for frame in frames:
+                writer.submit_response(FEND + frame + FEND)
     except KeyboardInterrupt:
         print("Interrupted, closing serial connection.")
     finally:
@@ -84,7 +85,8 @@ def serial_read(serial_port, shutdown_event=None):
             radio_serial.close()
         except Exception:
             pass
-        connection.close()
+        if owns_writer:
+            writer.close()
 
 
 if __name__ == "__main__":
@@ -12,84 +12,225 @@
 # imports
 import argparse
 import os
-import socket
 import sqlite3
 import serial
 import time
 import logging
 import sys
+from ground_software.command_tracker import (
+    ACK_TIMEOUT,
+    MAX_RETRIES,
+    RESPONSE_TIMEOUT,
+    retransmit_unacknowledged,
+)
+from ground_software.database import apply_connection_profile
+from ground_software.notify import WakeupListener
 
 BAUD_RATE = 19200
 retry_delay = 5  # seconds
 NOTIFY_SOCKET_PATH = "/tmp/radio_notify"
+POLL_INTERVAL = 1.0  # seconds between queue checks without a wakeup
+MAX_BATCH_FRAMES = 16  # frames claimed and written together
+BITS_PER_BYTE = 10  # 8N1
+MAX_BYTES_IN_FLIGHT = 256  # written but, by the airtime model, not yet on air
+MIN_ROOM_BYTES = 128  # about one signed command frame
 
 
-def claim_next_transmission(connection, cursor):
-    try:
-        row = cursor.execute(
-            "UPDATE transmissions "
-            "SET status = 'sending' "
-            "WHERE id = ("
-            "  SELECT id FROM transmissions "
-            "  WHERE status = 'pending' "
-            "  ORDER BY message_sequence ASC LIMIT 1"
-            ") "
-            "RETURNING id, timestamp, command, status"
-        ).fetchone()
-        connection.commit()
-        return row
-    except sqlite3.OperationalError:
-        # SQLite without RETURNING support.
-        cursor.execute("BEGIN IMMEDIATE")
-        row = cursor.execute(
-            "SELECT id, timestamp, command, status "
-            "FROM transmissions WHERE status='pending' ORDER BY message_sequence ASC LIMIT 1"
-        ).fetchone()
-        if row is None:
+class AirtimePacer:
+    """Keep a bounded number of bytes between serial_write and the air.
+
+    The serial link and the radio's buffer are modelled as one queue that
+    empties at baud_rate: each frame needs length * bits_per_byte /
+    baud_rate seconds after the frames written before it. wait_for_room()
+    sleeps until at least min_room bytes are free and returns the free
+    space, which bounds the next claim. Bytes in flight therefore stay
+    within max_in_flight, or one frame when a single frame is larger.
+    """
+
+    def __init__(
+        self,
+        baud_rate=BAUD_RATE,
+        max_in_flight=MAX_BYTES_IN_FLIGHT,
+        min_room=MIN_ROOM_BYTES,
+        bits_per_byte=BITS_PER_BYTE,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.bytes_per_second = baud_rate / bits_per_byte
+        self.max_in_flight = max_in_flight
+        self.min_room = min(min_room, max_in_flight)
+        self.clock = clock
+        self.sleep = sleep
+        self.frames = 0
+        self.bytes = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.peak_in_flight = 0.0
+        self._busy_until = 0.0
+
+    def airtime(self, size):
+        return size / self.bytes_per_second
+
+    def in_flight(self):
+        return max(0.0, self._busy_until - self.clock()) * self.bytes_per_second
+
+    def room(self):
+        return max(0, int(self.max_in_flight - self.in_flight()))
+
+    def wait_for_room(self, shutdown_event=None):
+        excess = self.in_flight() - (self.max_in_flight - self.min_room)
+        if excess > 0:
+            delay = excess / self.bytes_per_second
+            self.waits += 1
+            self.waited_seconds += delay
+            if shutdown_event is not None:
+                shutdown_event.wait(delay)
+            else:
+                self.sleep(delay)
+        return self.room()
+
+    def sent(self, sizes):
+        """Account for frames just written; return seconds until each is on air."""
+        now = self.clock()
+        finish = max(now, self._busy_until)
+        delays = []
+        for size in sizes:
+            finish += self.airtime(size)
+            delays.append(finish - now)
+            self.frames += 1
+            self.bytes += size
+        self._busy_until = finish
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight())
+        return delays
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "waits": self.waits,
+            "waited_seconds": self.waited_seconds,
+            "peak_in_flight": self.peak_in_flight,
+        }
+
+
+def claim_pending_transmissions(connection, cursor, limit=MAX_BATCH_FRAMES, max_bytes=None):
+    """Mark up to limit pending rows as sending in one transaction.
+
+    Rows are taken by priority class, then message_sequence, which walks
+    idx_transmissions_queue. With max_bytes, the claim stops before the
+    frames exceed it but always takes the first one. Returns (id,
+    priority, message_sequence, command) rows in that order.
+    """
+    if max_bytes is None:
+        try:
+            rows = cursor.execute(
+                "UPDATE transmissions "
+                "SET status = 'sending' "
+                "WHERE id IN ("
+                "  SELECT id FROM transmissions "
+                "  WHERE status = 'pending' "
+                "  ORDER BY priority ASC, message_sequence ASC LIMIT ?"
+                ") "
+                "RETURNING id, priority, message_sequence, command",
+                (limit,),
+            ).fetchall()
             connection.commit()
-            return None
+            # RETURNING does not promise an order.
+            return sorted(rows, key=lambda row: (row[1], row[2]))
+        except sqlite3.OperationalError:
+            # SQLite without RETURNING support.
+            pass
 
-        id, timestamp, command, status = row
-        cursor.execute(
-            "UPDATE transmissions SET status = 'sending' WHERE id = ? AND status = 'pending'",
-            (id,),
-        )
-        connection.commit()
-        if cursor.rowcount == 0:
-            return None
-        return row
+    cursor.execute("BEGIN IMMEDIATE")
+    rows = cursor.execute(
+        "SELECT id, priority, message_sequence, command FROM transmissions "
+        "WHERE status='pending' ORDER BY priority ASC, message_sequence ASC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    if max_bytes is not None:
+        total = 0
+        for count, row in enumerate(rows):
+            total += len(row[3])
+            if count and total > max_bytes:
+                rows = rows[:count]
+                break
+    cursor.executemany(
+        "UPDATE transmissions SET status = 'sending' WHERE id = ?",
+        [(row[0],) for row in rows],
+    )
+    connection.commit()
+    return rows
+
+
+def has_pending_transmissions(cursor):
+    row = cursor.execute(
+        "SELECT 1 FROM transmissions WHERE status = 'pending' LIMIT 1"
+    ).fetchone()
+    return row is not None
+
+
+def claim_next_transmission(connection, cursor):
+    rows = claim_pending_transmissions(connection, cursor, 1)
+    return rows[0] if rows else None
 
 
-def drain_pending_transmissions(connection, cursor, radio_serial, shutdown_event=None):
+def drain_pending_transmissions(
+    connection,
+    cursor,
+    radio_serial,
+    shutdown_event=None,
+    batch_size=MAX_BATCH_FRAMES,
+    pacer=None,
+):
+    # One claim commit, one serial write and one completion commit per batch.
+    # With a pacer, each batch is also limited to the room the pacer reports.
     while not (shutdown_event and shutdown_event.is_set()):
-        row = claim_next_transmission(connection, cursor)
-        if row is None:
+        max_bytes = None
+        if pacer is not None:
+            # Don't sit out the airtime of the last batch when nothing is queued.
+            if pacer.room() < pacer.min_room and not has_pending_transmissions(cursor):
+                return
+            max_bytes = pacer.wait_for_room(shutdown_event)
+            if shutdown_event and shutdown_event.is_set():
+                return
+        rows = claim_pending_transmissions(connection, cursor, batch_size, max_bytes)
+        if not rows:
             return
 
-        id, timestamp, command, status = row
-        radio_serial.write(command)
-        cursor.execute(
-            "UPDATE transmissions SET status = 'transmitted' WHERE id = ?", (id,)
+        commands = [command for _, _, _, command in rows]
+        radio_serial.write(b"".join(commands))
+        transmitted_at = time.time()
+        if pacer is not None:
+            on_air_at = [
+                transmitted_at + delay for delay in pacer.sent([len(command) for command in commands])
+            ]
+        else:
+            on_air_at = [None] * len(rows)
+        # An ACK that arrives before this commit has already moved the row on.
+        cursor.executemany(
+            "UPDATE transmissions "
+            "SET status = CASE WHEN status = 'sending' THEN 'transmitted' ELSE status END, "
+            "transmitted_at = ?, on_air_at = ? WHERE id = ?",
+            [(transmitted_at, on_air, row[0]) for row, on_air in zip(rows, on_air_at)],
         )
         connection.commit()
 
 
-def serial_write(serial_port, shutdown_event=None):
+def serial_write(
+    serial_port,
+    shutdown_event=None,
+    max_in_flight=MAX_BYTES_IN_FLIGHT,
+    ack_timeout=ACK_TIMEOUT,
+    max_retries=MAX_RETRIES,
+    response_timeout=RESPONSE_TIMEOUT,
+):
     # open database
     db_path = os.path.abspath("./instance/radio.db")
     connection = sqlite3.connect(db_path)
     cursor = connection.cursor()
-    connection.execute("PRAGMA journal_mode=WAL")
-    connection.execute("PRAGMA busy_timeout = 5000")
+    apply_connection_profile(connection)
 
-    notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
-    notify_socket.settimeout(1)
-    if os.path.exists(NOTIFY_SOCKET_PATH):
-        try:
-            os.unlink(NOTIFY_SOCKET_PATH)
-        except Exception:
-            pass
-    notify_socket.bind(NOTIFY_SOCKET_PATH)
+    listener = WakeupListener(NOTIFY_SOCKET_PATH)
 
     # serial connection
     logging.info("Opening serial port %s @ %d", serial_port, BAUD_RATE)
@@ -106,40 +247,42 @@ def serial_write(serial_port, shutdown_event=None):
             continue
 
     if radio_serial is None:
-        notify_socket.close()
-        if os.path.exists(NOTIFY_SOCKET_PATH):
-            try:
-                os.unlink(NOTIFY_SOCKET_PATH)
-            except Exception:
-                pass
+        listener.close()
         connection.close()
         return
 
+    pacer = AirtimePacer(max_in_flight=max_in_flight)
+
     try:
-        drain_pending_transmissions(connection, cursor, radio_serial, shutdown_event)
         while not (shutdown_event and shutdown_event.is_set()):
             try:
-                notify_socket.recv(1)
-                drain_pending_transmissions(
-                    connection, cursor, radio_serial, shutdown_event
+                # Retries are checked, and lost wakeups made up for, at
+                # least every POLL_INTERVAL.
+                retransmit_unacknowledged(
+                    connection, ack_timeout, max_retries, response_timeout=response_timeout
                 )
-            except socket.timeout:
                 drain_pending_transmissions(
-                    connection, cursor, radio_serial, shutdown_event
+                    connection, cursor, radio_serial, shutdown_event, pacer=pacer
                 )
+                listener.wait(POLL_INTERVAL)
             except Exception as exc:
                 logging.exception("Serial write loop error: %s", exc)
                 time.sleep(1)
     finally:
-        try:
-            notify_socket.close()
-        except Exception:
-            pass
-        try:
-            if os.path.exists(NOTIFY_SOCKET_PATH):
-                os.unlink(NOTIFY_SOCKET_PATH)
-        except Exception:
-            pass
+        stats = pacer.stats()
+        wakeups = listener.stats()
+        logging.info(
+            "Serial write: %d frames, %d bytes, paced %d times for %.1f s, "
+            "peak %.0f bytes in flight, %d wakeups by socket and %d in process",
+            stats["frames"],
+            stats["bytes"],
+            stats["waits"],
+            stats["waited_seconds"],
+            stats["peak_in_flight"],
+            wakeups["received"],
+            wakeups["local"],
+        )
+        listener.close()
         try:
             radio_serial.close()
         except Exception:
@@ -155,5 +298,37 @@ if __name__ == "__main__":
         default="/tmp/radio",
         help="Serial port path to write to (default: /tmp/radio)",
     )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=MAX_BYTES_IN_FLIGHT,
+        help="Bytes written to the radio ahead of the airtime estimate "
+        f"(default: {MAX_BYTES_IN_FLIGHT})",
+    )
+    parser.add_argument(
+        "--ack-timeout",
+        type=float,
+        default=ACK_TIMEOUT,
+        help=f"Seconds to wait for a command's ACK before sending it again (default: {ACK_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=MAX_RETRIES,
+        help=f"Retransmissions before a command is marked failed (default: {MAX_RETRIES})",
+    )
+    parser.add_argument(
+        "--response-timeout",
+        type=float,
+        default=RESPONSE_TIMEOUT,
+        help="Seconds to wait for a RES after a command's ACK before recording it "
+        f"as unanswered (default: {RESPONSE_TIMEOUT})",
+    )
     args = parser.parse_args()
-    serial_write(args.port)
+    serial_write(
+        args.port,
+        max_in_flight=args.max_in_flight,
+        ack_timeout=args.ack_timeout,
+        max_retries=args.max_retries,
+        response_timeout=args.response_timeout,
+    )
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+ @brief Load test the ASGI server mode with many open response streams
+
+ Starts uvicorn with ground_software.asgi on a temporary database, opens
+ --clients /responses_stream connections, then times command POSTs to /
+ and the fan-out of newly ingested responses to every open stream. The
+ thread count shows that open streams do not hold worker threads.
+
+ python3 -m tests.benchmark_asgi_streams --clients 300 --commands 50
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+import uvicorn
+
+from ground_software.asgi import create_application
+from ground_software.database import init_database, migrate_database
+from ground_software.ingest_writer import IngestWriter
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(application, port):
+    server = uvicorn.Server(
+        uvicorn.Config(application, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def open_stream(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /responses_stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await writer.drain()
+    buffer = b""
+    while b"event: snapshot" not in buffer:
+        buffer += await reader.read(4096)
+    return reader, writer
+
+
+async def wait_for_event(reader, marker):
+    buffer = b""
+    while marker not in buffer:
+        chunk = await reader.read(65536)
+        if not chunk:
+            raise ConnectionError("stream closed")
+        buffer += chunk
+    return time.perf_counter()
+
+
+async def post_command(port, command):
+    body = f"command={command}".encode("ascii")
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        b"POST / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        b"Content-Type: application/x-www-form-urlencoded\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    elapsed = time.perf_counter() - start
+    if not response.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(response[:200])
+    return elapsed
+
+
+async def run_load(port, clients, commands, responses, ingest_writer):
+    start = time.perf_counter()
+    streams = await asyncio.gather(*(open_stream(port) for _ in range(clients)))
+    print(f"{clients} streams open in {time.perf_counter() - start:.2f} s, "
+          f"{threading.active_count()} threads in the server process")
+
+    latencies = [await post_command(port, "NoOperate") for _ in range(commands)]
+    print(
+        f"command POST with streams open: p50 {percentile(latencies, 0.5) * 1000:.1f} ms  "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms  max {max(latencies) * 1000:.1f} ms"
+    )
+
+    fan_out = []
+    for index in range(responses):
+        marker = f"RES FANOUT {index}".encode("ascii")
+        waiters = [asyncio.ensure_future(wait_for_event(reader, marker)) for reader, _ in streams]
+        await asyncio.sleep(0.05)
+        submitted = time.perf_counter()
+        ingest_writer.submit_response(b"\xC0\xAA" + marker + b"\xC0")
+        arrivals = await asyncio.gather(*waiters)
+        fan_out.append(max(arrivals) - submitted)
+    print(
+        f"response delivered to all {clients} streams: "
+        f"median {statistics.median(fan_out) * 1000:.1f} ms  max {max(fan_out) * 1000:.1f} ms"
+    )
+
+    for _, writer in streams:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASGI response stream load test")
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--commands", type=int, default=50)
+    parser.add_argument("--responses", type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="asgi_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    secret_path = os.path.join(directory, "secret.txt")
+    notify_path = os.path.join(directory, "responses.sock")
+    with open(secret_path, "wb") as secret_file:
+        secret_file.write(b"bench-secret")
+
+    application = create_application(
+        {
+            "TESTING": True,
+            "DATABASE": db_path,
+            "SECRET_KEY": "bench",
+            "COMMAND_SECRET_PATH": secret_path,
+            "RESPONSE_NOTIFY_SOCKET_PATH": notify_path,
+        }
+    )
+    with application.flask_application.app_context():
+        init_database()
+        migrate_database()
+
+    ingest_writer = IngestWriter(db_path, notify_path=notify_path).start()
+    port = free_port()
+    server, thread = start_server(application, port)
+    try:
+        asyncio.run(
+            run_load(port, args.clients, args.commands, args.responses, ingest_writer)
+        )
+    finally:
+        server.should_exit = True
+        thread.join()
+        ingest_writer.close()
+
+
+if __name__ == "__main__":
+    main()
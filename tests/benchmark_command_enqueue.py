@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+ @brief Time queueing signed commands while responses are being ingested
+
+ Queues --commands signed commands through control.insert(control.sign())
+ (a command_sequence transaction, then a message_sequence and insert
+ transaction) and through control.enqueue_command (one transaction), while
+ an IngestWriter stores a steady stream of responses and radio log lines
+ in the same database. Each path is run with synchronous=NORMAL (the
+ connection profile) and FULL (an fsync per commit).
+
+ python3 -m tests.benchmark_command_enqueue --commands 500 --ingest-rate 200
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from ground_software import control, create_app
+from ground_software.database import get_database, init_database, migrate_database
+from ground_software.ingest_writer import IngestWriter
+
+
+def ingest_load(writer, rate, stop_event):
+    interval = 1.0 / rate
+    index = 0
+    while not stop_event.is_set():
+        writer.submit_response(f"\xC0\xAARES GTY {index}\xC0".encode("latin-1"))
+        writer.submit_log_line(f"N: rssi -{90 + index % 10} dBm")
+        index += 1
+        stop_event.wait(interval)
+
+
+def run(app, db_path, commands, rate, synchronous, enqueue):
+    stop_event = threading.Event()
+    writer = IngestWriter(db_path).start()
+    load = threading.Thread(target=ingest_load, args=(writer, rate, stop_event), daemon=True)
+    load.start()
+    try:
+        with app.app_context():
+            get_database().execute(f"PRAGMA synchronous = {synchronous}")
+            # control prints every queued command.
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(commands):
+                    enqueue("GetTelemetry")
+                elapsed = time.perf_counter() - start
+            get_database().execute("PRAGMA synchronous = NORMAL")
+    finally:
+        stop_event.set()
+        load.join()
+        writer.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="signed command enqueue benchmark")
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument(
+        "--ingest-rate", type=int, default=200, help="responses and log lines per second"
+    )
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="enqueue_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    secret_path = os.path.join(directory, "secret.txt")
+    with open(secret_path, "wb") as secret_file:
+        secret_file.write(b"bench-secret")
+    app = create_app(
+        {
+            "TESTING": True,
+            "DATABASE": db_path,
+            "SECRET_KEY": "bench",
+            "COMMAND_SECRET_PATH": secret_path,
+        }
+    )
+    with app.app_context():
+        init_database()
+        migrate_database()
+
+    paths = [
+        ("insert(sign())", lambda command: control.insert(control.sign(command))),
+        ("enqueue_command", control.enqueue_command),
+    ]
+    for synchronous in ("NORMAL", "FULL"):
+        baseline = None
+        for name, enqueue in paths:
+            elapsed = run(app, db_path, args.commands, args.ingest_rate, synchronous, enqueue)
+            rate = args.commands / elapsed
+            baseline = baseline or rate
+            print(
+                f"synchronous={synchronous:<6} {name:<15}: {rate:8.0f} commands/s "
+                f"({elapsed / args.commands * 1000:6.2f} ms each, {rate / baseline:4.1f}x)"
+            )
+    app.extensions["database_pool"].close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+ @brief Time a whole-pass Doppler schedule against per-step propagation
+
+ Computes --duration seconds of transmit and receive frequencies at
+ --step resolution with doppler_engine.compute_schedule, one sgp4_array
+ call and NumPy geometry, then the same steps one at a time with scalar
+ sgp4 calls, which is the cost of computing each update on demand. It
+ prints both times and the largest frequency difference between them.
+
+ python3 -m tests.benchmark_doppler_engine --duration 900 --step 0.5
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ground_software.doppler_engine import (
+    DOWNLINK_FREQUENCY,
+    SPEED_OF_LIGHT,
+    GroundStation,
+    compute_schedule,
+    look_geometry,
+)
+
+# A public ISS element set; any LEO TLE gives the same timings.
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579432000"
+START = 1704110400.0  # 2024-01-01 12:00 UTC
+
+
+def per_step(station, times):
+    receive = []
+    for when in times:
+        _, range_rate, _, _ = look_geometry(LINE1, LINE2, station, np.array([when]))
+        receive.append(round(DOWNLINK_FREQUENCY * (1 - range_rate[0] / SPEED_OF_LIGHT)))
+    return np.array(receive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Doppler engine batch benchmark")
+    parser.add_argument("--duration", type=float, default=900.0)
+    parser.add_argument("--step", type=float, default=0.5)
+    args = parser.parse_args()
+
+    station = GroundStation(38.89, -77.03)
+    start = time.perf_counter()
+    schedule = compute_schedule(LINE1, LINE2, station, START, args.duration, args.step)
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    receive = per_step(station, schedule.times)
+    single = time.perf_counter() - start
+
+    steps = len(schedule)
+    print(f"{steps} steps of {args.step} s")
+    print(f"  batch schedule: {batch * 1000:8.2f} ms ({batch / steps * 1e6:6.2f} us/step)")
+    print(f"  per step:       {single * 1000:8.2f} ms ({single / steps * 1e6:6.2f} us/step)")
+    print(f"  max difference: {int(np.max(np.abs(receive - schedule.receive)))} Hz")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+ @brief Measure what the Doppler policy suppresses over a recorded pass
+
+ Frequency updates are replayed on a simulated clock at gpredict's update
+ --interval. Each tick sends F (downlink) and then, a few milliseconds
+ later, I (uplink) as separate rigctld commands, as gpredict does.
+ Without --session a 500 km overhead LEO pass is synthesised at 433 MHz;
+ --session replays the F and I commands from a raw gpredict rigctld byte
+ capture. Updates go through DopplerPolicy the way RigctlServer applies
+ it: to the combined pair after DOPPLER_SETTLE_DELAY, with a held pair
+ sent when it falls due. The "per command" rows apply the policy to each
+ F and I on its own for comparison. For each setting the benchmark prints
+ the commands sent and suppressed, how many sends carried an uplink from
+ an earlier tick, the frequency error left on air while an update was
+ held back, and the serial airtime the Doppler frames take at 19200 baud.
+
+ python3 -m tests.benchmark_doppler_policy --interval 0.25
+"""
+
+import argparse
+import math
+
+from ground_software.gpredict_interface import (
+    DOPPLER_MAX_STALENESS,
+    DOPPLER_MIN_DELTA_HZ,
+    DOPPLER_MIN_INTERVAL,
+    DOPPLER_SETTLE_DELAY,
+    DopplerPolicy,
+    RigctlSession,
+    RigState,
+)
+
+BAUD_RATE = 19200
+BITS_PER_BYTE = 10  # 8N1
+SPEED_OF_LIGHT = 299792458
+COMMAND_GAP = 0.005  # seconds between gpredict's F and I
+
+
+def synthesise_ticks(interval, frequency=433000000, altitude=500e3, velocity=7600.0):
+    """Return the F and I commands per tick for a straight overhead pass."""
+    earth_radius = 6371e3
+    horizon = math.sqrt((earth_radius + altitude) ** 2 - earth_radius**2)
+    duration = 2 * horizon / velocity
+    ticks = []
+    for tick in range(int(duration / interval) + 1):
+        along_track = tick * interval * velocity - horizon
+        slant_range = math.hypot(altitude, along_track)
+        range_rate = velocity * along_track / slant_range
+        shift = range_rate / SPEED_OF_LIGHT
+        transmit, receive = round(frequency * (1 + shift)), round(frequency * (1 - shift))
+        ticks.append([f"F {receive}\n".encode("ascii"), f"I {transmit}\n".encode("ascii")])
+    return ticks
+
+
+def recorded_ticks(path):
+    """Return the F and I commands of a capture, a new tick at each repeat."""
+    ticks = []
+    seen = set()
+    with open(path, "rb") as session_file:
+        for line in session_file.read().splitlines(keepends=True):
+            command = line.strip()[:1]
+            if command not in (b"F", b"I"):
+                continue
+            if not ticks or command in seen:
+                ticks.append([])
+                seen.clear()
+            seen.add(command)
+            ticks[-1].append(line)
+    return ticks
+
+
+def replay(ticks, interval, per_command=False, **settings):
+    now = 0.0
+    policy = DopplerPolicy(clock=lambda: now, **settings)
+    latest = None
+    frame_bytes = 0
+    stale_uplink = 0
+
+    def request_write(transmit, receive):
+        nonlocal latest
+        latest = (int(transmit), int(receive))
+        if per_command:
+            flush()
+
+    def flush():
+        nonlocal latest, frame_bytes, stale_uplink
+        if latest is None or not policy.should_send(*latest):
+            return
+        transmit, receive = latest
+        latest = None
+        # KISS frame: FEND, 0x0D, "tx rx", FEND
+        frame_bytes += len(f"{transmit} {receive}") + 3
+        if transmit != tick_transmit:
+            stale_uplink += 1
+
+    # The radio starts on the first tick's frequencies.
+    first = {command[:1]: str(frequency(command)).encode("ascii") for command in ticks[0]}
+    state = RigState(first.get(b"I", b"433000000"), first.get(b"F", b"433000000"))
+    session = RigctlSession(state, write_frequencies=request_write)
+    for index, commands in enumerate(ticks):
+        tick_start = index * interval
+        if not per_command and latest is not None:
+            # A held pair goes out when it is due, before the next tick.
+            delay = policy.due_in(*latest)
+            if delay is None:
+                latest = None
+            elif now + delay < tick_start:
+                now = now + max(delay, 0.0)
+                flush()
+        # The uplink this tick asks for; a send carrying another is stale.
+        tick_transmit = next(
+            (frequency(command) for command in commands if command.startswith(b"I")),
+            int(state.transmit_frequency),
+        )
+        for offset, command in enumerate(commands):
+            now = tick_start + offset * COMMAND_GAP
+            session.feed(command)
+        if not per_command:
+            now += DOPPLER_SETTLE_DELAY
+            flush()
+    stats = policy.stats()
+    stats["stale_uplink"] = stale_uplink
+    return stats, frame_bytes * BITS_PER_BYTE / BAUD_RATE
+
+
+def frequency(command):
+    return round(float(command.split()[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Doppler policy replay benchmark")
+    parser.add_argument("--session", help="raw gpredict rigctld byte capture to replay")
+    parser.add_argument("--interval", type=float, default=0.25,
+                        help="seconds between gpredict updates")
+    args = parser.parse_args()
+
+    if args.session:
+        ticks = recorded_ticks(args.session)
+    else:
+        ticks = synthesise_ticks(args.interval)
+    print(f"{len(ticks)} updates over {len(ticks) * args.interval:.0f} s")
+
+    default = dict(min_delta_hz=DOPPLER_MIN_DELTA_HZ, min_interval=DOPPLER_MIN_INTERVAL,
+                   max_staleness=DOPPLER_MAX_STALENESS)
+    settings = [
+        ("unfiltered", False, dict(min_delta_hz=0, min_interval=0, max_staleness=0)),
+        ("per command", True, default),
+        ("default", False, default),
+        ("100 Hz 1 s", False, dict(min_delta_hz=100, min_interval=1.0, max_staleness=10.0)),
+        ("250 Hz 2 s", False, dict(min_delta_hz=250, min_interval=2.0, max_staleness=20.0)),
+    ]
+    for name, per_command, setting in settings:
+        stats, airtime = replay(ticks, args.interval, per_command, **setting)
+        print(
+            f"{name:>11}: {stats['sent']:5d} sent  {stats['suppressed']:5d} suppressed  "
+            f"{stats['stale_uplink']:5d} stale uplink  "
+            f"error max {stats['max_error_hz']:4d} Hz mean {stats['mean_error_hz']:6.1f} Hz  "
+            f"airtime {airtime:6.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
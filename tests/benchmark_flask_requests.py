@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+ @brief Benchmark the Flask polling endpoints with and without pooled connections
+
+ Runs /latest_responses and /radio/rssi through the Flask test client
+ against a populated temporary database. DATABASE_POOL_SIZE=0 opens a
+ fresh connection per request, as the application did before pooling.
+
+ python3 -m tests.benchmark_flask_requests --requests 2000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from ground_software import create_app
+from ground_software.database import init_database, migrate_database
+
+
+def populate(db_path, responses, log_lines):
+    connection = sqlite3.connect(db_path)
+    connection.executemany(
+        "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
+        (
+            (index, f"\xC0\xAARES GTY AX 0.{index % 1000:03d}\xC0".encode("latin-1"))
+            for index in range(1, responses + 1)
+        ),
+    )
+    connection.executemany(
+        "INSERT INTO radio_logs (timestamp, message_sequence, log_line) "
+        "VALUES (datetime('2026-01-01 00:00:00', ?), ?, ?)",
+        (
+            (f"+{index} seconds", responses + index, f"N: rssi -{90 + index % 10} dBm")
+            for index in range(1, log_lines + 1)
+        ),
+    )
+    connection.commit()
+    connection.close()
+
+
+def run(db_path, pool_size, requests):
+    app = create_app(
+        {
+            "TESTING": True,
+            "DATABASE": db_path,
+            "SECRET_KEY": "bench",
+            "DATABASE_POOL_SIZE": pool_size,
+        }
+    )
+    client = app.test_client()
+    results = {}
+    for path in ("/latest_responses", "/radio/rssi"):
+        client.get(path)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        results[path] = requests / (time.perf_counter() - start)
+    app.extensions["database_pool"].close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask endpoint connection benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--responses", type=int, default=5000)
+    parser.add_argument("--log-lines", type=int, default=20000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="flask_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    app = create_app({"TESTING": True, "DATABASE": db_path, "SECRET_KEY": "bench"})
+    with app.app_context():
+        init_database()
+        migrate_database()
+    populate(db_path, args.responses, args.log_lines)
+
+    before = run(db_path, 0, args.requests)
+    after = run(db_path, 4, args.requests)
+    for path in before:
+        print(
+            f"{path:<20} per-request connection {before[path]:8.0f} req/s   "
+            f"pooled {after[path]:8.0f} req/s   ({after[path] / before[path]:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+ @brief Benchmark KISS frame decoding throughput
+
+ Compares the byte-at-a-time read_kiss_frame with KissDecoder on an
+ in-memory serial port. read_until follows pyserial's implementation,
+ which calls read(1) per byte; each read() stands for one syscall on a
+ real port, so the figures measure Python overhead and count reads.
+
+ python3 -m tests.benchmark_kiss_decoder --frames 20000
+"""
+
+import argparse
+import random
+import time
+
+from ground_software.kiss import FEND, KissDecoder, escape
+from ground_software.serial_read_interface import read_kiss_frame
+
+
+class MemorySerial:
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.position = 0
+        self.chunk_size = chunk_size
+        self.reads = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk_size, len(self.stream) - self.position)
+
+    def read(self, size=1):
+        self.reads += 1
+        chunk = self.stream[self.position : self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+    def read_until(self, expected=b"\n"):
+        line = bytearray()
+        while True:
+            byte = self.read(1)
+            if not byte:
+                break
+            line += byte
+            if line[-len(expected) :] == expected:
+                break
+        return bytes(line)
+
+
+def build_stream(frame_count, seed):
+    generator = random.Random(seed)
+    frames = []
+    for _ in range(frame_count):
+        text = "RES GTY " + " ".join(
+            f"{generator.uniform(-10, 10):.3f}" for _ in range(generator.randint(2, 20))
+        )
+        frames.append(FEND + escape(b"\xAA" + text.encode("utf-8")) + FEND)
+    return b"".join(frames)
+
+
+def run_read_kiss_frame(stream):
+    radio_serial = MemorySerial(stream, len(stream))
+    count = 0
+    while read_kiss_frame(radio_serial) is not None:
+        count += 1
+    return count, radio_serial.reads
+
+
+def run_decoder(stream, chunk_size):
+    radio_serial = MemorySerial(stream, chunk_size)
+    decoder = KissDecoder()
+    count = 0
+    while radio_serial.position < len(stream):
+        count += len(decoder.read_frames(radio_serial))
+    return count, radio_serial.reads
+
+
+def measure(label, function, stream, *args):
+    start = time.perf_counter()
+    count, reads = function(stream, *args)
+    elapsed = time.perf_counter() - start
+    megabytes = len(stream) / 1_000_000
+    print(
+        f"{label:<32} {megabytes / elapsed:8.2f} MB/s  "
+        f"{count} frames in {elapsed:.3f} s, {reads} reads"
+    )
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KISS decoder throughput benchmark")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    stream = build_stream(args.frames, args.seed)
+    baseline = measure("read_kiss_frame (byte at a time)", run_read_kiss_frame, stream)
+    for chunk_size in (64, 512, 4096):
+        elapsed = measure(f"KissDecoder ({chunk_size} byte reads)", run_decoder, stream, chunk_size)
+        print(f"{'':<32} speedup {baseline / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ @brief Replay a gpredict rigctld session through RigctlSession at high rate
+
+ Without --session, a pass is synthesised the way gpredict drives a
+ duplex radio: every tick it reads f and i back and sets F and I to the
+ Doppler-shifted downlink and uplink. --session replays raw bytes
+ captured from gpredict's TCP stream instead. The stream is cut into
+ segments of one command, one tick (gpredict's pipelined writes) or
+ random sizes, and fed through the parser with Doppler writes going to
+ a temporary database. The old one-command-per-recv parsing is run on
+ the same segments to count the commands it would have lost.
+
+ python3 -m tests.benchmark_rigctl_parser --ticks 5000
+"""
+
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+from ground_software import create_app, gpredict_interface
+from ground_software.database import init_database, migrate_database
+from ground_software.gpredict_interface import DopplerWriter, RigctlSession
+
+
+def synthesise_pass(ticks):
+    """Return one list of command lines per tick over a symmetric pass."""
+    downlink = 433000000
+    uplink = 433000000
+    session = []
+    for tick in range(ticks):
+        # Range rate sweeps from +7 km/s to -7 km/s across the pass.
+        range_rate = 7000 * math.cos(math.pi * tick / max(1, ticks - 1))
+        shift = range_rate / 299792458
+        session.append(
+            [
+                b"f\n",
+                f"F {round(downlink * (1 + shift))}\n".encode("ascii"),
+                b"i\n",
+                f"I {round(uplink * (1 - shift))}\n".encode("ascii"),
+            ]
+        )
+    return session
+
+
+def segment(lines_per_tick, mode, generator):
+    if mode == "command":
+        return [line for tick in lines_per_tick for line in tick]
+    if mode == "tick":
+        return [b"".join(tick) for tick in lines_per_tick]
+    stream = b"".join(line for tick in lines_per_tick for line in tick)
+    segments = []
+    position = 0
+    while position < len(stream):
+        size = generator.randint(1, 64)
+        segments.append(stream[position : position + size])
+        position += size
+    return segments
+
+
+def legacy_commands(segments):
+    """Commands the old parser acted on: one per recv, first byte only."""
+    return sum(1 for data in segments if data[:1] in (b"F", b"I", b"f", b"i"))
+
+
+def replay(segments, writer):
+    session = RigctlSession()
+    reply_bytes = 0
+    with patch.object(gpredict_interface, "doppler_writer", writer):
+        start = time.perf_counter()
+        for data in segments:
+            reply_bytes += len(session.feed(data))
+        elapsed = time.perf_counter() - start
+    return session.commands, reply_bytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rigctld parser replay benchmark")
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--session", help="raw gpredict rigctld byte capture to replay")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.session:
+        with open(args.session, "rb") as session_file:
+            lines = session_file.read().splitlines(keepends=True)
+        lines_per_tick = [lines[index : index + 4] for index in range(0, len(lines), 4)]
+    else:
+        lines_per_tick = synthesise_pass(args.ticks)
+    total_commands = sum(len(tick) for tick in lines_per_tick)
+
+    directory = tempfile.mkdtemp(prefix="rigctl_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    app = create_app({"TESTING": True, "DATABASE": db_path, "SECRET_KEY": "bench"})
+    with app.app_context():
+        init_database()
+        migrate_database()
+    app.extensions["database_pool"].close()
+
+    generator = random.Random(args.seed)
+    for mode in ("command", "tick", "random"):
+        segments = segment(lines_per_tick, mode, generator)
+        writer = DopplerWriter(db_path, os.path.join(directory, "notify"))
+        commands, reply_bytes, elapsed = replay(segments, writer)
+        stats = writer.stats()
+        writer.close()
+        print(
+            f"{mode:>7} segments ({len(segments):6d}): {commands / elapsed:9.0f} commands/s  "
+            f"{commands}/{total_commands} handled, legacy parser {legacy_commands(segments)}  "
+            f"doppler p50 {stats['p50_seconds'] * 1000:.2f} ms "
+            f"p99 {stats['p99_seconds'] * 1000:.2f} ms, {stats['coalesced']} coalesced, "
+            f"{reply_bytes} reply bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+ @brief Benchmark message_sequence allocation for the ingest paths
+
+ Compares per-row next_sequence_value with the block-reserving
+ SequenceAllocator, both inserting one radio log row per allocation.
+
+ python3 -m tests.benchmark_sequence_allocator --rows 2000 --writers 2
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from ground_software.database import SequenceAllocator, next_sequence_value
+
+
+def create_database(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(
+        "CREATE TABLE radio_logs("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "message_sequence INTEGER NOT NULL UNIQUE, "
+        "log_line TEXT NOT NULL);"
+        "CREATE TABLE settings(key TEXT PRIMARY KEY, value DEFAULT CURRENT_TIMESTAMP);"
+    )
+    connection.commit()
+    connection.close()
+
+
+def ingest(db_path, rows, allocate):
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA busy_timeout = 30000")
+    try:
+        for index in range(rows):
+            message_sequence = allocate(connection)
+            connection.execute(
+                "INSERT INTO radio_logs (message_sequence, log_line) VALUES (?, ?)",
+                (message_sequence, f"N: rssi -{90 + index % 10} dBm"),
+            )
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def run(rows, writers, make_allocate):
+    directory = tempfile.mkdtemp(prefix="sequence_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    create_database(db_path)
+
+    threads = [
+        threading.Thread(target=ingest, args=(db_path, rows, make_allocate()))
+        for _ in range(writers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    connection = sqlite3.connect(db_path)
+    stored, distinct = connection.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT message_sequence) FROM radio_logs"
+    ).fetchone()
+    connection.close()
+    if stored != distinct or stored != rows * writers:
+        raise RuntimeError(f"sequence collision: {stored} rows, {distinct} distinct")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="message_sequence allocator benchmark")
+    parser.add_argument("--rows", type=int, default=2000, help="rows per writer")
+    parser.add_argument("--writers", type=int, default=2, help="concurrent writers")
+    parser.add_argument("--block-size", type=int, default=64)
+    args = parser.parse_args()
+
+    total_rows = args.rows * args.writers
+
+    per_row = run(
+        args.rows,
+        args.writers,
+        lambda: lambda connection: next_sequence_value(connection, "message_sequence", 1),
+    )
+    print(f"per-row next_sequence_value: {total_rows / per_row:10.0f} rows/s ({per_row:.3f} s)")
+
+    block = run(
+        args.rows,
+        args.writers,
+        lambda: SequenceAllocator(block_size=args.block_size).next_value,
+    )
+    print(f"SequenceAllocator({args.block_size:>4}):     {total_rows / block:10.0f} rows/s ({block:.3f} s)")
+    print(f"speedup: {per_row / block:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+ @brief Time draining a pre-AOS backlog through serial_write
+
+ Queues --commands signed-size frames, then drains them with
+ drain_pending_transmissions into a serial stand-in that only records
+ the bytes. batch size 1 is the old behaviour: a claim commit and a
+ completion commit per frame. Larger sizes claim and complete a whole
+ batch per commit. Each size is run --rounds times on the connection
+ profile serial_write uses, with synchronous=NORMAL (the profile) and
+ FULL (an fsync per commit).
+
+ python3 -m tests.benchmark_serial_drain --commands 30 --rounds 50
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from ground_software import create_app
+from ground_software.database import apply_connection_profile, init_database, migrate_database
+from ground_software.serial_write_interface import MAX_BATCH_FRAMES, drain_pending_transmissions
+
+
+class _RecordingSerial:
+    def __init__(self):
+        self.bytes_written = 0
+        self.writes = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self.writes += 1
+
+
+def enqueue(connection, commands, first_sequence):
+    frame = b"\xC0\xAA" + b"0" * 96 + b"GetTelemetry\xC0"
+    connection.executemany(
+        "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+        [(first_sequence + index, frame) for index in range(commands)],
+    )
+    connection.commit()
+
+
+def run(db_path, commands, rounds, batch_size, synchronous):
+    connection = apply_connection_profile(sqlite3.connect(db_path))
+    connection.execute(f"PRAGMA synchronous = {synchronous}")
+    cursor = connection.cursor()
+    connection.execute("DELETE FROM transmissions")
+    connection.commit()
+    timings = []
+    serial_port = _RecordingSerial()
+    for round_index in range(rounds):
+        enqueue(connection, commands, round_index * commands + 1)
+        start = time.perf_counter()
+        drain_pending_transmissions(connection, cursor, serial_port, batch_size=batch_size)
+        timings.append(time.perf_counter() - start)
+    connection.close()
+    return timings, serial_port.writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serial_write drain benchmark")
+    parser.add_argument("--commands", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="drain_bench_")
+    db_path = os.path.join(directory, "radio.db")
+    app = create_app({"TESTING": True, "DATABASE": db_path, "SECRET_KEY": "bench"})
+    with app.app_context():
+        init_database()
+        migrate_database()
+    app.extensions["database_pool"].close()
+
+    for synchronous in ("NORMAL", "FULL"):
+        baseline = None
+        for batch_size in (1, 8, MAX_BATCH_FRAMES, args.commands):
+            timings, writes = run(db_path, args.commands, args.rounds, batch_size, synchronous)
+            median = statistics.median(timings)
+            baseline = baseline or median
+            print(
+                f"synchronous={synchronous:<6} batch {batch_size:3d}: "
+                f"{median * 1000:7.2f} ms per {args.commands}-frame backlog "
+                f"({args.commands / median:8.0f} frames/s, {writes // args.rounds} serial writes, "
+                f"{baseline / median:4.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
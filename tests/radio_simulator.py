@@ -18,6 +18,9 @@ from dataclasses import dataclass, field
 ## KISS special characters
 
 FEND = b"\xC0"  # frame begin/end
+FESC = b"\xDB"  # frame escape
+TFEND = b"\xDC"  # transposed frame end
+TFESC = b"\xDD"  # transposed frame escape
 LOCAL_COMMAND = b"\x00"
 AVIONICS_DATA = b"\xAA"
 DOPPLER_FREQUENCIES = b"\x0D"
@@ -65,20 +68,45 @@ def open_serial_with_retry(port, baud_rate):
             )
             time.sleep(RETRY_DELAY_SECONDS)
 
-def read_kiss_payload(serial_connection):
-    while True:
-        first = serial_connection.read(1)
-        if not first:
+class KissPayloadReader:
+    """Collects KISS payloads from the bytes waiting on the serial port."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.in_frame = False
+        self.payloads = []
+
+    def feed(self, data):
+        self.buffer += data
+        position = 0
+        if not self.in_frame:
+            start = self.buffer.find(FEND)
+            if start < 0:
+                self.buffer.clear()
+                return
+            position = start + 1
+            self.in_frame = True
+        while True:
+            end = self.buffer.find(FEND, position)
+            if end < 0:
+                break
+            if end > position:
+                payload = bytes(self.buffer[position:end])
+                self.payloads.append(
+                    payload.replace(FESC + TFEND, FEND).replace(FESC + TFESC, FESC)
+                )
+            position = end + 1
+        del self.buffer[:position]
+
+    def read_payload(self, serial_connection):
+        if not self.payloads:
+            data = serial_connection.read(serial_connection.in_waiting or 1)
+            if not data:
+                return None
+            self.feed(data)
+        if not self.payloads:
             return None
-        if first == FEND:
-            break
-
-    payload = serial_connection.read_until(expected=FEND)
-    if not payload:
-        return None
-    if payload[-1:] != FEND:
-        return None
-    return payload[:-1]
+        return self.payloads.pop(0)
 
 
 def random_delay(minimum, maximum):
@@ -526,9 +554,10 @@ def handle_transmission(serial_connection, fault_profile, transmission):
 
 
 def processor(serial_connection, fault_profile):
+    reader = KissPayloadReader()
     while True:
         try:
-            transmission = read_kiss_payload(serial_connection)
+            transmission = reader.read_payload(serial_connection)
             if not transmission:
                 continue
             logging.debug("Received frame payload: %r", transmission)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+try:
+    from ground_software.asgi import create_application, last_event_id
+except ImportError:  # asgiref is an optional dependency
+    create_application = None
+
+from ground_software.database import init_database, migrate_database
+
+
+def _scope(path, query_string=b"", headers=()):
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": list(headers),
+        "server": ("127.0.0.1", 5000),
+        "client": ("127.0.0.1", 40000),
+    }
+
+
+@unittest.skipIf(create_application is None, "asgiref is not installed")
+class AsgiApplicationTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="asgi_", suffix=".db")
+        os.close(fd)
+        self.application = create_application(
+            {
+                "TESTING": True,
+                "DATABASE": self.db_path,
+                "SECRET_KEY": "test",
+                "RESPONSE_POLL_INTERVAL": 0.02,
+                "RESPONSE_NOTIFY_SOCKET_PATH": None,
+            }
+        )
+        flask_application = self.application.flask_application
+        with flask_application.app_context():
+            init_database()
+            migrate_database()
+        connection = sqlite3.connect(self.db_path)
+        connection.executemany(
+            "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
+            [(sequence, f"\xC0\xAARES OK {sequence}\xC0".encode("latin-1")) for sequence in (1, 2, 3)],
+        )
+        connection.commit()
+        connection.close()
+
+    def tearDown(self):
+        extensions = self.application.flask_application.extensions
+        if "response_broadcaster" in extensions:
+            extensions["response_broadcaster"].close()
+        extensions["database_pool"].close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def test_stream_runs_on_event_loop_and_resumes(self):
+        async def scenario():
+            disconnect = asyncio.Event()
+            messages = []
+            received_body = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+                if message["type"] == "http.response.body":
+                    received_body.set()
+
+            scope = _scope("/responses_stream", headers=[(b"last-event-id", b"1")])
+            task = asyncio.ensure_future(self.application(scope, receive, send))
+            await asyncio.wait_for(received_body.wait(), 5)
+            broadcaster = self.application.flask_application.extensions["response_broadcaster"]
+            self.assertEqual(broadcaster.subscriber_count, 1)
+            disconnect.set()
+            await asyncio.wait_for(task, 5)
+            return messages, broadcaster.subscriber_count
+
+        messages, subscriber_count = asyncio.run(scenario())
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream; charset=utf-8"), messages[0]["headers"])
+        body = messages[1]["body"].decode("utf-8")
+        self.assertTrue(body.startswith("id: 3\nevent: responses\n"))
+        payload = json.loads(body.split("data: ", 1)[1])
+        self.assertEqual([row["message_sequence"] for row in payload], [2, 3])
+        self.assertEqual(subscriber_count, 0)
+
+    def test_other_paths_are_served_by_flask(self):
+        async def scenario():
+            messages = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                messages.append(message)
+
+            await self.application(_scope("/latest_responses"), receive, send)
+            return messages
+
+        messages = asyncio.run(scenario())
+
+        self.assertEqual(messages[0]["status"], 200)
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        self.assertEqual([row["message_sequence"] for row in json.loads(body)], [3, 2, 1])
+
+    def test_last_event_id_prefers_header_over_query(self):
+        self.assertEqual(
+            last_event_id(_scope("/", b"last_event_id=4", [(b"Last-Event-ID", b"7")])), "7"
+        )
+        self.assertEqual(last_event_id(_scope("/", b"last_event_id=4")), "4")
+        self.assertIsNone(last_event_id(_scope("/")))
+
+
+if __name__ == "__main__":
+    unittest.main()
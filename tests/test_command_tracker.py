@@ -0,0 +1,294 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ground_software import create_app
+from ground_software import control, serial_write_interface
+from ground_software.command_tracker import correlate_response, retransmit_unacknowledged
+from ground_software.database import (
+    init_database,
+    migrate_database,
+    transmission_command_sequence,
+)
+from ground_software.ingest_writer import IngestWriter, utc_timestamp
+
+
+class _FakeWriteSerial:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+
+def signed_frame(sequence, command):
+    return b"\xC0\xAA" + b"0" * 80 + f"{sequence:08d}{command}".encode("ascii") + b"\xC0"
+
+
+class CommandTrackerTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="command_tracker_", suffix=".db")
+        os.close(fd)
+        fd_secret, self.secret_path = tempfile.mkstemp(prefix="tracker_secret_", suffix=".txt")
+        os.close(fd_secret)
+        with open(self.secret_path, "wb") as secret_file:
+            secret_file.write(b"tracker-test-secret")
+
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "DATABASE": self.db_path,
+                "SECRET_KEY": "test",
+                "COMMAND_SECRET_PATH": self.secret_path,
+            }
+        )
+        with self.app.app_context():
+            init_database()
+            migrate_database()
+        self.connection = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.connection.close()
+        self.app.extensions["database_pool"].close()
+        for path in (self.db_path, self.secret_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _enqueue(self, *frames):
+        self.connection.executemany(
+            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+            [(index, frame) for index, frame in enumerate(frames, start=1)],
+        )
+        self.connection.commit()
+
+    def _drain(self):
+        serial_port = _FakeWriteSerial()
+        serial_write_interface.drain_pending_transmissions(
+            self.connection, self.connection.cursor(), serial_port
+        )
+        return serial_port.writes
+
+    def _ingest(self, *texts):
+        writer = IngestWriter(self.db_path).start()
+        for text in texts:
+            writer.submit_response(b"\xC0\xAA" + text.encode("ascii") + b"\xC0")
+        writer.close()
+
+    def _states(self):
+        return self.connection.execute(
+            "SELECT command_sequence, status, attempts FROM transmissions ORDER BY id"
+        ).fetchall()
+
+    def test_acks_and_responses_walk_commands_to_responded(self):
+        with self.app.app_context():
+            control.insert(control.sign("GetTelemetry"))
+            control.insert(control.sign("GetPower"))
+            control.insert_local_frame(b"\xC0\x0D433000000 433000000\xC0")
+        self._drain()
+
+        self._ingest("ACK 00000001", "ACK 00000002", "RES GTY 1 2 3")
+        self.assertEqual(
+            self._states(), [(1, "responded", 0), (2, "acked", 0), (None, "transmitted", 0)]
+        )
+        self._ingest("RES GPW 4 5")
+
+        latency = self.connection.execute(
+            "SELECT command_sequence, command, outcome, attempts, ack_seconds, response_seconds "
+            "FROM command_latency ORDER BY command_sequence"
+        ).fetchall()
+        self.assertEqual(
+            [row[:4] for row in latency],
+            [(1, "GetTelemetry", "responded", 1), (2, "GetPower", "responded", 1)],
+        )
+        for *_, ack_seconds, response_seconds in latency:
+            self.assertLessEqual(0, ack_seconds)
+            self.assertLessEqual(ack_seconds, response_seconds)
+        links = self.connection.execute(
+            "SELECT text, transmission_id FROM responses ORDER BY message_sequence"
+        ).fetchall()
+        self.assertEqual(
+            links,
+            [("ACK 00000001", 1), ("ACK 00000002", 2), ("RES GTY 1 2 3", 1), ("RES GPW 4 5", 2)],
+        )
+
+    def test_nack_and_unknown_sequence(self):
+        self._enqueue(signed_frame(7, "NoOperate"))
+        self._drain()
+
+        self._ingest("ACK 00000099", "NACK 00000007", "RES NOP")
+
+        self.assertEqual(self._states(), [(7, "nacked", 0)])
+        self.assertEqual(
+            self.connection.execute("SELECT outcome FROM command_latency").fetchall(),
+            [("nacked",)],
+        )
+        self.assertEqual(
+            self.connection.execute(
+                "SELECT COUNT(*) FROM responses WHERE transmission_id IS NULL"
+            ).fetchone()[0],
+            2,
+        )
+
+    def test_unacknowledged_commands_are_retried_then_failed(self):
+        self._enqueue(signed_frame(1, "GetTelemetry"), b"\xC0\x0E\xC0")
+        frame = signed_frame(1, "GetTelemetry")
+        self.assertEqual(self._drain(), [b"\xC0\x0E\xC0" + frame])
+
+        def after_sent(seconds):
+            return self.connection.execute(
+                "SELECT COALESCE(on_air_at, transmitted_at) FROM transmissions "
+                "WHERE command_sequence = 1"
+            ).fetchone()[0] + seconds
+
+        # The local frame is never retried; the command twice, then given up.
+        statements = []
+        now = after_sent(5)
+        self.connection.set_trace_callback(statements.append)
+        self.assertEqual(retransmit_unacknowledged(self.connection, 10, 2, now), (0, 0))
+        self.connection.set_trace_callback(None)
+        # Nothing overdue: a plain read, no write transaction.
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith("SELECT"))
+        self.assertEqual(retransmit_unacknowledged(self.connection, 10, 2, after_sent(11)), (1, 0))
+        self.assertEqual(self._drain(), [frame])
+        self.assertEqual(retransmit_unacknowledged(self.connection, 10, 2, after_sent(11)), (1, 0))
+        self._drain()
+        self.assertEqual(retransmit_unacknowledged(self.connection, 10, 2, after_sent(11)), (0, 1))
+        self.assertEqual(self._states(), [(1, "failed", 2), (None, "transmitted", 0)])
+
+        # A late ACK still counts.
+        self._ingest("ACK 00000001", "RES GTY")
+        self.assertEqual(self._states()[0], (1, "responded", 2))
+        self.assertEqual(
+            self.connection.execute("SELECT attempts FROM command_latency").fetchone()[0], 3
+        )
+
+    def test_unacknowledged_time_critical_command_is_failed_not_resent(self):
+        self._enqueue(
+            signed_frame(1, "SetClock 2026 10 17 12 00 00"), signed_frame(2, "GetTelemetry")
+        )
+        self._drain()
+        sent_at = self.connection.execute(
+            "SELECT MAX(COALESCE(on_air_at, transmitted_at)) FROM transmissions"
+        ).fetchone()[0]
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(retransmit_unacknowledged(self.connection, 10, 2, sent_at + 11), (1, 1))
+        self.assertEqual(self._states(), [(1, "failed", 0), (2, "pending", 1)])
+        self.assertEqual(self._drain(), [signed_frame(2, "GetTelemetry")])
+
+    def test_acked_command_without_response_is_closed_and_recorded(self):
+        self._enqueue(signed_frame(5, "GetTelemetry"))
+        self._drain()
+        self._ingest("ACK 00000005")
+        acked_at = self.connection.execute("SELECT acked_at FROM transmissions").fetchone()[0]
+
+        self.assertEqual(
+            retransmit_unacknowledged(self.connection, 10, 2, acked_at + 29, 30), (0, 0)
+        )
+        self.assertEqual(self._states(), [(5, "acked", 0)])
+        retransmit_unacknowledged(self.connection, 10, 2, acked_at + 31, 30)
+        self.assertEqual(self._states(), [(5, "no_response", 0)])
+
+        # A late RES no longer has an acked command to answer.
+        self._ingest("RES GTY 1 2 3")
+        latency = self.connection.execute(
+            "SELECT command, outcome, attempts, ack_seconds, response_seconds FROM command_latency"
+        ).fetchall()
+        self.assertEqual([row[:3] for row in latency], [("GetTelemetry", "no_response", 1)])
+        self.assertGreaterEqual(latency[0][3], 0)
+        self.assertIsNone(latency[0][4])
+
+    def test_replayed_response_is_matched_at_its_receive_time(self):
+        self._enqueue(signed_frame(6, "GetPower"))
+        self._drain()
+        sent_at = self.connection.execute(
+            "SELECT COALESCE(on_air_at, transmitted_at) FROM transmissions"
+        ).fetchone()[0]
+        received_at = sent_at + 2.5
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+        with open(spool_path, "w", encoding="utf-8") as spool_file:
+            for text, when in (("ACK 00000006", received_at), ("RES GPW 4 5", received_at + 1)):
+                frame = b"\xC0\xAA" + text.encode("ascii") + b"\xC0"
+                entry = {
+                    "table": "responses",
+                    "timestamp": utc_timestamp(when),
+                    "received_at": when,
+                    "bytes": frame.hex(),
+                }
+                spool_file.write(json.dumps(entry) + "\n")
+
+        IngestWriter(self.db_path, spool_path=spool_path).start().close()
+
+        self.assertEqual(self._states(), [(6, "responded", 0)])
+        ack_seconds, response_seconds = self.connection.execute(
+            "SELECT ack_seconds, response_seconds FROM command_latency"
+        ).fetchone()
+        self.assertAlmostEqual(ack_seconds, 2.5, places=3)
+        self.assertAlmostEqual(response_seconds, 3.5, places=3)
+        timestamps = self.connection.execute(
+            "SELECT timestamp FROM responses ORDER BY message_sequence"
+        ).fetchall()
+        self.assertEqual(
+            [row[0] for row in timestamps], [utc_timestamp(received_at), utc_timestamp(received_at + 1)]
+        )
+
+    def test_correlation_runs_without_returning(self):
+        self._enqueue(signed_frame(4, "GetPower"))
+        self._drain()
+        statements = []
+        self.connection.set_trace_callback(statements.append)
+        self.connection.execute("BEGIN IMMEDIATE")
+        for text, kind in (("ACK 00000004", "ACK"), ("RES GPW 1 2", "RES GPW")):
+            frame = b"\xC0\xAA" + text.encode("ascii") + b"\xC0"
+            self.assertEqual(correlate_response(self.connection, frame, text, kind), 1)
+        self.connection.commit()
+        self.connection.set_trace_callback(None)
+
+        # SQLite before 3.35 has no RETURNING.
+        self.assertFalse([statement for statement in statements if "RETURNING" in statement])
+        self.assertEqual(self._states(), [(4, "responded", 0)])
+
+    def test_ack_before_transmit_commit_is_kept(self):
+        self._enqueue(signed_frame(3, "GetPower"))
+        serial_port = _FakeWriteSerial()
+        # The ACK is stored between the serial write and serial_write's commit.
+        serial_port.write = lambda data: self._ingest("ACK 00000003")
+
+        serial_write_interface.drain_pending_transmissions(
+            self.connection, self.connection.cursor(), serial_port
+        )
+
+        self.assertEqual(self._states(), [(3, "acked", 0)])
+        transmitted_at = self.connection.execute(
+            "SELECT transmitted_at FROM transmissions"
+        ).fetchone()[0]
+        self.assertIsNotNone(transmitted_at)
+
+    def test_trigger_and_migration_match_command_sequence(self):
+        frames = [
+            signed_frame(12, "GetTelemetry"),
+            signed_frame(12345678, "SetClock 2026 10 17 12 00 00"),
+            b"\xC0\xAA" + b"0" * 80 + b"1234567xNoOperate\xC0",
+            b"\xC0\x0D433000000 433000000\xC0",
+            b"\xC0\xAAshort\xC0",
+        ]
+        self._enqueue(*frames)
+        expected = [transmission_command_sequence(frame) for frame in frames]
+        self.assertEqual(expected, [12, 12345678, None, None, None])
+        stored = [row[0] for row in self._states()]
+        self.assertEqual(stored, expected)
+
+        self.connection.execute("UPDATE transmissions SET command_sequence = NULL")
+        self.connection.execute("UPDATE settings SET value = '5' WHERE key = 'schema_version'")
+        self.connection.commit()
+        with self.app.app_context():
+            migrate_database()
+        self.assertEqual([row[0] for row in self._states()], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
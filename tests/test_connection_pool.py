@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from ground_software import create_app
+from ground_software.database import get_database, init_database, migrate_database
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="connection_pool_", suffix=".db")
+        os.close(fd)
+
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            init_database()
+            migrate_database()
+
+    def tearDown(self):
+        self.app.extensions["database_pool"].close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def test_requests_reuse_pooled_connections(self):
+        pool = self.app.extensions["database_pool"]
+        opened_before = pool.opened
+
+        for _ in range(5):
+            self.assertEqual(self.client.get("/latest_responses").status_code, 200)
+            self.assertEqual(self.client.get("/radio/rssi").status_code, 200)
+
+        self.assertEqual(pool.opened - opened_before, 1)
+
+    def test_connections_share_pragma_profile_and_read_only_mode(self):
+        with self.app.app_context():
+            database = get_database()
+            read_only = get_database(read_only=True)
+
+            self.assertEqual(database.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(database.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(read_only.execute("PRAGMA query_only").fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                read_only.execute("DELETE FROM responses")
+
+    def test_pool_size_zero_closes_connections(self):
+        app = create_app(
+            {
+                "TESTING": True,
+                "DATABASE": self.db_path,
+                "SECRET_KEY": "test",
+                "DATABASE_POOL_SIZE": 0,
+            }
+        )
+        client = app.test_client()
+        pool = app.extensions["database_pool"]
+        opened_before = pool.opened
+
+        client.get("/latest_responses")
+        client.get("/latest_responses")
+
+        self.assertEqual(pool.opened - opened_before, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,15 @@ import tempfile
 import unittest
 
 from ground_software import create_app
-from ground_software.database import get_database, migrate_database
+from ground_software.database import (
+    classify_response,
+    get_database,
+    migrate_database,
+    parse_rssi_dbm,
+    transmission_priority,
+)
+
+SIGNATURE = b"0" * 88
 
 
 class DatabaseMigrationTests(unittest.TestCase):
@@ -143,6 +151,199 @@ class DatabaseMigrationTests(unittest.TestCase):
             self.assertEqual(rows[1]["message_sequence"], 101)
             self.assertEqual(rows[1]["rssi_dbm"], -102.0)
 
+    def test_migrate_backfills_rssi_column_and_queries_use_index(self):
+        self._build_legacy_database()
+        connection = sqlite3.connect(self.db_path)
+        connection.executescript(
+            """
+            CREATE TABLE radio_logs(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                message_sequence INTEGER,
+                log_line TEXT NOT NULL
+            );
+            INSERT INTO radio_logs(timestamp, log_line) VALUES ('2026-02-15 12:00:00', 'N: RSSI: -88.5dBm');
+            INSERT INTO radio_logs(timestamp, log_line) VALUES ('2026-02-15 12:00:01', 'boot complete');
+            INSERT INTO settings(key, value) VALUES ('schema_version', '2');
+            """
+        )
+        connection.commit()
+        connection.close()
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+
+            rows = database.execute(
+                "SELECT log_line, rssi_dbm FROM radio_logs ORDER BY id"
+            ).fetchall()
+            self.assertEqual([row["rssi_dbm"] for row in rows], [-88.5, None])
+
+            plan = " ".join(
+                row["detail"]
+                for row in database.execute(
+                    "EXPLAIN QUERY PLAN SELECT timestamp, message_sequence, rssi_dbm "
+                    "FROM radio_logs WHERE rssi_dbm IS NOT NULL AND timestamp >= ? "
+                    "ORDER BY timestamp ASC, message_sequence ASC",
+                    ("2026-02-15 11:00:00",),
+                ).fetchall()
+            )
+            self.assertIn("idx_radio_logs_rssi", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_python_rssi_parser_matches_insert_trigger(self):
+        self._build_legacy_database()
+        lines = [
+            "N: rssi -97 dBm, snr 7",
+            "N: rssi=-102 dBm",
+            "12:00:01 n: RSSI: -75.25",
+            "N: rssi unknown dBm",
+            "N: rssi 1e1dbm",
+            "unrelated line",
+        ]
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+            database.executemany(
+                "INSERT INTO radio_logs (message_sequence, log_line) VALUES (?, ?)",
+                [(200 + index, line) for index, line in enumerate(lines)],
+            )
+            database.commit()
+            stored = [
+                row["rssi_dbm"]
+                for row in database.execute(
+                    "SELECT rssi_dbm FROM radio_logs ORDER BY message_sequence"
+                ).fetchall()
+            ]
+
+        self.assertEqual(stored, [parse_rssi_dbm(line) for line in lines])
+
+    def test_migrate_classifies_legacy_responses(self):
+        self._build_legacy_database()
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+            rows = database.execute(
+                "SELECT text, kind FROM responses ORDER BY message_sequence"
+            ).fetchall()
+
+            self.assertEqual([tuple(row) for row in rows], [("ACK 1", "ACK"), ("RES OK", "RES OK")])
+
+            plan = " ".join(
+                row["detail"]
+                for row in database.execute(
+                    "EXPLAIN QUERY PLAN SELECT * FROM responses "
+                    "WHERE message_sequence > ? AND kind NOT IN ('ACK D', 'RES D') "
+                    "ORDER BY message_sequence DESC LIMIT 25",
+                    (0,),
+                ).fetchall()
+            )
+            self.assertIn("idx_responses_visible", plan)
+
+    def test_python_response_classifier_matches_insert_trigger(self):
+        self._build_legacy_database()
+        frames = [
+            b"\xC0\xAAACK 00000042\xC0",
+            b"\xC0\xAANACK 00000043\xC0",
+            b"\xC0\xAARES GTY AX 0.1 AY 0.2\xC0",
+            b"\xC0\xAARES ERR\xC0",
+            b"\xC0\x00ACK D\xC0",
+            b"\xC0\x00RES D 435000000 435001000\xC0",
+            b"\xC0\x00RES 9 Freq A:435000000\xC0",
+            b"\xC0\x00NACK\xC0",
+            b"\xC0\xAAbeacon text\xC0",
+        ]
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+            database.executemany(
+                "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
+                [(300 + index, frame) for index, frame in enumerate(frames)],
+            )
+            database.commit()
+            stored = [
+                (row["text"], row["kind"])
+                for row in database.execute(
+                    "SELECT text, kind FROM responses WHERE message_sequence >= 300 "
+                    "ORDER BY message_sequence"
+                ).fetchall()
+            ]
+
+        self.assertEqual(stored, [classify_response(frame) for frame in frames])
+        self.assertEqual(
+            [kind for _, kind in stored],
+            ["ACK", "NACK", "RES GTY", "RES ERR", "ACK D", "RES D", "RES 9", "NACK", ""],
+        )
+
+
+    def test_python_priority_classifier_matches_insert_trigger(self):
+        self._build_legacy_database()
+        frames = [
+            b"\xC0\x0D433000000 433001000\xC0",
+            b"\xC0\x0E\xC0",
+            b"\xC0\xAA" + SIGNATURE + b"SetClock 2026 10 17 12 00 00\xC0",
+            b"\xC0\xAA" + SIGNATURE + b"PicTimes 2026 10 17 12 01 00\xC0",
+            b"\xC0\xAA" + SIGNATURE + b"SSDVTimes 2026 10 17 12 01 00\xC0",
+            b"\xC0\xAA" + SIGNATURE + b"NoOperate\xC0",
+            b"\xC0\xAA" + SIGNATURE + b"SetClockX\xC0",
+            b"\xC0\xAAshort\xC0",
+        ]
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+            database.executemany(
+                "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+                [(300 + index, frame) for index, frame in enumerate(frames)],
+            )
+            database.commit()
+            rows = database.execute(
+                "SELECT priority, enqueued_at FROM transmissions WHERE message_sequence >= 300 "
+                "ORDER BY message_sequence"
+            ).fetchall()
+
+        self.assertEqual(
+            [row["priority"] for row in rows], [transmission_priority(frame) for frame in frames]
+        )
+        self.assertEqual([row["priority"] for row in rows], [0, 0, 1, 1, 1, 2, 2, 2])
+        self.assertTrue(all(row["enqueued_at"] > 1.7e9 for row in rows))
+
+    def test_migrate_backfills_priority_and_claims_use_queue_index(self):
+        self._build_legacy_database()
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            migrate_database()
+            database = get_database()
+            rows = database.execute(
+                "SELECT priority, enqueued_at FROM transmissions ORDER BY message_sequence"
+            ).fetchall()
+            self.assertEqual([row["priority"] for row in rows], [2, 2])
+            self.assertTrue(all(row["enqueued_at"] is not None for row in rows))
+
+            plan = " ".join(
+                row["detail"]
+                for row in database.execute(
+                    "EXPLAIN QUERY PLAN SELECT id FROM transmissions WHERE status = 'pending' "
+                    "ORDER BY priority ASC, message_sequence ASC LIMIT 16"
+                ).fetchall()
+            )
+            self.assertIn("idx_transmissions_queue", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+            indexes = [
+                row["name"]
+                for row in database.execute("PRAGMA index_list(transmissions)").fetchall()
+            ]
+            self.assertNotIn("idx_transmissions_pending", indexes)
+
 
 if __name__ == "__main__":
     unittest.main()
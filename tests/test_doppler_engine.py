@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+    from ground_software.doppler_engine import (
+        GroundStation,
+        compute_schedule,
+        load_tle,
+        play_schedule,
+    )
+except ImportError:  # numpy and sgp4 are optional dependencies
+    compute_schedule = None
+
+from ground_software.gpredict_interface import DopplerPolicy
+
+ISS_TLE = """ISS (ZARYA)
+1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005
+2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579432000
+"""
+OTHER_TLE = """0 OTHER
+1 00005U 58002B   24001.50000000  .00000000  00000-0  00000-0 0  9990
+2 00005  34.2500 100.0000 1850000 200.0000 150.0000 10.85000000000000
+"""
+START = datetime(2024, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+
+
+class _RecordingWriter:
+    def __init__(self):
+        self.writes = []
+
+    def write(self, transmit, receive):
+        self.writes.append((transmit, receive))
+
+
+@unittest.skipIf(compute_schedule is None, "numpy or sgp4 is not installed")
+class DopplerEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="doppler_engine_")
+        self.tle_path = os.path.join(self.directory, "silversat.tle")
+        with open(self.tle_path, "w") as tle_file:
+            tle_file.write(OTHER_TLE + ISS_TLE)
+        self.station = GroundStation(38.89, -77.03, 10)
+        self.line1, self.line2 = load_tle(self.tle_path, "ISS (ZARYA)")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_load_tle_selects_by_name(self):
+        self.assertTrue(self.line1.startswith("1 25544U"))
+        self.assertTrue(load_tle(self.tle_path, "missing")[0].startswith("1 00005U"))
+        with open(self.tle_path, "w") as tle_file:
+            tle_file.write("no elements\n")
+        with self.assertRaises(ValueError):
+            load_tle(self.tle_path)
+
+    def test_range_rate_matches_range_and_frequencies_are_shifted(self):
+        schedule = compute_schedule(self.line1, self.line2, self.station, START, 6 * 3600)
+
+        self.assertEqual(len(schedule), 6 * 3600 * 2 + 1)
+        derivative = np.gradient(schedule.range_km, schedule.times)
+        self.assertLess(np.max(np.abs(derivative - schedule.range_rate)[1:-1]), 1e-3)
+
+        visible = schedule.elevation > 0
+        self.assertTrue(visible.any())
+        shift = schedule.receive - 433000000
+        # LEO Doppler at 433 MHz stays within about 10 kHz.
+        self.assertLess(np.max(np.abs(shift)), 11000)
+        # Approaching raises the received frequency; the uplink is lowered to match.
+        approaching = schedule.range_rate < -1
+        self.assertTrue((shift[approaching] > 0).all())
+        self.assertTrue((schedule.transmit[approaching] < 433000000).all())
+
+    def test_frames_match_database_write_format(self):
+        schedule = compute_schedule(self.line1, self.line2, self.station, START, 2, step=1)
+
+        frames = schedule.frames()
+        self.assertEqual(len(frames), 3)
+        transmit, receive = schedule.frequencies(0)
+        self.assertEqual(frames[0], b"\xC0\x0D" + transmit + b" " + receive + b"\xC0")
+
+    def test_play_writes_visible_steps_through_policy(self):
+        schedule = compute_schedule(self.line1, self.line2, self.station, START, 6 * 3600)
+        first_visible = int(np.argmax(schedule.elevation > 0))
+        now = [schedule.times[first_visible]]
+        writer = _RecordingWriter()
+        shutdown_event = threading.Event()
+        policy = DopplerPolicy(min_delta_hz=0, min_interval=0, clock=lambda: now[0])
+
+        def wait(delay):
+            now[0] += delay
+            return False
+
+        shutdown_event.wait = wait
+        written = play_schedule(
+            schedule, writer, policy, shutdown_event, min_elevation=0, clock=lambda: now[0]
+        )
+
+        visible = np.count_nonzero(schedule.elevation[first_visible:] >= 0)
+        self.assertEqual(written, visible)
+        self.assertEqual(writer.writes[0], schedule.frequencies(first_visible))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,475 @@
+import asyncio
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ground_software import create_app
+from ground_software import gpredict_interface
+from ground_software.database import init_database, migrate_database
+from ground_software.gpredict_interface import (
+    DUMP_STATE,
+    DopplerPolicy,
+    DopplerWriter,
+    RigctlServer,
+    RigctlSession,
+    RigState,
+)
+
+
+class _FakeGpredictSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, message):
+        self.sent.append(message)
+
+
+class _DopplerDatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="doppler_writer_")
+        self.db_path = os.path.join(self.directory, "radio.db")
+        self.notify_path = os.path.join(self.directory, "notify")
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            init_database()
+            migrate_database()
+        app.extensions["database_pool"].close()
+
+        self.notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.notify_socket.bind(self.notify_path)
+        self.notify_socket.settimeout(1)
+        self.writer = DopplerWriter(self.db_path, self.notify_path)
+
+    def tearDown(self):
+        self.writer.close()
+        self.notify_socket.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _transmissions(self):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(
+                "SELECT message_sequence, command FROM transmissions ORDER BY message_sequence"
+            ).fetchall()
+        finally:
+            connection.close()
+
+    def _mark_transmitted(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("UPDATE transmissions SET status = 'transmitted'")
+        connection.commit()
+        connection.close()
+
+
+class DopplerWriterTests(_DopplerDatabaseTestCase):
+    def test_updates_reuse_one_connection_and_notify_socket(self):
+        first_latency = self.writer.write(b"433000000", b"433001000")
+        connection = self.writer._connection
+        sender = self.writer.notifier._socket
+        self._mark_transmitted()
+        second_latency = self.writer.write(b"433000100", b"433001100")
+
+        self.assertIs(self.writer._connection, connection)
+        self.assertIs(self.writer.notifier._socket, sender)
+        self.assertGreater(first_latency, 0)
+        self.assertGreater(second_latency, 0)
+        self.assertEqual(self.notify_socket.recv(16), b"\x00")
+        self.assertEqual(self.notify_socket.recv(16), b"\x00")
+
+        rows = self._transmissions()
+        self.assertEqual(
+            [command for _, command in rows],
+            [
+                b"\xC0\x0D433000000 433001000\xC0",
+                b"\xC0\x0D433000100 433001100\xC0",
+            ],
+        )
+        self.assertEqual(rows[1][0], rows[0][0] + 1)
+        stats = self.writer.stats()
+        self.assertEqual((stats["writes"], stats["failures"]), (2, 0))
+        self.assertLessEqual(stats["p50_seconds"], stats["max_seconds"])
+
+    def test_process_command_writes_through_session_writer(self):
+        gpredict_socket = _FakeGpredictSocket()
+        with patch.object(gpredict_interface, "doppler_writer", self.writer):
+            transmit, receive = gpredict_interface.process_command(
+                b"F", b"433002000", gpredict_socket, b"433000000", b"433000000"
+            )
+            transmit, receive = gpredict_interface.process_command(
+                b"I", b"433003000", gpredict_socket, transmit, receive
+            )
+
+        self.assertEqual((transmit, receive), (b"433003000", b"433002000"))
+        self.assertEqual(gpredict_socket.sent, [b"RPRT 0\n", b"RPRT 0\n"])
+        self.assertEqual(
+            [command for _, command in self._transmissions()],
+            [b"\xC0\x0D433003000 433002000\xC0"],
+        )
+
+    def test_flooded_updates_leave_one_pending_doppler_frame(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+            (1000, b"\xC0\xAAsigned NoOperate\xC0"),
+        )
+        connection.commit()
+        connection.close()
+        gpredict_socket = _FakeGpredictSocket()
+        transmit = receive = b"433000000"
+
+        with patch.object(gpredict_interface, "doppler_writer", self.writer):
+            for step in range(200):
+                frequency = str(433000000 + step * 10).encode("ascii")
+                command = b"F" if step % 2 == 0 else b"I"
+                transmit, receive = gpredict_interface.process_command(
+                    command, frequency, gpredict_socket, transmit, receive
+                )
+
+        rows = self._transmissions()
+        doppler = [command for _, command in rows if command[1:2] == b"\x0D"]
+        self.assertEqual(doppler, [b"\xC0\x0D433001990 433001980\xC0"])
+        self.assertIn((1000, b"\xC0\xAAsigned NoOperate\xC0"), rows)
+        stats = self.writer.stats()
+        self.assertEqual((stats["writes"], stats["inserted"], stats["coalesced"]), (200, 1, 199))
+        self.assertEqual(len(gpredict_socket.sent), 200)
+
+        # Once serial_write has taken the frame, the next update queues a new one.
+        self._mark_transmitted()
+        self.writer.write(b"433002000", b"433002000")
+        self.assertEqual(self.writer.stats()["inserted"], 2)
+
+    def test_older_pending_doppler_frames_are_superseded(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.executemany(
+            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+            [(500 + index, b"\xC0\x0D433000000 433000000\xC0") for index in range(3)],
+        )
+        connection.commit()
+        connection.close()
+
+        statements = []
+        self.writer._connect().set_trace_callback(statements.append)
+        self.writer.write(b"433005000", b"433006000")
+
+        self.assertEqual(
+            self._transmissions(), [(500, b"\xC0\x0D433005000 433006000\xC0")]
+        )
+        self.assertEqual(self.writer.stats()["superseded"], 2)
+        # SQLite before 3.35 has no RETURNING.
+        self.assertFalse([statement for statement in statements if "RETURNING" in statement])
+
+    def test_failed_update_is_counted_and_reconnects(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("BEGIN EXCLUSIVE")
+        try:
+            writer = DopplerWriter(self.db_path, self.notify_path, busy_timeout_ms=10)
+            self.assertIsNone(writer.write(b"433000000", b"433000000"))
+        finally:
+            connection.rollback()
+            connection.close()
+
+        self.assertEqual(writer.stats()["failures"], 1)
+        self.assertIsNone(writer._connection)
+        self.assertIsNotNone(writer.write(b"433000000", b"433000000"))
+        writer.close()
+
+
+class DopplerPolicyTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.policy = DopplerPolicy(
+            min_delta_hz=100, min_interval=1.0, max_staleness=10.0, clock=lambda: self.now
+        )
+
+    def test_deadband_and_minimum_interval(self):
+        self.assertTrue(self.policy.should_send(b"433000000", b"433000000"))
+        self.now = 0.5
+        self.assertFalse(self.policy.should_send(b"433000500", b"433000000"))
+        self.now = 2.0
+        self.assertFalse(self.policy.should_send(b"433000050", b"433000020"))
+        self.assertTrue(self.policy.should_send(b"433000050", b"433000120"))
+
+        stats = self.policy.stats()
+        self.assertEqual((stats["sent"], stats["suppressed"]), (2, 2))
+        self.assertEqual(stats["max_error_hz"], 500)
+        self.assertEqual(stats["mean_error_hz"], 275)
+
+    def test_stale_change_is_forced_out(self):
+        self.policy.should_send(b"433000000", b"433000000")
+        self.now = 9.0
+        self.assertFalse(self.policy.should_send(b"433000010", b"433000000"))
+        self.now = 10.0
+        self.assertTrue(self.policy.should_send(b"433000010", b"433000000"))
+        self.now = 30.0
+        self.assertFalse(self.policy.should_send(b"433000010", b"433000000"))
+        self.assertEqual(self.policy.stats()["max_error_hz"], 10)
+
+    def test_due_in_matches_should_send(self):
+        self.assertEqual(self.policy.due_in(b"433000000", b"433000000"), 0)
+        self.policy.should_send(b"433000000", b"433000000")
+        self.now = 0.25
+        self.assertEqual(self.policy.due_in(b"433000500", b"433000000"), 0.75)
+        self.assertEqual(self.policy.due_in(b"433000010", b"433000000"), 9.75)
+        self.assertIsNone(self.policy.due_in(b"433000000", b"433000000"))
+        self.now = 1.0
+        self.assertEqual(self.policy.due_in(b"433000500", b"433000000"), 0)
+        self.assertTrue(self.policy.should_send(b"433000500", b"433000000"))
+
+
+class RigctlSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.writes = []
+        patcher = patch.object(
+            gpredict_interface,
+            "database_write",
+            lambda transmit, receive: self.writes.append((transmit, receive)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session = RigctlSession(RigState(b"433000000", b"433000000"))
+
+    def test_pipelined_commands_each_get_a_reply(self):
+        replies = self.session.feed(b"F 433001000\nI 433002000\nf\ni\n")
+
+        self.assertEqual(replies, b"RPRT 0\nRPRT 0\n433001000\n433002000\n")
+        self.assertEqual(
+            self.writes,
+            [(b"433000000", b"433001000"), (b"433002000", b"433001000")],
+        )
+        self.assertEqual(self.session.commands, 4)
+
+    def test_command_split_across_reads_is_reassembled(self):
+        self.assertEqual(self.session.feed(b"F 4330"), b"")
+        self.assertEqual(self.session.feed(b"05000.000000\r\nf"), b"RPRT 0\n")
+        self.assertEqual(self.session.feed(b"\n"), b"433005000\n")
+
+    def test_long_names_and_radio_state_commands(self):
+        replies = self.session.feed(
+            b"\\set_freq 433003000\n\\get_freq\n"
+            b"\\set_split_vfo 1 VFOB\n\\get_split_vfo\n"
+            b"M USB 2400\nm\nV VFOA\nv\nT 1\nt\n\\chk_vfo\nAOS\n"
+        )
+
+        self.assertEqual(
+            replies,
+            b"RPRT 0\n433003000\n"
+            b"RPRT 0\n1\nVFOB\n"
+            b"RPRT 0\nUSB\n2400\nRPRT 0\nVFOA\nRPRT 0\n1\n0\nRPRT 0\n",
+        )
+
+    def test_dump_state_invalid_input_and_quit(self):
+        self.assertEqual(self.session.feed(b"\\dump_state\n"), DUMP_STATE)
+        self.assertEqual(self.session.feed(b"F abc\nX\n"), b"RPRT 1\nRPRT 1\n")
+        self.assertEqual(self.session.feed(b"q\nF 433009000\n"), b"")
+        self.assertTrue(self.session.closed)
+        self.assertEqual(self.writes, [])
+
+    def test_runaway_line_is_discarded(self):
+        self.assertEqual(self.session.feed(b"F" * 2000), b"RPRT 1\n")
+        self.assertEqual(self.session.feed(b"f\n"), b"433000000\n")
+
+
+class RigctlServerTests(_DopplerDatabaseTestCase):
+    async def _request(self, reader, writer, line, reply_lines=1):
+        writer.write(line)
+        await writer.drain()
+        return b"".join([await reader.readline() for _ in range(reply_lines)])
+
+    def test_clients_share_state_and_one_write_path(self):
+        async def scenario():
+            policy = DopplerPolicy(min_delta_hz=0, min_interval=0)
+            server = RigctlServer(self.writer, port=0, policy=policy)
+            await server.start()
+            try:
+                gpredict = await asyncio.open_connection("127.0.0.1", server.port)
+                monitor = await asyncio.open_connection("127.0.0.1", server.port)
+
+                reply = await self._request(*gpredict, b"F 433001000\nI 433002000\n", 2)
+                self.assertEqual(reply, b"RPRT 0\nRPRT 0\n")
+                self.assertEqual(
+                    await self._request(*monitor, b"f\ni\n", 2), b"433001000\n433002000\n"
+                )
+                self.assertEqual(server.clients, 2)
+
+                for step in range(100):
+                    frequency = 433003000 + step
+                    await self._request(*gpredict, f"F {frequency}\n".encode("ascii"))
+                    await self._request(*monitor, f"I {frequency}\n".encode("ascii"))
+
+                for _, writer in (gpredict, monitor):
+                    writer.close()
+            finally:
+                await server.stop()
+            return server
+
+        server = asyncio.run(scenario())
+
+        self.assertEqual(server.connections, 2)
+        self.assertEqual(server.updates, 202)
+        self.assertEqual(server.updates, server.superseded + self.writer.writes)
+        doppler = [command for _, command in self._transmissions()]
+        self.assertEqual(doppler, [b"\xC0\x0D433003099 433003099\xC0"])
+
+    def test_policy_keeps_small_changes_out_of_transmissions(self):
+        async def scenario():
+            server = RigctlServer(self.writer, port=0, policy=DopplerPolicy(min_delta_hz=100))
+            await server.start()
+            try:
+                gpredict = await asyncio.open_connection("127.0.0.1", server.port)
+                for step in range(50):
+                    reply = await self._request(
+                        *gpredict, f"F {433000000 + step}\n".encode("ascii")
+                    )
+                    self.assertEqual(reply, b"RPRT 0\n")
+                    if not step:
+                        await asyncio.sleep(0.1)
+                self.assertEqual(await self._request(*gpredict, b"f\n"), b"433000049\n")
+                gpredict[1].close()
+            finally:
+                await server.stop()
+            return server
+
+        server = asyncio.run(scenario())
+
+        self.assertEqual(server.updates, 50)
+        self.assertEqual(server.policy.stats()["sent"], 1)
+        self.assertEqual(self.writer.writes, 1)
+        self.assertEqual(
+            [command for _, command in self._transmissions()],
+            [b"\xC0\x0D433000000 433000000\xC0"],
+        )
+
+    def _recording_writes(self):
+        written = []
+        write = self.writer.write
+
+        def recording_write(transmit_frequency, receive_frequency):
+            written.append((transmit_frequency, receive_frequency))
+            return write(transmit_frequency, receive_frequency)
+
+        return written, patch.object(self.writer, "write", recording_write)
+
+    def test_split_frequency_pair_is_sent_together(self):
+        written, recording = self._recording_writes()
+
+        async def scenario():
+            policy = DopplerPolicy(min_delta_hz=100, min_interval=0.2)
+            server = RigctlServer(self.writer, port=0, policy=policy)
+            await server.start()
+            try:
+                gpredict = await asyncio.open_connection("127.0.0.1", server.port)
+                for step in range(3):
+                    # gpredict sets the downlink, then the uplink shortly after.
+                    await self._request(*gpredict, f"F {433001000 + step * 1000}\n".encode())
+                    await asyncio.sleep(0.005)
+                    await self._request(*gpredict, f"I {433002000 - step * 1000}\n".encode())
+                    await asyncio.sleep(0.3)
+                gpredict[1].close()
+            finally:
+                await server.stop()
+            return server
+
+        with recording:
+            server = asyncio.run(scenario())
+
+        self.assertEqual(
+            written,
+            [
+                (b"433002000", b"433001000"),
+                (b"433001000", b"433002000"),
+                (b"433000000", b"433003000"),
+            ],
+        )
+        self.assertEqual(server.policy.stats()["suppressed"], 0)
+
+    def test_held_update_is_sent_when_due_without_new_traffic(self):
+        written, recording = self._recording_writes()
+
+        async def scenario():
+            policy = DopplerPolicy(min_delta_hz=100, min_interval=0.2, max_staleness=0.6)
+            server = RigctlServer(self.writer, port=0, policy=policy)
+            await server.start()
+            try:
+                gpredict = await asyncio.open_connection("127.0.0.1", server.port)
+                await self._request(*gpredict, b"F 433000000\n")
+                await asyncio.sleep(0.1)
+                # Above the deadband but inside min_interval: held, then sent.
+                await self._request(*gpredict, b"F 433000500\n")
+                await asyncio.sleep(0.25)
+                self.assertEqual(len(written), 2)
+                # Inside the deadband: sent once max_staleness runs out.
+                await self._request(*gpredict, b"F 433000510\n")
+                await asyncio.sleep(0.3)
+                self.assertEqual(len(written), 2)
+                await asyncio.sleep(0.5)
+                gpredict[1].close()
+            finally:
+                await server.stop()
+
+        with recording:
+            asyncio.run(scenario())
+
+        self.assertEqual(
+            [receive for _, receive in written], [b"433000000", b"433000500", b"433000510"]
+        )
+
+    def test_write_loop_survives_a_failed_update(self):
+        failures = []
+        write = self.writer.write
+
+        def failing_write(transmit_frequency, receive_frequency):
+            if not failures:
+                failures.append(transmit_frequency)
+                raise RuntimeError("radio unplugged")
+            return write(transmit_frequency, receive_frequency)
+
+        async def scenario():
+            policy = DopplerPolicy(min_delta_hz=0, min_interval=0)
+            server = RigctlServer(self.writer, port=0, policy=policy)
+            await server.start()
+            try:
+                gpredict = await asyncio.open_connection("127.0.0.1", server.port)
+                with self.assertLogs(level="ERROR"):
+                    await self._request(*gpredict, b"F 433001000\n")
+                    await asyncio.sleep(0.1)
+                self.assertFalse(server._write_task.done())
+                await self._request(*gpredict, b"F 433002000\n")
+                await asyncio.sleep(0.1)
+                gpredict[1].close()
+            finally:
+                await server.stop()
+
+        with patch.object(self.writer, "write", failing_write):
+            asyncio.run(scenario())
+
+        self.assertEqual(failures, [b"433000000"])
+        self.assertEqual(
+            [command for _, command in self._transmissions()],
+            [b"\xC0\x0D433000000 433002000\xC0"],
+        )
+
+    def test_quit_closes_only_that_client(self):
+        async def scenario():
+            server = RigctlServer(self.writer, port=0)
+            await server.start()
+            try:
+                first = await asyncio.open_connection("127.0.0.1", server.port)
+                second = await asyncio.open_connection("127.0.0.1", server.port)
+                first[1].write(b"q\n")
+                await first[1].drain()
+                self.assertEqual(await first[0].read(), b"")
+                self.assertEqual(await self._request(*second, b"t\n"), b"0\n")
+                second[1].close()
+            finally:
+                await server.stop()
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
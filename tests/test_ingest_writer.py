@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from ground_software import create_app
+from ground_software.database import advance_sequence, init_database, migrate_database
+from ground_software import ingest_writer
+from ground_software.ingest_writer import IngestWriter
+
+
+class IngestWriterTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="ingest_writer_", suffix=".db")
+        os.close(fd)
+
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            init_database()
+            migrate_database()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _fetch(self, query):
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(query).fetchall()
+        finally:
+            connection.close()
+
+    def test_shutdown_event_flushes_every_pending_row_in_batches(self):
+        shutdown_event = threading.Event()
+        batches = []
+        writer = IngestWriter(
+            self.db_path,
+            shutdown_event,
+            batch_size=50,
+            flush_interval=10,
+            on_batch=lambda rows, seconds: batches.append((rows, seconds)),
+        )
+        for index in range(120):
+            writer.submit_log_line(f"log line {index}")
+        writer.submit_response(b"\xC0\xAARES OK\xC0")
+
+        writer.start()
+        shutdown_event.set()
+        writer.close()
+
+        self.assertEqual([rows for rows, _ in batches], [50, 50, 21])
+        self.assertTrue(all(seconds >= 0 for _, seconds in batches))
+        self.assertEqual(writer.stats()["rows"], 121)
+
+        log_rows = self._fetch(
+            "SELECT log_line FROM radio_logs ORDER BY message_sequence"
+        )
+        self.assertEqual([row[0] for row in log_rows], [f"log line {i}" for i in range(120)])
+        response_sequence = self._fetch("SELECT message_sequence FROM responses")[0][0]
+        last_log_sequence = self._fetch("SELECT MAX(message_sequence) FROM radio_logs")[0][0]
+        self.assertGreater(response_sequence, last_log_sequence)
+
+    def test_partial_batch_is_flushed_after_flush_interval(self):
+        writer = IngestWriter(self.db_path, batch_size=50, flush_interval=0.02).start()
+        try:
+            writer.submit_response(b"\xC0\xAAACK 1\xC0")
+            writer.submit_response(b"\xC0\xAARES OK\xC0")
+
+            deadline = time.time() + 2.0
+            while time.time() < deadline and writer.stats()["rows"] < 2:
+                time.sleep(0.01)
+
+            self.assertEqual(writer.stats()["recent_batches"][0][0], 2)
+            self.assertEqual(self._fetch("SELECT COUNT(*) FROM responses")[0][0], 2)
+        finally:
+            writer.close()
+
+    def test_sequences_follow_commit_order_across_writers(self):
+        writer = IngestWriter(self.db_path, flush_interval=0.01).start()
+        other = sqlite3.connect(self.db_path, isolation_level=None)
+
+        def stored(count):
+            deadline = time.time() + 2.0
+            while time.time() < deadline and writer.stats()["rows"] < count:
+                time.sleep(0.005)
+
+        try:
+            writer.submit_log_line("N: rssi -90 dBm")
+            stored(1)
+            # A command queued by another process between two batches.
+            other.execute("BEGIN IMMEDIATE")
+            command_sequence = advance_sequence(other, "message_sequence", 1)
+            other.execute("COMMIT")
+            writer.submit_response(b"\xC0\xAAACK 00000001\xC0")
+            stored(2)
+        finally:
+            other.close()
+            writer.close()
+
+        log_sequence = self._fetch("SELECT message_sequence FROM radio_logs")[0][0]
+        response_sequence = self._fetch("SELECT message_sequence FROM responses")[0][0]
+        self.assertLess(log_sequence, command_sequence)
+        self.assertLess(command_sequence, response_sequence)
+
+    def test_locked_database_spills_to_spool_and_replays_in_order(self):
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+
+        blocker = sqlite3.connect(self.db_path, isolation_level=None)
+        blocker.execute("BEGIN EXCLUSIVE")
+        original_retry_interval = ingest_writer.SPOOL_RETRY_INTERVAL
+        ingest_writer.SPOOL_RETRY_INTERVAL = 0.05
+        writer = IngestWriter(
+            self.db_path, batch_size=5, flush_interval=0.01, spool_path=spool_path
+        ).start()
+        try:
+            for index in range(12):
+                writer.submit_log_line(f"held line {index}")
+
+            deadline = time.time() + 5.0
+            while time.time() < deadline and writer.stats()["spool_rows"] < 12:
+                time.sleep(0.01)
+            stats = writer.stats()
+            self.assertEqual(stats["spool_rows"], 12)
+            self.assertGreater(stats["spool_bytes"], 0)
+            self.assertGreaterEqual(stats["queue_high_water"], 1)
+
+            blocker.rollback()
+            deadline = time.time() + 5.0
+            while time.time() < deadline and writer.stats()["spool_rows"]:
+                time.sleep(0.01)
+        finally:
+            blocker.close()
+            writer.close()
+            ingest_writer.SPOOL_RETRY_INTERVAL = original_retry_interval
+
+        self.assertEqual(writer.stats()["replayed_rows"], 12)
+        self.assertFalse(os.path.exists(spool_path))
+        log_rows = self._fetch("SELECT log_line FROM radio_logs ORDER BY message_sequence")
+        self.assertEqual([row[0] for row in log_rows], [f"held line {i}" for i in range(12)])
+
+    def test_full_queue_spills_without_blocking_and_spool_survives_restart(self):
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+
+        writer = IngestWriter(self.db_path, queue_size=2, spool_path=spool_path)
+        for index in range(5):
+            writer.submit_response(f"\xC0\xAARES {index}\xC0".encode("latin-1"))
+        self.assertEqual(writer.stats()["queue_high_water"], 2)
+
+        # Nothing can be committed, so every row goes to the spool in order.
+        blocker = sqlite3.connect(self.db_path, isolation_level=None)
+        blocker.execute("BEGIN EXCLUSIVE")
+        try:
+            writer.close()
+        finally:
+            blocker.rollback()
+            blocker.close()
+        self.assertEqual(writer.stats()["spool_rows"], 5)
+
+        restarted = IngestWriter(self.db_path, spool_path=spool_path)
+        self.assertEqual(restarted.stats()["spool_rows"], 5)
+        restarted.start()
+        restarted.close()
+
+        rows = self._fetch("SELECT response FROM responses ORDER BY message_sequence")
+        self.assertEqual(
+            [row[0] for row in rows],
+            [f"\xC0\xAARES {index}\xC0".encode("latin-1") for index in range(5)],
+        )
+
+    def test_overflow_is_stored_after_rows_queued_before_it(self):
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+        original_retry_interval = ingest_writer.SPOOL_RETRY_INTERVAL
+        ingest_writer.SPOOL_RETRY_INTERVAL = 0.05
+        self.addCleanup(setattr, ingest_writer, "SPOOL_RETRY_INTERVAL", original_retry_interval)
+
+        writer = IngestWriter(
+            self.db_path, batch_size=3, flush_interval=0.01, queue_size=4, spool_path=spool_path
+        )
+        for index in range(10):
+            writer.submit_log_line(f"line {index}")
+        writer.start()
+        for index in range(10, 15):
+            writer.submit_log_line(f"line {index}")
+        writer.close()
+
+        self.assertGreaterEqual(writer.stats()["spilled_rows"], 6)
+        log_rows = self._fetch("SELECT log_line FROM radio_logs ORDER BY message_sequence")
+        self.assertEqual([row[0] for row in log_rows], [f"line {i}" for i in range(15)])
+
+    def test_overflow_past_its_limit_is_spooled_by_submit(self):
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+
+        writer = IngestWriter(
+            self.db_path, queue_size=2, overflow_limit=3, spool_path=spool_path
+        )
+        for index in range(10):
+            writer.submit_log_line(f"line {index}")
+        stats = writer.stats()
+        self.assertEqual((stats["queued"], stats["spool_rows"]), (0, 10))
+
+        writer.start()
+        writer.close()
+        log_rows = self._fetch("SELECT log_line FROM radio_logs ORDER BY message_sequence")
+        self.assertEqual([row[0] for row in log_rows], [f"line {i}" for i in range(10)])
+
+    def test_failing_batch_is_rolled_back_spooled_and_replayed(self):
+        spool_path = self.db_path + ".spool"
+        self.addCleanup(lambda: os.path.exists(spool_path) and os.unlink(spool_path))
+        original_retry_interval = ingest_writer.SPOOL_RETRY_INTERVAL
+        ingest_writer.SPOOL_RETRY_INTERVAL = 0.05
+        self.addCleanup(setattr, ingest_writer, "SPOOL_RETRY_INTERVAL", original_retry_interval)
+        failures = []
+        derive = ingest_writer.DERIVED_COLUMNS["radio_logs"]
+
+        def flaky_derive(log_line):
+            if not failures:
+                failures.append(log_line)
+                raise KeyError(log_line)
+            return derive(log_line)
+
+        def failing_callback(rows, seconds):
+            raise RuntimeError("callback failed")
+
+        writer = IngestWriter(
+            self.db_path,
+            batch_size=2,
+            flush_interval=0.01,
+            spool_path=spool_path,
+            on_batch=failing_callback,
+        )
+        with patch.dict(ingest_writer.DERIVED_COLUMNS, {"radio_logs": flaky_derive}), self.assertLogs(
+            level="ERROR"
+        ):
+            writer.start()
+            for index in range(4):
+                writer.submit_log_line(f"line {index}")
+            deadline = time.time() + 5.0
+            while time.time() < deadline and writer.stats()["rows"] < 4:
+                time.sleep(0.01)
+            self.assertTrue(writer._thread.is_alive())
+            writer.close()
+
+        self.assertEqual(failures, ["line 0"])
+        stats = writer.stats()
+        # Rows arriving while the failed batch waits in the spool queue behind it.
+        self.assertGreaterEqual(stats["spilled_rows"], 2)
+        self.assertEqual(stats["replayed_rows"], stats["spilled_rows"])
+        log_rows = self._fetch("SELECT log_line FROM radio_logs ORDER BY message_sequence")
+        self.assertEqual([row[0] for row in log_rows], [f"line {i}" for i in range(4)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from ground_software.kiss import FEND, KissDecoder, escape, unescape
+
+
+class _FakeChunkSerial:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.reads = []
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        self.reads.append(size)
+        if not self.chunks:
+            return b""
+        chunk = self.chunks.pop(0)
+        if len(chunk) > size:
+            self.chunks.insert(0, chunk[size:])
+            chunk = chunk[:size]
+        return chunk
+
+
+class KissDecoderTests(unittest.TestCase):
+    def test_frames_split_across_reads_are_reassembled(self):
+        decoder = KissDecoder()
+
+        self.assertEqual(decoder.feed(b"noise\xC0\xAAACK"), [])
+        self.assertEqual(decoder.feed(b" 1\xC0\xC0\xAARES"), [b"\xAAACK 1"])
+        self.assertEqual(decoder.feed(b" OK\xC0"), [b"\xAARES OK"])
+
+    def test_escaped_bytes_are_restored(self):
+        body = b"\x00RES \xC0\xDB\xDC\xDD end"
+        stream = FEND + escape(body) + FEND
+
+        self.assertNotIn(FEND, stream[1:-1])
+        self.assertEqual(KissDecoder().feed(stream), [body])
+        self.assertEqual(unescape(escape(body)), body)
+
+    def test_empty_and_oversized_frames_are_skipped(self):
+        decoder = KissDecoder(max_frame_length=8)
+
+        frames = decoder.feed(b"\xC0\xC0\xC0" + b"x" * 20 + b"\xC0\xAAok\xC0")
+
+        self.assertEqual(frames, [b"\xAAok"])
+        self.assertEqual(decoder.dropped_frames, 1)
+
+    def test_read_frames_reads_everything_waiting_at_once(self):
+        stream = b"\xC0\xAAACK 1\xC0\xC0\xAARES OK\xC0"
+        radio_serial = _FakeChunkSerial([stream])
+        decoder = KissDecoder()
+
+        frames = decoder.read_frames(radio_serial)
+
+        self.assertEqual(frames, [b"\xAAACK 1", b"\xAARES OK"])
+        self.assertEqual(radio_serial.reads, [len(stream)])
+        self.assertEqual(decoder.read_frames(radio_serial), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
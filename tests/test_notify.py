@@ -0,0 +1,156 @@
+import os
+import shutil
+import socket
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from ground_software import create_app, serial_write_interface
+from ground_software.database import init_database, migrate_database
+from ground_software.notify import Notifier, WakeupListener, notifier_for
+
+
+class _TimedSerial:
+    writes = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def write(self, data):
+        _TimedSerial.writes.append((time.perf_counter(), data))
+
+    def close(self):
+        pass
+
+
+class NotifierTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="notify_")
+        self.path = os.path.join(self.directory, "wakeup")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_socket_sends_count_delivered_coalesced_and_failed(self):
+        notifier = Notifier(self.path)
+        self.assertFalse(notifier.notify())
+
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        try:
+            sender = None
+            for _ in range(2000):
+                self.assertTrue(notifier.notify())
+                sender = sender or notifier._socket
+                self.assertIs(notifier._socket, sender)
+        finally:
+            receiver.close()
+            notifier.close()
+
+        stats = notifier.stats()
+        self.assertEqual(stats["failed"], 1)
+        self.assertGreater(stats["sent"], 0)
+        # The unread receive queue fills long before 2000 datagrams.
+        self.assertGreater(stats["coalesced"], 0)
+        self.assertEqual(stats["sent"] + stats["coalesced"], 2000)
+
+    def test_listener_in_process_is_woken_without_socket(self):
+        listener = WakeupListener(self.path)
+        try:
+            notifier = notifier_for(self.path)
+            self.assertIs(notifier_for(self.path), notifier)
+            for _ in range(100):
+                notifier.notify()
+
+            self.assertTrue(listener.wait(1))
+            # One hundred notifications coalesce into one wakeup.
+            self.assertFalse(listener.wait(0.05))
+            self.assertIsNone(notifier._socket)
+            self.assertEqual(notifier.stats()["local"], 100)
+
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.sendto(b"\x00", self.path)
+            sender.close()
+            self.assertTrue(listener.wait(1))
+            self.assertEqual(listener.stats()["received"], 1)
+        finally:
+            listener.close()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(notifier_for(self.path).notify())
+
+
+class WakeupLatencyTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="notify_latency_")
+        self.db_path = os.path.join(self.directory, "radio.db")
+        self.path = os.path.join(self.directory, "wakeup")
+        app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with app.app_context():
+            init_database()
+            migrate_database()
+        app.extensions["database_pool"].close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _measure(self, wake, rounds=20):
+        """Median seconds from wake() after a commit to the serial write."""
+        shutdown_event = threading.Event()
+        with patch.object(serial_write_interface.serial, "Serial", _TimedSerial), patch.object(
+            serial_write_interface.os.path, "abspath", return_value=self.db_path
+        ), patch.object(serial_write_interface, "NOTIFY_SOCKET_PATH", self.path):
+            writer_thread = threading.Thread(
+                target=serial_write_interface.serial_write,
+                args=("/tmp/fake_radio", shutdown_event),
+                daemon=True,
+            )
+            writer_thread.start()
+            deadline = time.monotonic() + 2
+            while not os.path.exists(self.path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            _TimedSerial.writes = []
+            connection = sqlite3.connect(self.db_path)
+            first = connection.execute(
+                "SELECT COALESCE(MAX(message_sequence), 0) FROM transmissions"
+            ).fetchone()[0]
+            latencies = []
+            for count in range(1, rounds + 1):
+                time.sleep(0.02)
+                connection.execute(
+                    "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+                    (first + count, b"\xC0\x0E\xC0"),
+                )
+                connection.commit()
+                start = time.perf_counter()
+                wake()
+                deadline = time.monotonic() + 2
+                while len(_TimedSerial.writes) < count and time.monotonic() < deadline:
+                    time.sleep(0.0005)
+                self.assertEqual(len(_TimedSerial.writes), count)
+                latencies.append(_TimedSerial.writes[-1][0] - start)
+            connection.close()
+            shutdown_event.set()
+            writer_thread.join(timeout=3)
+        return statistics.median(latencies)
+
+    def test_wakeup_to_write_is_well_under_the_poll_interval(self):
+        in_process = self._measure(notifier_for(self.path).notify)
+
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            by_socket = self._measure(lambda: sender.sendto(b"\x00", self.path))
+        finally:
+            sender.close()
+
+        limit = serial_write_interface.POLL_INTERVAL / 10
+        self.assertLess(in_process, limit)
+        self.assertLess(by_socket, limit)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+try:
+    import numpy as np
+    from ground_software.doppler_engine import GroundStation, look_geometry, time_grid
+    from ground_software import passes
+    from ground_software.passes import find_passes, refresh_passes
+except ImportError:  # numpy and sgp4 are optional dependencies
+    find_passes = None
+
+from ground_software import create_app
+from ground_software.database import init_database, migrate_database
+
+ISS_LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  9005"
+ISS_LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579432000"
+START = datetime(2024, 1, 1, 12, tzinfo=timezone.utc).timestamp()
+
+
+def current_element_set():
+    """The ISS elements with today's epoch, so passes fall around now."""
+    today = datetime.now(timezone.utc)
+    epoch = f"{today:%y}{today.timetuple().tm_yday:03d}.50000000"
+    return ISS_LINE1[:18] + epoch + ISS_LINE1[32:], ISS_LINE2
+
+
+@unittest.skipIf(find_passes is None, "numpy or sgp4 is not installed")
+class PassPredictionTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="passes_")
+        self.db_path = os.path.join(self.directory, "radio.db")
+        self.station = GroundStation(38.89, -77.03, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _create_app(self, **config):
+        app = create_app(
+            {"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test", **config}
+        )
+        with app.app_context():
+            init_database()
+            migrate_database()
+        return app
+
+    def test_sweep_matches_fine_grid(self):
+        passes = find_passes(ISS_LINE1, ISS_LINE2, self.station, START, days=1)
+
+        times = time_grid(START, 86400, 0.5)
+        _, _, elevation, _ = look_geometry(ISS_LINE1, ISS_LINE2, self.station, times)
+        above = elevation >= 0
+        rises = times[1:][np.diff(above.astype(int)) == 1]
+        self.assertEqual(len(passes), len(rises))
+        for item, rise in zip(passes, rises):
+            self.assertLess(abs(item["aos"] - rise), 1.0)
+            self.assertLess(item["aos"], item["max_elevation_time"])
+            self.assertLess(item["max_elevation_time"], item["los"])
+            window = (times >= item["aos"]) & (times <= item["los"])
+            self.assertAlmostEqual(item["max_elevation"], elevation[window].max(), delta=1.5)
+
+    def test_propagation_errors_beside_a_crossing_clip_the_pass(self):
+        elevation = np.array([-5.0, np.nan, 4.0, 8.0, 6.0, np.nan, -3.0, -1.0, 2.0, 1.0, np.nan])
+
+        def geometry(line1, line2, station, times):
+            return None, None, elevation[: len(times)], np.linspace(0, 350, len(times))
+
+        self._create_app()
+        connection = sqlite3.connect(self.db_path, isolation_level=None)
+        with patch.object(passes, "look_geometry", geometry):
+            found = find_passes(ISS_LINE1, ISS_LINE2, self.station, START, days=100 / 86400)
+            self.assertTrue(
+                refresh_passes(connection, ISS_LINE1, ISS_LINE2, self.station, 100 / 86400, START)
+            )
+
+        self.assertEqual(len(found), 2)
+        self.assertEqual((found[0]["aos"], found[0]["los"]), (START + 20, START + 40))
+        self.assertEqual(found[1]["los"], START + 90)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM passes").fetchone()[0], 2)
+        connection.close()
+
+    def test_table_is_recomputed_only_when_tle_changes(self):
+        self._create_app()
+        connection = sqlite3.connect(self.db_path, isolation_level=None)
+
+        self.assertTrue(refresh_passes(connection, ISS_LINE1, ISS_LINE2, self.station, 1, START))
+        count = connection.execute("SELECT COUNT(*) FROM passes").fetchone()[0]
+        self.assertGreater(count, 0)
+        self.assertFalse(
+            refresh_passes(connection, ISS_LINE1, ISS_LINE2, self.station, 1, START + 3600)
+        )
+        # Less than half the span left: the window moves forward.
+        self.assertTrue(
+            refresh_passes(connection, ISS_LINE1, ISS_LINE2, self.station, 1, START + 50000)
+        )
+        changed = ISS_LINE2.replace("247.4627", "250.0000")
+        self.assertTrue(
+            refresh_passes(connection, ISS_LINE1, changed, self.station, 1, START + 50001)
+        )
+        first_aos = connection.execute("SELECT MIN(aos) FROM passes").fetchone()[0]
+        self.assertGreaterEqual(first_aos, "2024-01-02")
+        connection.close()
+
+    def test_endpoint_answers_from_table_while_predictor_computes(self):
+        tle_path = os.path.join(self.directory, "silversat.tle")
+        with open(tle_path, "w") as tle_file:
+            tle_file.write("SILVERSAT\n" + "\n".join(current_element_set()) + "\n")
+        app = self._create_app(
+            TLE_PATH=tle_path, STATION_LATITUDE=38.89, STATION_LONGITUDE=-77.03
+        )
+        client = app.test_client()
+
+        first = client.get("/passes").get_json()
+        self.assertIn(first["status"], ("idle", "computing"))
+        predictor = app.extensions["pass_predictor"]
+        deadline = time.time() + 10
+        while predictor.computations == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        while predictor.status == "computing" and time.time() < deadline:
+            time.sleep(0.02)
+
+        data = client.get("/passes").get_json()
+        predictor.close()
+        app.extensions["database_pool"].close()
+
+        self.assertEqual(predictor.computations, 1)
+        self.assertGreater(len(data["passes"]), 0)
+        item = data["passes"][0]
+        self.assertLess(item["aos"], item["los"])
+        self.assertGreater(item["max_elevation"], 0)
+
+    def test_endpoint_without_station_is_unavailable(self):
+        app = self._create_app()
+        data = app.test_client().get("/passes").get_json()
+        app.extensions["database_pool"].close()
+
+        self.assertEqual(data, {"status": "unavailable", "passes": []})
+        self.assertNotIn("pass_predictor", app.extensions)
+
+
+if __name__ == "__main__":
+    unittest.main()
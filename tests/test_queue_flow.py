@@ -1,3 +1,5 @@
+import hashlib
+import hmac
 import os
 import sqlite3
 import tempfile
@@ -5,7 +7,6 @@ import threading
 import time
 import unittest
 from unittest.mock import patch
-import socket as pysocket
 
 from ground_software import create_app
 from ground_software import control
@@ -58,20 +59,6 @@ class _FakeRuntimeSerial:
         pass
 
 
-class _TimeoutNotifySocket:
-    def settimeout(self, _seconds):
-        pass
-
-    def bind(self, _path):
-        pass
-
-    def recv(self, _size):
-        raise pysocket.timeout()
-
-    def close(self):
-        pass
-
-
 class QueueFlowTests(unittest.TestCase):
     def setUp(self):
         fd, self.db_path = tempfile.mkstemp(prefix="queue_flow_", suffix=".db")
@@ -120,8 +107,10 @@ class QueueFlowTests(unittest.TestCase):
                 write_connection, write_cursor, fake_writer
             )
 
-            self.assertEqual(len(fake_writer.writes), 3)
-            self.assertEqual(fake_writer.writes, [row["command"] for row in transmissions])
+            # The queued frames go out back to back in one serial write.
+            self.assertEqual(
+                fake_writer.writes, [b"".join(row["command"] for row in transmissions)]
+            )
 
             status_rows = write_connection.execute(
                 "SELECT status FROM transmissions ORDER BY message_sequence"
@@ -153,6 +142,231 @@ class QueueFlowTests(unittest.TestCase):
 
             write_connection.close()
 
+    def test_drain_claims_in_batches_and_keeps_sequence_order(self):
+        connection = sqlite3.connect(self.db_path)
+        # Inserted out of order; message_sequence decides the send order.
+        connection.executemany(
+            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)",
+            [(sequence, f"\xC0\xAACMD {sequence}\xC0".encode("latin-1")) for sequence in (5, 3, 4, 1, 2)],
+        )
+        connection.commit()
+        cursor = connection.cursor()
+        fake_writer = _FakeWriteSerial()
+
+        serial_write_interface.drain_pending_transmissions(
+            connection, cursor, fake_writer, batch_size=2
+        )
+
+        self.assertEqual(
+            fake_writer.writes,
+            [
+                b"\xC0\xAACMD 1\xC0\xC0\xAACMD 2\xC0",
+                b"\xC0\xAACMD 3\xC0\xC0\xAACMD 4\xC0",
+                b"\xC0\xAACMD 5\xC0",
+            ],
+        )
+        statuses = connection.execute("SELECT DISTINCT status FROM transmissions").fetchall()
+        self.assertEqual(statuses, [("transmitted",)])
+        connection.close()
+
+    def test_priority_classes_jump_the_queue_and_stay_fifo(self):
+        signature = b"0" * 88
+        frames = [
+            (1, b"\xC0\xAA" + signature + b"GetTelemetry\xC0"),
+            (2, b"\xC0\xAA" + signature + b"SetClock 2026 10 17 12 00 00\xC0"),
+            (3, b"\xC0\xAA" + signature + b"NoOperate\xC0"),
+            (4, b"\xC0\x0D433000000 433001000\xC0"),
+            (5, b"\xC0\xAA" + signature + b"PicTimes 2026 10 17 12 01 00\xC0"),
+            (6, b"\xC0\x0E\xC0"),
+        ]
+        connection = sqlite3.connect(self.db_path)
+        connection.executemany(
+            "INSERT INTO transmissions (message_sequence, command) VALUES (?, ?)", frames
+        )
+        connection.commit()
+        fake_writer = _FakeWriteSerial()
+
+        serial_write_interface.drain_pending_transmissions(
+            connection, connection.cursor(), fake_writer, batch_size=1
+        )
+        connection.close()
+
+        sequence_of = {command: sequence for sequence, command in frames}
+        self.assertEqual([sequence_of[data] for data in fake_writer.writes], [4, 6, 2, 5, 1, 3])
+
+        stats = self.app.test_client().get("/queue/stats").get_json()
+        self.assertEqual(set(stats), {"radio", "time_critical", "bulk"})
+        self.assertEqual(
+            [stats[name]["transmitted"] for name in ("radio", "time_critical", "bulk")], [2, 2, 2]
+        )
+        self.assertEqual(stats["bulk"]["pending"], 0)
+        self.assertGreaterEqual(stats["bulk"]["wait_p99_seconds"], stats["bulk"]["wait_p50_seconds"])
+
+    def test_enqueue_command_signs_and_queues_in_one_transaction(self):
+        with self.app.app_context():
+            control.set_command_sequence(41)
+            database = get_database()
+            statements = []
+            database.set_trace_callback(statements.append)
+            try:
+                command_sequence, message_sequence = control.enqueue_command("GetPower")
+            finally:
+                database.set_trace_callback(None)
+            secret = control.get_signing_secret()
+
+            row = database.execute(
+                "SELECT message_sequence, command, command_sequence FROM transmissions"
+            ).fetchone()
+            self.assertEqual(control.get_current_command_sequence(), 42)
+
+        self.assertEqual(command_sequence, 41)
+        self.assertEqual((row["message_sequence"], row["command_sequence"]), (message_sequence, 41))
+        self.assertEqual(
+            [statement for statement in statements if statement.startswith(("BEGIN", "COMMIT"))],
+            ["BEGIN IMMEDIATE", "COMMIT"],
+        )
+
+        frame = row["command"]
+        signature, salt, sequence = frame[2:66], frame[66:82], frame[82:90]
+        self.assertEqual(sequence, b"00000041")
+        expected = hmac.new(secret, digestmod=hashlib.blake2s)
+        expected.update(bytes.fromhex(salt.decode("ascii")))
+        expected.update(sequence)
+        expected.update(b"GetPower")
+        self.assertEqual(signature, expected.hexdigest().encode("ascii"))
+        self.assertEqual(frame[90:], b"GetPower\xC0")
+
+    def test_failed_enqueue_allocates_no_sequences(self):
+        with self.app.app_context():
+            control.enqueue_command("NoOperate")
+            database = get_database()
+            # Point the counter at the row just queued so the insert fails.
+            database.execute("UPDATE settings SET value = '1' WHERE key = 'message_sequence'")
+            database.commit()
+            with self.assertRaises(sqlite3.IntegrityError):
+                control.enqueue_command("GetPower")
+
+            self.assertEqual(control.get_current_command_sequence(), 2)
+            count = database.execute("SELECT COUNT(*) FROM transmissions").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_api_commands_returns_assigned_sequences(self):
+        client = self.app.test_client()
+        with self.app.app_context():
+            control.set_command_sequence(7)
+
+        typed = client.post("/api/commands", json={"command": "GetPower"})
+        quick = client.post("/api/commands", json={"action": "NOP"})
+        invalid = [
+            client.post("/api/commands", json=body)
+            for body in (
+                {"action": "Reboot"},
+                {"action": ["NOP"]},
+                {"action": {"NOP": 1}},
+                {"command": 42},
+                ["GetPower"],
+                "GetPower",
+            )
+        ]
+
+        self.assertEqual(typed.get_json()["command"], "GetPower")
+        self.assertEqual(typed.get_json()["command_sequence"], 7)
+        self.assertEqual(
+            quick.get_json(),
+            {
+                "command": "NoOperate",
+                "command_sequence": 8,
+                "message_sequence": typed.get_json()["message_sequence"] + 1,
+            },
+        )
+        for response in invalid:
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.get_json())
+        with self.app.app_context():
+            rows = get_database().execute(
+                "SELECT command_sequence FROM transmissions ORDER BY message_sequence"
+            ).fetchall()
+        self.assertEqual([row[0] for row in rows], [7, 8])
+
+    def test_queue_stats_report_pending_depth(self):
+        with self.app.app_context():
+            control.insert_local_frame(b"\xC0\x0E\xC0")
+            control.insert(b"0" * 88 + b"NoOperate")
+            control.insert(b"0" * 88 + b"GetPower")
+            stats = self.app.test_client().get("/queue/stats").get_json()
+
+        self.assertEqual(stats["radio"]["pending"], 1)
+        self.assertEqual(stats["bulk"]["pending"], 2)
+        self.assertEqual(stats["time_critical"]["pending"], 0)
+        self.assertGreaterEqual(stats["bulk"]["oldest_pending_seconds"], 0)
+        self.assertIsNone(stats["bulk"]["wait_p50_seconds"])
+
+    def test_pacer_models_airtime_and_room(self):
+        now = [100.0]
+        pacer = serial_write_interface.AirtimePacer(
+            baud_rate=1000, max_in_flight=300, min_room=100, clock=lambda: now[0]
+        )
+
+        self.assertEqual(pacer.room(), 300)
+        # 100 bytes per second: the second frame goes on air after the first.
+        self.assertEqual(pacer.sent([100, 100]), [1.0, 2.0])
+        self.assertEqual(pacer.room(), 100)
+        now[0] += 0.5
+        self.assertEqual(pacer.room(), 150)
+        self.assertEqual(pacer.sent([50]), [2.0])
+
+        def sleep(delay):
+            now[0] += delay
+
+        pacer.sleep = sleep
+        # 200 bytes in flight leaves min_room free; at 250 the pacer waits.
+        self.assertEqual(pacer.wait_for_room(), 100)
+        self.assertEqual(pacer.stats()["waits"], 0)
+        pacer.sent([50])
+        self.assertEqual(pacer.wait_for_room(), 100)
+        self.assertAlmostEqual(now[0], 101.0)
+        self.assertEqual(pacer.stats()["waits"], 1)
+        self.assertEqual(pacer.stats()["peak_in_flight"], 250)
+
+    def test_paced_drain_bounds_bytes_in_flight(self):
+        frame = b"\xC0\xAA" + b"0" * 88 + b"GetTelemetry\xC0"
+        connection = sqlite3.connect(self.db_path)
+        connection.executemany(
+            "INSERT INTO transmissions (message_sequence, command, priority, enqueued_at) "
+            "VALUES (?, ?, 2, ?)",
+            [(sequence, frame, time.time()) for sequence in range(1, 11)],
+        )
+        connection.commit()
+        now = [0.0]
+
+        def sleep(delay):
+            now[0] += delay
+
+        pacer = serial_write_interface.AirtimePacer(
+            baud_rate=19200, max_in_flight=256, min_room=128, clock=lambda: now[0], sleep=sleep
+        )
+        fake_writer = _FakeWriteSerial()
+        serial_write_interface.drain_pending_transmissions(
+            connection, connection.cursor(), fake_writer, pacer=pacer
+        )
+
+        # Two 103-byte frames fit in 256 bytes; later batches wait for one to clear.
+        self.assertEqual([len(data) // len(frame) for data in fake_writer.writes], [2] + [1] * 8)
+        self.assertLessEqual(pacer.peak_in_flight, 256)
+        # The first wait frees 2 * 103 - 128 bytes; each later one a frame. None
+        # follows the last batch.
+        self.assertEqual(pacer.waits, 8)
+        self.assertAlmostEqual(now[0], pacer.airtime(2 * len(frame) - 128 + 7 * len(frame)))
+        rows = connection.execute(
+            "SELECT transmitted_at, on_air_at FROM transmissions ORDER BY message_sequence"
+        ).fetchall()
+        connection.close()
+        self.assertTrue(all(on_air > transmitted for transmitted, on_air in rows))
+
+        stats = self.app.test_client().get("/queue/stats").get_json()
+        self.assertEqual(stats["bulk"]["transmitted"], 10)
+        self.assertGreater(stats["bulk"]["on_air_p50_seconds"], 0)
+
     def test_timeout_polling_drains_pending_doppler_without_notify(self):
         db_dir = tempfile.mkdtemp(prefix="doppler_pending_")
         db_path = os.path.join(db_dir, "radio.db")
@@ -171,13 +385,10 @@ class QueueFlowTests(unittest.TestCase):
 
         shutdown_event = threading.Event()
 
-        def socket_factory(*_args, **_kwargs):
-            return _TimeoutNotifySocket()
-
         with patch.object(serial_write_interface.serial, "Serial", _FakeRuntimeSerial), patch.object(
-            serial_write_interface.socket, "socket", side_effect=socket_factory
-        ), patch.object(serial_write_interface.os.path, "abspath", return_value=db_path), patch.object(
-            serial_write_interface, "NOTIFY_SOCKET_PATH", "/tmp/test_radio_notify_unused"
+            serial_write_interface.os.path, "abspath", return_value=db_path
+        ), patch.object(
+            serial_write_interface, "NOTIFY_SOCKET_PATH", os.path.join(db_dir, "notify")
         ):
             writer_thread = threading.Thread(
                 target=serial_write_interface.serial_write,
@@ -128,6 +128,52 @@ class RadioCommandsTests(unittest.TestCase):
             self.assertIsNotNone(row)
             self.assertEqual(row["command"], b"\xC0\x1C255\xC0")
 
+    def test_api_radio_local_queues_built_and_raw_frames(self):
+        built = self.client.post(
+            "/api/radio/local",
+            json={
+                "code": "0D",
+                "params": {"tx_frequency": "433000000", "rx_frequency": "433001000"},
+            },
+        )
+        raw = self.client.post(
+            "/api/radio/local", json={"raw": True, "code": "1C", "payload": "255"}
+        )
+
+        self.assertEqual(built.status_code, 200)
+        self.assertEqual(raw.get_json(), {
+            "frame": "C0 1C 32 35 35 C0",
+            "message_sequence": built.get_json()["message_sequence"] + 1,
+        })
+        with self.app.app_context():
+            rows = get_database().execute(
+                "SELECT message_sequence, command FROM transmissions ORDER BY message_sequence"
+            ).fetchall()
+        self.assertEqual(
+            [tuple(row) for row in rows],
+            [
+                (built.get_json()["message_sequence"], b"\xC0\x0D433000000 433001000\xC0"),
+                (raw.get_json()["message_sequence"], b"\xC0\x1C255\xC0"),
+            ],
+        )
+
+    def test_api_radio_local_rejects_invalid_input(self):
+        for body in (
+            {"code": "0D", "params": {"tx_frequency": "43300", "rx_frequency": "433001000"}},
+            {"code": "99"},
+            {"raw": True, "code": "1CG"},
+            {"code": "07", "params": ["ABCD"]},
+            ["0E"],
+            "0E",
+        ):
+            response = self.client.post("/api/radio/local", json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.get_json())
+
+        with self.app.app_context():
+            count = get_database().execute("SELECT COUNT(*) FROM transmissions").fetchone()[0]
+        self.assertEqual(count, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,330 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from ground_software import control, create_app
+from ground_software.database import init_database, migrate_database
+from ground_software import response_broadcaster
+from ground_software.ingest_writer import IngestWriter
+from ground_software.response_broadcaster import ResponseBroadcaster
+
+
+def _sequences(rows):
+    return [row["message_sequence"] for row in rows]
+
+
+class ResponseBroadcasterTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="response_broadcaster_", suffix=".db")
+        os.close(fd)
+        self.socket_directory = tempfile.mkdtemp(prefix="notify_")
+        self.notify_path = os.path.join(self.socket_directory, "responses")
+
+        self.app = create_app(
+            {
+                "TESTING": True,
+                "DATABASE": self.db_path,
+                "SECRET_KEY": "test",
+                "RESPONSE_POLL_INTERVAL": 0.02,
+                "RESPONSE_NOTIFY_SOCKET_PATH": self.notify_path,
+            }
+        )
+        with self.app.app_context():
+            init_database()
+            migrate_database()
+        self.broadcaster = ResponseBroadcaster(self.db_path, poll_interval=0.02, queue_size=4)
+
+    def tearDown(self):
+        self.broadcaster.close()
+        extension = self.app.extensions.get("response_broadcaster")
+        if extension is not None:
+            extension.close()
+        self.app.extensions["database_pool"].close()
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+        shutil.rmtree(self.socket_directory, ignore_errors=True)
+
+    def _insert_responses(self, *sequences):
+        connection = sqlite3.connect(self.db_path)
+        connection.executemany(
+            "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
+            [(sequence, f"\xC0\xAARES OK {sequence}\xC0".encode("latin-1")) for sequence in sequences],
+        )
+        connection.commit()
+        connection.close()
+
+    def _clear_through(self, sequence):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            ("responses_cleared_sequence", str(sequence)),
+        )
+        connection.commit()
+        connection.close()
+
+    def test_every_subscriber_receives_each_update_from_one_poller(self):
+        self._insert_responses(1, 2)
+        subscriptions = [self.broadcaster.subscribe() for _ in range(10)]
+
+        for subscription in subscriptions:
+            kind, rows, _ = subscription.get(timeout=2)
+            self.assertEqual(kind, "snapshot")
+            self.assertEqual(_sequences(rows), [2, 1])
+
+        self._insert_responses(3, 4)
+        for subscription in subscriptions:
+            kind, rows, _ = subscription.get(timeout=2)
+            self.assertEqual(kind, "responses")
+            self.assertEqual(_sequences(rows), [3, 4])
+
+        # Polling rate depends on the interval, not on the number of clients.
+        polls_before = self.broadcaster.polls
+        time.sleep(0.2)
+        self.assertLess(self.broadcaster.polls - polls_before, 20)
+
+    def test_late_subscriber_gets_cached_snapshot(self):
+        self._insert_responses(1)
+        first = self.broadcaster.subscribe()
+        first.get(timeout=2)
+        self._insert_responses(2)
+        self.assertEqual(_sequences(first.get(timeout=2)[1]), [2])
+
+        late = self.broadcaster.subscribe()
+        kind, rows, _ = late.get(timeout=2)
+
+        self.assertEqual(kind, "snapshot")
+        self.assertEqual(_sequences(rows), [2, 1])
+
+    def test_slow_subscriber_is_resynchronised_with_a_snapshot(self):
+        slow = self.broadcaster.subscribe()
+        fast = self.broadcaster.subscribe()
+        self.assertEqual(fast.get(timeout=2), ("snapshot", [], 0))
+
+        for sequence in range(1, 9):
+            self._insert_responses(sequence)
+            kind, rows, _ = fast.get(timeout=2)
+            self.assertEqual((kind, _sequences(rows)), ("responses", [sequence]))
+
+        self.assertGreaterEqual(slow.resyncs, 1)
+        events = []
+        while True:
+            event = slow.get(timeout=0)
+            if event is None:
+                break
+            events.append(event)
+        self.assertLessEqual(len(events), 4)
+        snapshot_rows = [rows for kind, rows, _ in events if kind == "snapshot"][-1]
+        received = set(_sequences(snapshot_rows))
+        for kind, rows, _ in events:
+            if kind == "responses":
+                received.update(_sequences(rows))
+        self.assertEqual(received, set(range(1, 9)))
+
+    def test_failed_poll_reopens_the_database_and_keeps_streaming(self):
+        self._insert_responses(1)
+        opened = []
+        original_open = response_broadcaster.open_connection
+        original_poll = ResponseBroadcaster._poll
+
+        def open_connection(*args, **kwargs):
+            opened.append(args)
+            return original_open(*args, **kwargs)
+
+        def poll(broadcaster, database):
+            if broadcaster.poll_errors == 0:
+                raise sqlite3.OperationalError("database is locked")
+            return original_poll(broadcaster, database)
+
+        with patch.object(response_broadcaster, "open_connection", open_connection), patch.object(
+            ResponseBroadcaster, "_poll", poll
+        ), self.assertLogs(level="ERROR"):
+            subscription = self.broadcaster.subscribe()
+            kind, rows, _ = subscription.get(timeout=2)
+
+        self.assertEqual((kind, _sequences(rows)), ("snapshot", [1]))
+        self.assertEqual(self.broadcaster.poll_errors, 1)
+        self.assertEqual(len(opened), 2)
+        self._insert_responses(2)
+        self.assertEqual(_sequences(subscription.get(timeout=2)[1]), [2])
+
+    def test_clear_sends_fresh_snapshot(self):
+        self._insert_responses(1, 2)
+        subscription = self.broadcaster.subscribe()
+        subscription.get(timeout=2)
+
+        self._clear_through(2)
+        self._insert_responses(3)
+        kind, rows, _ = subscription.get(timeout=2)
+
+        self.assertEqual(kind, "snapshot")
+        self.assertEqual(_sequences(rows), [3])
+
+    def test_resume_sends_only_missed_rows(self):
+        self._insert_responses(1, 2, 3)
+        first = self.broadcaster.subscribe()
+        self.assertEqual(first.get(timeout=2)[2], 3)
+        first.close()
+        self._insert_responses(4, 5)
+
+        resumed = self.broadcaster.subscribe(last_event_id="3")
+        kind, rows, sequence = resumed.get(timeout=2)
+        self.assertEqual((kind, _sequences(rows), sequence), ("responses", [4, 5], 5))
+
+        current = self.broadcaster.subscribe(last_event_id="5")
+        self._insert_responses(6)
+        kind, rows, sequence = current.get(timeout=2)
+        self.assertEqual((kind, _sequences(rows), sequence), ("responses", [6], 6))
+        self.assertEqual(self.broadcaster.snapshots, 1)
+        self.assertEqual(self.broadcaster.resumes, 1)
+
+    def test_resume_falls_back_to_snapshot_beyond_bound_or_after_clear(self):
+        broadcaster = ResponseBroadcaster(self.db_path, poll_interval=0.02, resume_limit=30)
+        try:
+            self._insert_responses(*range(1, 11))
+            first = broadcaster.subscribe()
+            first.get(timeout=2)
+            self._insert_responses(*range(11, 51))
+            while first.get(timeout=2)[2] < 50:
+                pass
+
+            within = broadcaster.subscribe(last_event_id="40")
+            self.assertEqual(_sequences(within.get(timeout=2)[1]), list(range(41, 51)))
+
+            too_old = broadcaster.subscribe(last_event_id="5")
+            kind, rows, sequence = too_old.get(timeout=2)
+            self.assertEqual((kind, len(rows), sequence), ("snapshot", 25, 50))
+
+            garbled = broadcaster.subscribe(last_event_id="not-a-number")
+            self.assertEqual(garbled.get(timeout=2)[0], "snapshot")
+
+            self._clear_through(50)
+            self.assertEqual(first.get(timeout=2), ("snapshot", [], 50))
+            after_clear = broadcaster.subscribe(last_event_id="45")
+            self.assertEqual(after_clear.get(timeout=2), ("snapshot", [], 50))
+        finally:
+            broadcaster.close()
+
+    def test_ingest_notification_wakes_broadcaster_before_poll_interval(self):
+        broadcaster = ResponseBroadcaster(
+            self.db_path, poll_interval=30, notify_path=self.notify_path
+        )
+        writer = IngestWriter(
+            self.db_path,
+            flush_interval=0.001,
+            spool_path=os.path.join(self.socket_directory, "spool"),
+            notify_path=self.notify_path,
+        ).start()
+        try:
+            subscription = broadcaster.subscribe()
+            self.assertEqual(subscription.get(timeout=2), ("snapshot", [], 0))
+            # The listener is bound before subscribe() returns.
+            self.assertTrue(os.path.exists(self.notify_path))
+
+            latencies = []
+            for index in range(5):
+                start = time.monotonic()
+                writer.submit_response(f"\xC0\xAARES OK {index}\xC0".encode("latin-1"))
+                event = subscription.get(timeout=5)
+                latencies.append(time.monotonic() - start)
+                self.assertEqual(event[0], "responses")
+                self.assertEqual(len(event[1]), 1)
+
+            self.assertLess(max(latencies), 0.5)
+            self.assertGreaterEqual(broadcaster.notifications, 5)
+        finally:
+            writer.close()
+            broadcaster.close()
+        # Read after close: the broadcaster can deliver before the writer counts its send.
+        self.assertGreaterEqual(writer.stats()["notifications_sent"], 5)
+        self.assertFalse(os.path.exists(self.notify_path))
+
+    def test_datagram_from_another_process_wakes_broadcaster(self):
+        broadcaster = ResponseBroadcaster(
+            self.db_path, poll_interval=30, notify_path=self.notify_path
+        )
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            subscription = broadcaster.subscribe()
+            self.assertEqual(subscription.get(timeout=2), ("snapshot", [], 0))
+            self._insert_responses(1)
+            sender.sendto(b"responses 1", self.notify_path)
+            event = subscription.get(timeout=2)
+            self.assertEqual(event[0], "responses")
+            self.assertEqual(_sequences(event[1]), [1])
+            self.assertEqual(broadcaster.notifications, 1)
+        finally:
+            sender.close()
+            broadcaster.close()
+        self.assertFalse(os.path.exists(self.notify_path))
+
+    def test_concurrent_first_requests_share_one_broadcaster(self):
+        created = []
+
+        def slow_broadcaster(*args, **kwargs):
+            time.sleep(0.05)
+            created.append(ResponseBroadcaster(*args, **kwargs))
+            return created[-1]
+
+        barrier = threading.Barrier(4)
+        found = []
+
+        def first_request():
+            with self.app.app_context():
+                barrier.wait()
+                found.append(control.response_broadcaster())
+
+        with patch.object(control, "ResponseBroadcaster", slow_broadcaster):
+            threads = [threading.Thread(target=first_request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(broadcaster is created[0] for broadcaster in found))
+
+    def test_stream_endpoint_uses_shared_broadcaster(self):
+        self._insert_responses(1)
+        client = self.app.test_client()
+
+        streams = [client.get("/responses_stream", buffered=False) for _ in range(3)]
+        broadcaster = self.app.extensions["response_broadcaster"]
+        for stream in streams:
+            first_event = next(stream.response).decode("utf-8")
+            self.assertTrue(first_event.startswith("id: 1\nevent: snapshot\n"))
+            payload = json.loads(first_event.split("data: ", 1)[1])
+            self.assertEqual(_sequences(payload), [1])
+        self.assertEqual(broadcaster.subscriber_count, 3)
+
+        for stream in streams:
+            stream.close()
+        self.assertEqual(broadcaster.subscriber_count, 0)
+
+    def test_stream_endpoint_resumes_from_last_event_id(self):
+        self._insert_responses(1, 2, 3)
+        client = self.app.test_client()
+        stream = client.get("/responses_stream", buffered=False)
+        first_event = next(stream.response).decode("utf-8")
+        stream.close()
+        self.assertTrue(first_event.startswith("id: 3\nevent: snapshot\n"))
+        self._insert_responses(4)
+
+        for resumed in (
+            client.get("/responses_stream", headers={"Last-Event-ID": "3"}, buffered=False),
+            client.get("/responses_stream?last_event_id=3", buffered=False),
+        ):
+            event = next(resumed.response).decode("utf-8")
+            resumed.close()
+            self.assertTrue(event.startswith("id: 4\nevent: responses\n"))
+            self.assertEqual(_sequences(json.loads(event.split("data: ", 1)[1])), [4])
+
+
+if __name__ == "__main__":
+    unittest.main()
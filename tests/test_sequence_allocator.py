@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from ground_software import create_app
+from ground_software.database import (
+    SequenceAllocator,
+    get_database,
+    init_database,
+    migrate_database,
+    next_sequence_value,
+)
+
+
+class SequenceAllocatorTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(prefix="sequence_allocator_", suffix=".db")
+        os.close(fd)
+
+        self.app = create_app({"TESTING": True, "DATABASE": self.db_path, "SECRET_KEY": "test"})
+        with self.app.app_context():
+            init_database()
+            migrate_database()
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.unlink(self.db_path)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def test_block_is_reserved_once_and_handed_out_in_order(self):
+        connection = self._connect()
+        allocator = SequenceAllocator(block_size=10, max_block_age=None)
+
+        values = [allocator.next_value(connection) for _ in range(25)]
+
+        self.assertEqual(values, list(range(1, 26)))
+        self.assertEqual(allocator.reservations, 3)
+        stored = connection.execute(
+            "SELECT value FROM settings WHERE key = 'message_sequence'"
+        ).fetchone()[0]
+        self.assertEqual(int(stored), 31)
+        connection.close()
+
+    def test_allocators_and_per_row_callers_never_collide(self):
+        first = SequenceAllocator(block_size=8, max_block_age=None)
+        second = SequenceAllocator(block_size=5, max_block_age=None)
+        results = []
+        lock = threading.Lock()
+
+        def allocate(allocator):
+            connection = self._connect()
+            values = []
+            for _ in range(200):
+                if allocator is None:
+                    values.append(next_sequence_value(connection, "message_sequence"))
+                else:
+                    values.append(allocator.next_value(connection))
+            connection.close()
+            with lock:
+                results.append(values)
+
+        threads = [
+            threading.Thread(target=allocate, args=(allocator,))
+            for allocator in (first, second, None)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for values in results:
+            self.assertEqual(values, sorted(values))
+        all_values = [value for values in results for value in values]
+        self.assertEqual(len(all_values), len(set(all_values)))
+
+    def test_expired_block_is_abandoned(self):
+        connection = self._connect()
+        allocator = SequenceAllocator(block_size=100, max_block_age=0)
+
+        first = allocator.next_value(connection)
+        second = allocator.next_value(connection)
+
+        self.assertEqual(second, first + 100)
+        self.assertEqual(allocator.reservations, 2)
+        connection.close()
+
+    def test_migration_does_not_rewind_reserved_sequence(self):
+        connection = self._connect()
+        allocator = SequenceAllocator(block_size=50, max_block_age=None)
+        message_sequence = allocator.next_value(connection)
+        connection.execute(
+            "INSERT INTO responses (message_sequence, response) VALUES (?, ?)",
+            (message_sequence, b"\xC0\xAARES OK\xC0"),
+        )
+        connection.commit()
+
+        with self.app.app_context():
+            migrate_database()
+            stored = get_database().execute(
+                "SELECT value FROM settings WHERE key = 'message_sequence'"
+            ).fetchone()["value"]
+
+        self.assertEqual(int(stored), message_sequence + 50)
+        connection.close()
+
+
+if __name__ == "__main__":
+    unittest.main()